@@ -0,0 +1,317 @@
+"""
+Model backends that generate_content dispatches through.
+
+GeminiBackend talks to Google Gemini. FakeBackend is a deterministic
+in-process stand-in with configurable latency, token rate and error rate,
+used for offline load tests and benchmarks.
+"""
+import asyncio
+import hashlib
+import math
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+DEFAULT_MODEL = "gemini-pro-latest"
+
+
+@dataclass
+class GenerationResult:
+    text: str
+    model: str
+    prompt_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    cached: bool = False
+    # All candidate texts when more than one was requested (text is the first)
+    candidates: Optional[List[str]] = None
+    # Cosine similarity of the prompt this was cached for (semantic cache hits)
+    similarity: Optional[float] = None
+
+
+class BackendError(Exception):
+    """Upstream failure raised by a backend, carrying an HTTP-like status code"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class ModelBackend:
+    """Interface every backend implements"""
+
+    name = "base"
+
+    async def generate(self, prompt: str, model_name: str, generation_config: dict) -> GenerationResult:
+        raise NotImplementedError
+
+    async def stream(
+        self, prompt: str, model_name: str, generation_config: dict, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        """
+        Yield text chunks as the model produces them.
+
+        If `usage` is given, it is filled with prompt_tokens/output_tokens
+        once the model reports them.
+        """
+        raise NotImplementedError
+        yield
+
+
+class ModelPool:
+    """Keyed pool of model clients, created once per model name on first use"""
+
+    def __init__(self, factory: Callable[[str], Any]):
+        self.factory = factory
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def get(self, model_name: str):
+        model = self.models.get(model_name)
+        if model is None:
+            # Thread-pool calls can race here, so creation is locked
+            with self.lock:
+                model = self.models.get(model_name)
+                if model is None:
+                    model = self.models[model_name] = self.factory(model_name)
+        return model
+
+    def stats(self) -> dict:
+        return {"models": sorted(self.models)}
+
+
+class GeminiBackend(ModelBackend):
+    """
+    Google Gemini backend.
+
+    call_mode "async" uses the SDK's generate_content_async; "thread" runs
+    the blocking generate_content in a bounded thread pool.
+    """
+
+    name = "gemini"
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        call_mode: str = "async",
+        max_workers: int = 32,
+        model_factory: Optional[Callable[[str], Any]] = None,
+    ):
+        if model_factory is None:
+            # Imported lazily so the fake backend works without the SDK installed
+            import google.generativeai as genai
+
+            genai.configure(api_key=api_key)
+            model_factory = genai.GenerativeModel
+        self.call_mode = call_mode
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        self.pool = ModelPool(model_factory)
+        self.get_model = self.pool.get
+
+    async def generate(self, prompt: str, model_name: str, generation_config: dict) -> GenerationResult:
+        model = self.get_model(model_name)
+        if self.call_mode == "async" and hasattr(model, "generate_content_async"):
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=generation_config
+            )
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                self.executor,
+                partial(model.generate_content, prompt, generation_config=generation_config)
+            )
+        usage = getattr(response, "usage_metadata", None)
+        candidates = None
+        if generation_config.get("candidate_count", 1) > 1:
+            # response.text only works for single-candidate responses
+            candidates = [
+                "".join(part.text for part in candidate.content.parts)
+                for candidate in response.candidates
+            ]
+        return GenerationResult(
+            text=candidates[0] if candidates else response.text,
+            model=model_name,
+            prompt_tokens=getattr(usage, "prompt_token_count", None),
+            output_tokens=getattr(usage, "candidates_token_count", None),
+            candidates=candidates,
+        )
+
+    @staticmethod
+    def record_usage(chunk, usage: Optional[dict]):
+        # Usage metadata arrives on the final chunk (counts are cumulative)
+        metadata = getattr(chunk, "usage_metadata", None)
+        if usage is not None and metadata is not None:
+            usage["prompt_tokens"] = getattr(metadata, "prompt_token_count", None)
+            usage["output_tokens"] = getattr(metadata, "candidates_token_count", None)
+
+    async def stream(
+        self, prompt: str, model_name: str, generation_config: dict, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        model = self.get_model(model_name)
+        if self.call_mode == "async" and hasattr(model, "generate_content_async"):
+            response = await model.generate_content_async(
+                prompt,
+                generation_config=generation_config,
+                stream=True
+            )
+            async for chunk in response:
+                self.record_usage(chunk, usage)
+                yield chunk.text
+            return
+
+        # Pull each chunk from the blocking iterator in the thread pool
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor,
+            partial(model.generate_content, prompt, generation_config=generation_config, stream=True)
+        )
+        chunks = iter(response)
+        done = object()
+        while True:
+            chunk = await loop.run_in_executor(self.executor, next, chunks, done)
+            if chunk is done:
+                break
+            self.record_usage(chunk, usage)
+            yield chunk.text
+
+
+class FakeBackend(ModelBackend):
+    """
+    Deterministic local backend for load testing.
+
+    Response text depends only on the prompt. Latency is a sampled
+    time-to-first-token (latency_distribution around latency_ms) plus
+    output_tokens / token_rate seconds of generation time. A seeded RNG
+    drives latency and error sampling, so a given request sequence
+    reproduces the same profile.
+    """
+
+    name = "fake"
+
+    WORDS = (
+        "content", "model", "latency", "token", "request", "response", "cache",
+        "stream", "python", "gemini", "summary", "answer", "code", "text",
+    )
+
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        latency_distribution: str = "fixed",
+        latency_sigma: float = 0.5,
+        token_rate: float = 0.0,
+        output_tokens: int = 50,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        if latency_distribution not in ("fixed", "uniform", "exponential", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.token_rate = token_rate
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def sample_latency(self) -> float:
+        """Time to first token in seconds"""
+        base = self.latency_ms / 1000
+        if self.latency_distribution == "uniform":
+            return self.rng.uniform(0, 2 * base)
+        if self.latency_distribution == "exponential":
+            return self.rng.expovariate(1 / base) if base > 0 else 0.0
+        if self.latency_distribution == "lognormal":
+            # latency_ms is the median
+            return base * math.exp(self.rng.gauss(0, self.latency_sigma))
+        return base
+
+    def make_text(self, prompt: str, tokens: int, generation_config: Optional[dict] = None) -> str:
+        digest = hashlib.sha256(prompt.encode()).digest()
+        words = [self.WORDS[digest[i % len(digest)] % len(self.WORDS)] for i in range(tokens)]
+        text = " ".join(words)
+        for stop in (generation_config or {}).get("stop_sequences") or []:
+            if stop in text:
+                text = text[:text.index(stop)]
+        return text
+
+    def count_tokens(self, text: str) -> int:
+        # Rough heuristic: about 4 characters per token
+        return max(1, len(text) // 4)
+
+    def output_length(self, generation_config: dict) -> int:
+        tokens = self.output_tokens
+        if generation_config.get("max_output_tokens"):
+            tokens = min(tokens, generation_config["max_output_tokens"])
+        return tokens
+
+    async def generate(self, prompt: str, model_name: str, generation_config: dict) -> GenerationResult:
+        self.calls += 1
+        tokens = self.output_length(generation_config)
+        delay = self.sample_latency()
+        if self.token_rate > 0:
+            delay += tokens / self.token_rate
+        failed = self.rng.random() < self.error_rate
+
+        await asyncio.sleep(delay)
+        if failed:
+            raise BackendError("Fake upstream error", status_code=503)
+        candidate_count = generation_config.get("candidate_count", 1)
+        texts = [
+            self.make_text(prompt if i == 0 else f"{prompt}#{i}", tokens, generation_config)
+            for i in range(candidate_count)
+        ]
+        return GenerationResult(
+            text=texts[0],
+            model=model_name,
+            prompt_tokens=self.count_tokens(prompt),
+            output_tokens=tokens * candidate_count,
+            candidates=texts if candidate_count > 1 else None,
+        )
+
+    async def stream(
+        self, prompt: str, model_name: str, generation_config: dict, usage: Optional[dict] = None
+    ) -> AsyncIterator[str]:
+        self.calls += 1
+        words = self.make_text(prompt, self.output_length(generation_config), generation_config).split(" ")
+        delay = self.sample_latency()
+        failed = self.rng.random() < self.error_rate
+
+        await asyncio.sleep(delay)
+        if failed:
+            raise BackendError("Fake upstream error", status_code=503)
+        # Emit a few tokens per chunk, paced by the token rate
+        chunk_size = 5
+        for i in range(0, len(words), chunk_size):
+            chunk = words[i:i + chunk_size]
+            if self.token_rate > 0:
+                await asyncio.sleep(len(chunk) / self.token_rate)
+            yield " ".join(chunk) + (" " if i + chunk_size < len(words) else "")
+        if usage is not None:
+            usage.update(prompt_tokens=self.count_tokens(prompt), output_tokens=len(words))
+
+
+def create_backend(kind: Optional[str] = None) -> ModelBackend:
+    """Build the backend selected by MODEL_BACKEND (gemini or fake)"""
+    kind = kind or os.getenv("MODEL_BACKEND", "gemini")
+    if kind == "gemini":
+        return GeminiBackend(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            call_mode=os.getenv("GEMINI_CALL_MODE", "async"),
+            max_workers=int(os.getenv("GEMINI_MAX_WORKERS", "32")),
+        )
+    if kind == "fake":
+        return FakeBackend(
+            latency_ms=float(os.getenv("FAKE_LATENCY_MS", "200")),
+            latency_distribution=os.getenv("FAKE_LATENCY_DISTRIBUTION", "fixed"),
+            latency_sigma=float(os.getenv("FAKE_LATENCY_SIGMA", "0.5")),
+            token_rate=float(os.getenv("FAKE_TOKEN_RATE", "0")),
+            output_tokens=int(os.getenv("FAKE_OUTPUT_TOKENS", "50")),
+            error_rate=float(os.getenv("FAKE_ERROR_RATE", "0")),
+            seed=int(os.getenv("FAKE_SEED", "0")),
+        )
+    raise ValueError(f"Unknown MODEL_BACKEND: {kind}")
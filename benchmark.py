@@ -0,0 +1,742 @@
+"""
+Offline benchmarks for the Smart Content Generator API.
+
+The FastAPI app is driven in-process through its ASGI interface and the
+model backend is replaced with a local fake, so no network access or API
+key is needed.
+
+Usage:
+    python benchmark.py concurrency --requests 64 --latency-ms 200
+    python benchmark.py concurrency --backends fake gemini-thread --error-rate 0.05
+    python benchmark.py max-tokens --natural-tokens 2000 --token-rate 200
+    python benchmark.py translate-multi --languages Spanish French German Hindi
+    python benchmark.py summarize-large --sizes 10000 100000 1000000
+    python benchmark.py endpoints --concurrency 1 16 --save-baseline baseline.json
+    python benchmark.py endpoints --concurrency 1 16 --baseline baseline.json
+    python benchmark.py replay traffic.jsonl --speed 2 --latency-distribution lognormal
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import main
+from backends import FakeBackend, GeminiBackend
+from client import parse_sse
+from jobs import JobStore
+from recording import restore
+
+
+class FakeModel:
+    """
+    Stand-in for genai.GenerativeModel that just sleeps for a fixed latency.
+
+    Used to exercise GeminiBackend's async and thread-pool call paths.
+    """
+
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+
+    def generate_content(self, prompt, generation_config=None):
+        time.sleep(self.latency)
+        return FakeResponse(f"fake response to: {prompt[:40]}")
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        await asyncio.sleep(self.latency)
+        return FakeResponse(f"fake response to: {prompt[:40]}")
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StructuredFakeBackend(FakeBackend):
+    """FakeBackend that answers multi-language translation prompts with valid JSON"""
+
+    async def generate(self, prompt, model_name, generation_config):
+        result = await super().generate(prompt, model_name, generation_config)
+        first_line = prompt.split("\n", 1)[0]
+        marker = "into each of these languages: "
+        if marker in first_line:
+            languages = first_line.split(marker, 1)[1].rstrip(".").split(", ")
+            result.text = json.dumps({language: f"[{language}] {result.text}" for language in languages})
+        return result
+
+
+async def asgi_request(app, method: str, path: str, body=None, headers=None):
+    """Send a single HTTP request to an ASGI app and return (status, json_body)"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"benchmark"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(payload)).encode()),
+            *((name.lower().encode(), value.encode()) for name, value in (headers or {}).items()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    done = asyncio.Event()
+    request_sent = False
+    status = None
+    chunks = []
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # Only report a disconnect once the response has been fully sent
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    done.set()
+    raw = b"".join(chunks)
+    try:
+        return status, json.loads(raw) if raw else None
+    except ValueError:
+        return status, raw.decode(errors="replace")
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_load(path: str, make_body, total: int, concurrency: int):
+    """Fire `total` requests with at most `concurrency` in flight; make_body(i) builds request i"""
+
+    async def send(i):
+        status, _ = await asgi_request(main.app, "POST", path, make_body(i))
+        return status
+
+    return await run_requests(send, total, concurrency)
+
+
+async def run_requests(send, total: int, concurrency: int):
+    """Run send(i) for i in range(total), at most `concurrency` at once; send returns the HTTP status"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            status = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def probe_health(stop: asyncio.Event, samples: list):
+    """Measure /health latency while load is running"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asgi_request(main.app, "GET", "/health")
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.01)
+
+
+def make_backend(kind: str, args):
+    if kind == "fake":
+        return FakeBackend(
+            latency_ms=args.latency_ms,
+            latency_distribution=args.latency_distribution,
+            token_rate=args.token_rate,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+    fake_model = FakeModel(latency=args.latency_ms / 1000)
+    call_mode = kind.split("-", 1)[1]
+    return GeminiBackend(call_mode=call_mode, model_factory=lambda model_name: fake_model)
+
+
+async def bench_concurrency(args):
+    # Distinct prompts, so neither the cache nor request coalescing kicks in
+    def make_body(i):
+        return {"prompt": f"Write haiku #{i} about benchmarks", "temperature": 0.7}
+
+    results = []
+    for kind in args.backends:
+        main.backend = make_backend(kind, args)
+        for concurrency in args.concurrency:
+            stop = asyncio.Event()
+            health_samples = []
+            prober = asyncio.create_task(probe_health(stop, health_samples))
+            result = await run_load("/api/generate", make_body, args.requests, concurrency)
+            stop.set()
+            await prober
+            result["backend"] = kind
+            result["health_p95_ms"] = round(percentile(health_samples, 95) * 1000, 1)
+            results.append(result)
+            print(
+                f"backend={kind:<13} concurrency={concurrency:<4} "
+                f"throughput={result['throughput_rps']:>8} req/s  "
+                f"p50={result['p50_ms']:>7} ms  p95={result['p95_ms']:>7} ms  "
+                f"health_p95={result['health_p95_ms']:>6} ms  errors={result['errors']}"
+            )
+    return results
+
+
+async def bench_max_tokens(args):
+    """Latency of capped vs. effectively uncapped output lengths"""
+    main.backend = FakeBackend(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        token_rate=args.token_rate,
+        output_tokens=args.natural_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    text = "Benchmarks measure how fast things run. " * 50
+    scenarios = [
+        ("generate max_tokens=8000", "/api/generate", {"max_tokens": 8000}),
+        ("generate max_tokens=1000", "/api/generate", {"max_tokens": 1000}),
+        ("generate max_tokens=200", "/api/generate", {"max_tokens": 200}),
+        ("summarize uncapped", "/api/summarize", {"text": text, "length": "short", "max_tokens": 8000}),
+        ("summarize short (default cap)", "/api/summarize", {"text": text, "length": "short"}),
+        ("summarize medium (default cap)", "/api/summarize", {"text": text, "length": "medium"}),
+        ("summarize long (default cap)", "/api/summarize", {"text": text, "length": "long"}),
+    ]
+
+    results = []
+    for name, path, body in scenarios:
+        def make_body(i, body=body):
+            if path == "/api/generate":
+                return {"prompt": f"Write essay #{i}", "temperature": 0.9, **body}
+            return {**body, "text": f"{i}. {body['text']}"}
+
+        result = await run_load(path, make_body, args.requests, args.concurrency)
+        result["scenario"] = name
+        results.append(result)
+        print(f"{name:<32} p50={result['p50_ms']:>8} ms  p95={result['p95_ms']:>8} ms  errors={result['errors']}")
+    return results
+
+
+async def bench_translate_multi(args):
+    """N sequential single-language calls vs. one multi-language request"""
+    backend_kwargs = dict(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    results = []
+    for run in range(args.runs):
+        text = f"Good morning! How are you today? (run {run})"
+
+        main.backend = FakeBackend(**backend_kwargs)
+        start = time.perf_counter()
+        for language in args.languages:
+            await asgi_request(main.app, "POST", "/api/translate", {"text": text, "target_language": language})
+        sequential = time.perf_counter() - start
+
+        timings = {"sequential_ms": round(sequential * 1000, 1)}
+        for name, backend_class in (("single_call", StructuredFakeBackend), ("parallel_fallback", FakeBackend)):
+            main.backend = backend_class(**backend_kwargs)
+            start = time.perf_counter()
+            status, body = await asgi_request(
+                main.app, "POST", "/api/translate",
+                {"text": f"{text} [{name}]", "target_languages": args.languages}
+            )
+            timings[f"{name}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            timings[f"{name}_strategy"] = body["data"]["strategy"] if status == 200 else f"HTTP {status}"
+        timings["upstream_calls_sequential"] = len(args.languages)
+        results.append(timings)
+        print(
+            f"run {run}: sequential={timings['sequential_ms']} ms  "
+            f"single_call={timings['single_call_ms']} ms ({timings['single_call_strategy']})  "
+            f"parallel_fallback={timings['parallel_fallback_ms']} ms ({timings['parallel_fallback_strategy']})"
+        )
+    return results
+
+
+def make_document(size: int) -> str:
+    """Synthetic document of roughly `size` characters with distinct sentences and paragraphs"""
+    parts = []
+    length = 0
+    i = 0
+    while length < size:
+        sentence = f"Sentence {i} reports that metric {i % 97} changed by {i % 13} percent. "
+        if i % 8 == 7:
+            sentence += "\n\n"
+        parts.append(sentence)
+        length += len(sentence)
+        i += 1
+    return "".join(parts)[:size]
+
+
+async def bench_summarize_large(args):
+    """Map-reduce summarization latency and upstream calls by document size"""
+    main.backend = FakeBackend(
+        latency_ms=args.latency_ms,
+        latency_distribution=args.latency_distribution,
+        token_rate=args.token_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    main.summarizer.fan_out = args.fan_out
+    main.response_cache.clear()
+
+    results = []
+    for size in args.sizes:
+        body = {"text": make_document(size), "length": args.length}
+        start = time.perf_counter()
+        status, response = await asgi_request(main.app, "POST", "/api/summarize", body)
+        elapsed = time.perf_counter() - start
+        plan = response["data"].get("map_reduce") if status == 200 else None
+        result = {
+            "chars": size,
+            "status": status,
+            "latency_ms": round(elapsed * 1000, 1),
+            "chunks": plan["chunks"] if plan else 1,
+            "levels": plan["levels"] if plan else 0,
+            "upstream_calls": plan["upstream_calls"] if plan else 1,
+        }
+        results.append(result)
+        print(
+            f"chars={size:<9} status={status} latency={result['latency_ms']:>9} ms  "
+            f"chunks={result['chunks']:<5} levels={result['levels']} upstream_calls={result['upstream_calls']}"
+        )
+    return results
+
+
+# Endpoint suite: name -> request(i, tag) returning (method, path, body).
+# Inputs are distinct per request and per run, so the response cache and
+# request coalescing don't flatter the numbers.
+SUITE_TEXT = "Benchmarks measure how fast things run and where the time goes. " * 8
+# A manual-sized QA context (~50k tokens); the same text every time, so its retrieval index is cached
+SUITE_MANUAL = make_document(200_000)
+SUITE_CODE = "def fib(n):\n    return n if n <= 1 else fib(n - 1) + fib(n - 2)\n"
+
+ENDPOINT_SUITE = {
+    "health": lambda i, tag: ("GET", "/health", None),
+    "generate": lambda i, tag: ("POST", "/api/generate", {"prompt": f"Write haiku #{i} {tag}", "temperature": 0.7}),
+    "generate-stream": lambda i, tag: ("POST", "/api/generate/stream", {"prompt": f"Stream haiku #{i} {tag}"}),
+    "summarize": lambda i, tag: ("POST", "/api/summarize", {"text": f"{i} {tag}. {SUITE_TEXT}", "length": "short"}),
+    "summarize-stream": lambda i, tag: (
+        "POST", "/api/summarize/stream", {"text": f"{i} {tag}. {SUITE_TEXT}", "length": "short"}
+    ),
+    "translate": lambda i, tag: (
+        "POST", "/api/translate", {"text": f"Good morning #{i} {tag}", "target_language": "French"}
+    ),
+    "translate-multi": lambda i, tag: (
+        "POST", "/api/translate",
+        {"text": f"Good morning #{i} {tag}", "target_languages": ["Spanish", "French", "German", "Hindi"]},
+    ),
+    "translate-stream": lambda i, tag: (
+        "POST", "/api/translate/stream", {"text": f"Good morning #{i} {tag}", "target_language": "French"}
+    ),
+    "explain-code": lambda i, tag: ("POST", "/api/explain-code", {"code": f"# {i} {tag}\n{SUITE_CODE}"}),
+    "explain-code-stream": lambda i, tag: (
+        "POST", "/api/explain-code/stream", {"code": f"# {i} {tag}\n{SUITE_CODE}"}
+    ),
+    "qa": lambda i, tag: ("POST", "/api/qa", {"question": f"What is caching? (#{i} {tag})", "context": SUITE_TEXT}),
+    "qa-large-context": lambda i, tag: (
+        "POST", "/api/qa", {"question": f"How much did metric {i % 97} change? (#{tag})", "context": SUITE_MANUAL}
+    ),
+    "qa-stream": lambda i, tag: ("POST", "/api/qa/stream", {"question": f"What is caching? (#{i} {tag})"}),
+    "batch": lambda i, tag: (
+        "POST", "/api/batch",
+        {"tasks": [
+            {"type": "generate", "params": {"prompt": f"Batch haiku #{i}.{n} {tag}"}} for n in range(4)
+        ]},
+    ),
+    "jobs": lambda i, tag: ("POST", "/api/jobs", {"type": "generate", "params": {"prompt": f"Job haiku #{i} {tag}"}}),
+    "stats": lambda i, tag: ("GET", "/api/stats", None),
+    "metrics": lambda i, tag: ("GET", "/metrics", None),
+}
+
+
+def stream_status(status: int, data) -> int:
+    """Status of a streamed response: streams fail in-band, so only one that ends with "done" succeeded"""
+    if status != 200:
+        return status
+    events = list(parse_sse(data.splitlines())) if isinstance(data, str) else []
+    last_event, last_data = events[-1] if events else ("", {})
+    if last_event == "error":
+        return last_data.get("status_code") or 502
+    if last_event != "done":
+        return 502
+    return status
+
+
+async def suite_request(name: str, i: int, tag: str) -> int:
+    method, path, body = ENDPOINT_SUITE[name](i, tag)
+    status, data = await asgi_request(main.app, method, path, body)
+    if name == "jobs" and status == 202:
+        # A job counts as done when its result is in, not when it is accepted
+        status, data = await asgi_request(main.app, "GET", f"/api/jobs/{data['data']['job_id']}?wait=60")
+        if status == 200 and data["data"]["status"] != "succeeded":
+            status = data["data"].get("status_code") or 500
+    elif name.endswith("-stream"):
+        status = stream_status(status, data)
+    return status
+
+
+async def bench_endpoints(args):
+    """Throughput, latency percentiles and memory of every endpoint at each concurrency level"""
+    main.backend = make_backend("fake", args)
+    if "JOBS_DB_PATH" not in os.environ:
+        # Keep benchmark jobs out of the default jobs.db
+        main.job_queue.store = JobStore(":memory:")
+    names = args.endpoints or list(ENDPOINT_SUITE)
+    runs = []
+    for name in names:
+        for concurrency in args.concurrency:
+            tag = f"c{concurrency}-{time.perf_counter_ns()}"
+            result = await run_requests(
+                lambda i: suite_request(name, i, tag), args.requests, concurrency
+            )
+            if args.memory:
+                # Separate traced pass, since tracemalloc slows the requests it measures
+                tracemalloc.start()
+                await run_requests(lambda i: suite_request(name, i, f"{tag}-mem"), args.requests, concurrency)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                result["peak_memory_kb"] = round(peak / 1024, 1)
+            result["endpoint"] = name
+            runs.append(result)
+            print(
+                f"{name:<20} concurrency={concurrency:<4} throughput={result['throughput_rps']:>8} req/s  "
+                f"p50={result['p50_ms']:>7} ms  p95={result['p95_ms']:>7} ms  p99={result['p99_ms']:>7} ms  "
+                f"peak_mem={result.get('peak_memory_kb', '-'):>8} KB  errors={result['errors']}"
+            )
+
+    results = {
+        "suite": "endpoints",
+        "config": {
+            "requests": args.requests,
+            "latency_ms": args.latency_ms,
+            "latency_distribution": args.latency_distribution,
+            "token_rate": args.token_rate,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "runs": runs,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        changed = sorted(
+            key for key, value in results["config"].items() if baseline.get("config", {}).get(key) != value
+        )
+        if changed:
+            print(f"Warning: baseline was recorded with different settings ({', '.join(changed)})")
+        results["regressions"] = compare_to_baseline(baseline, results, args.tolerance)
+        report_regressions(results["regressions"], args.baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+    return results
+
+
+# Metric -> (True if a higher value is better, smallest absolute change that counts)
+BASELINE_METRICS = {
+    "throughput_rps": (True, 0.0),
+    "p50_ms": (False, 1.0),
+    "p95_ms": (False, 1.0),
+    "p99_ms": (False, 1.0),
+    "peak_memory_kb": (False, 64.0),
+}
+
+
+def compare_to_baseline(baseline: dict, current: dict, tolerance: float) -> list:
+    """
+    Runs that got worse than the baseline by more than `tolerance`
+    (a fraction, e.g. 0.2 = 20%) on any metric, matched by endpoint and
+    concurrency. Changes below a metric's absolute floor are ignored, and
+    throughput is only compared for runs whose baseline p50 is at least
+    1 ms; below that, event loop jitter dominates. Runs whose error count
+    went up are flagged as well.
+    """
+    previous = {(run["endpoint"], run["concurrency"]): run for run in baseline.get("runs", [])}
+    regressions = []
+    for run in current["runs"]:
+        old = previous.get((run["endpoint"], run["concurrency"]))
+        if old is None:
+            continue
+        for metric, (higher_is_better, floor) in BASELINE_METRICS.items():
+            if metric not in run or not old.get(metric):
+                continue
+            if metric == "throughput_rps" and old["p50_ms"] < 1.0:
+                continue
+            delta = run[metric] - old[metric]
+            worse = -delta if higher_is_better else delta
+            if worse > tolerance * old[metric] and worse >= floor:
+                regressions.append({
+                    "endpoint": run["endpoint"],
+                    "concurrency": run["concurrency"],
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "current": run[metric],
+                    "change_pct": round(delta / old[metric] * 100, 1),
+                })
+        if run["errors"] > old["errors"]:
+            regressions.append({
+                "endpoint": run["endpoint"],
+                "concurrency": run["concurrency"],
+                "metric": "errors",
+                "baseline": old["errors"],
+                "current": run["errors"],
+                "change_pct": None,
+            })
+    return regressions
+
+
+def report_regressions(regressions: list, baseline_path: str):
+    if not regressions:
+        print(f"No regressions against {baseline_path}")
+        return
+    print(f"{len(regressions)} regression(s) against {baseline_path}:")
+    for r in regressions:
+        change = f"{r['change_pct']:+}%" if r["change_pct"] is not None else ""
+        print(
+            f"  {r['endpoint']:<20} concurrency={r['concurrency']:<4} {r['metric']:<15} "
+            f"{r['baseline']} -> {r['current']} {change}"
+        )
+
+
+def load_traffic(path: str, limit: int = 0) -> list:
+    """Recorded requests (see recording.py) in arrival order"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a process that was killed mid-write
+                continue
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+def latency_summary(latencies: list) -> dict:
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+async def bench_replay(args):
+    """Re-drive a recorded traffic log at its original (or scaled) arrival times"""
+    main.backend = make_backend("fake", args)
+    records = [record for record in load_traffic(args.log, args.limit) if record.get("body") is not None]
+    if not records:
+        print(f"No replayable requests in {args.log}")
+        return {}
+    first_ts = records[0]["ts"]
+    by_path = {}
+    lags = []
+
+    async def one(record, due):
+        lags.append(time.perf_counter() - due)
+        path = record["path"] + (f"?{record['query']}" if record.get("query") else "")
+        start = time.perf_counter()
+        status, data = await asgi_request(
+            main.app, record["method"], path, restore(record["body"]), headers={"X-Client-ID": record["client"]}
+        )
+        if record["path"].endswith("/stream"):
+            status = stream_status(status, data)
+        stats = by_path.setdefault(record["path"], {"latencies": [], "recorded": [], "statuses": {}})
+        stats["latencies"].append(time.perf_counter() - start)
+        stats["recorded"].append(record["duration_ms"] / 1000)
+        stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+
+    # Open loop: requests are sent on schedule whether or not earlier ones have finished
+    tasks = []
+    start = time.perf_counter()
+    for record in records:
+        due = start + ((record["ts"] - first_ts) / args.speed if args.speed > 0 else 0)
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(record, due)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    def summarize(stats_list):
+        latencies = [value for stats in stats_list for value in stats["latencies"]]
+        recorded = [value for stats in stats_list for value in stats["recorded"]]
+        statuses = {}
+        for stats in stats_list:
+            for status, count in stats["statuses"].items():
+                statuses[status] = statuses.get(status, 0) + count
+        errors = sum(count for status, count in statuses.items() if status is None or status >= 400)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "error_rate": round(errors / len(latencies), 4) if latencies else 0.0,
+            "statuses": {str(status): count for status, count in sorted(statuses.items(), key=str)},
+            **latency_summary(latencies),
+            "recorded": latency_summary(recorded),
+        }
+
+    result = {
+        "log": args.log,
+        "speed": args.speed,
+        "elapsed_s": round(elapsed, 3),
+        "recorded_span_s": round(records[-1]["ts"] - first_ts, 3),
+        "throughput_rps": round(len(records) / elapsed, 2) if elapsed > 0 else 0.0,
+        "schedule_lag_p95_ms": round(percentile(lags, 95) * 1000, 1),
+        "overall": summarize(list(by_path.values())),
+        "paths": {path: summarize([stats]) for path, stats in sorted(by_path.items())},
+    }
+    for path, summary in [("overall", result["overall"]), *result["paths"].items()]:
+        print(
+            f"{path:<24} requests={summary['requests']:<6} errors={summary['error_rate']:>7.2%}  "
+            f"p50={summary['p50_ms']:>8} ms  p95={summary['p95_ms']:>8} ms  p99={summary['p99_ms']:>8} ms  "
+            f"(recorded p95={summary['recorded']['p95_ms']} ms)"
+        )
+    print(
+        f"replayed {len(records)} requests in {result['elapsed_s']} s "
+        f"(recorded span {result['recorded_span_s']} s, speed x{args.speed}), "
+        f"{result['throughput_rps']} req/s, schedule lag p95={result['schedule_lag_p95_ms']} ms"
+    )
+    return result
+
+
+def add_backend_args(parser):
+    parser.add_argument("--latency-ms", type=float, default=200, help="Fake model latency (median)")
+    parser.add_argument(
+        "--latency-distribution", default="fixed",
+        choices=["fixed", "uniform", "exponential", "lognormal"]
+    )
+    parser.add_argument("--token-rate", type=float, default=0, help="Fake output tokens per second (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fraction of fake calls that fail")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the Smart Content Generator API")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    concurrency = subparsers.add_parser("concurrency", help="Throughput vs. in-flight requests")
+    concurrency.add_argument("--requests", type=int, default=64, help="Requests per run")
+    concurrency.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    concurrency.add_argument(
+        "--backends", nargs="+", default=["fake", "gemini-async", "gemini-thread"],
+        choices=["fake", "gemini-async", "gemini-thread"],
+        help="fake = FakeBackend; gemini-* = GeminiBackend call modes over a fake model"
+    )
+    add_backend_args(concurrency)
+    concurrency.set_defaults(func=bench_concurrency)
+
+    max_tokens = subparsers.add_parser("max-tokens", help="Latency with and without output token caps")
+    max_tokens.add_argument("--requests", type=int, default=8, help="Requests per scenario")
+    max_tokens.add_argument("--concurrency", type=int, default=8)
+    max_tokens.add_argument(
+        "--natural-tokens", type=int, default=2000,
+        help="Tokens the fake model produces when not capped"
+    )
+    add_backend_args(max_tokens)
+    max_tokens.set_defaults(func=bench_max_tokens, token_rate=200)
+
+    translate_multi = subparsers.add_parser(
+        "translate-multi", help="Multi-language translation vs. sequential per-language calls"
+    )
+    translate_multi.add_argument("--languages", nargs="+", default=["Spanish", "French", "German", "Hindi"])
+    translate_multi.add_argument("--runs", type=int, default=3)
+    add_backend_args(translate_multi)
+    translate_multi.set_defaults(func=bench_translate_multi)
+
+    summarize_large = subparsers.add_parser("summarize-large", help="Map-reduce summarization by document size")
+    summarize_large.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    summarize_large.add_argument("--length", default="medium", choices=["short", "medium", "long"])
+    summarize_large.add_argument("--fan-out", type=int, default=8, help="Chunks summarized concurrently")
+    add_backend_args(summarize_large)
+    summarize_large.set_defaults(func=bench_summarize_large)
+
+    endpoints = subparsers.add_parser(
+        "endpoints", help="Throughput, p50/p95/p99 and memory of every endpoint, optionally against a baseline"
+    )
+    endpoints.add_argument(
+        "--endpoints", nargs="+", choices=list(ENDPOINT_SUITE), help="Endpoints to run (default: all)"
+    )
+    endpoints.add_argument("--requests", type=int, default=64, help="Requests per endpoint and concurrency level")
+    endpoints.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    endpoints.add_argument(
+        "--no-memory", dest="memory", action="store_false", help="Skip the tracemalloc pass that measures peak memory"
+    )
+    endpoints.add_argument("--baseline", help="Compare against results saved with --save-baseline")
+    endpoints.add_argument("--save-baseline", help="Save these results as the new baseline")
+    endpoints.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="Fractional change beyond which a metric counts as a regression"
+    )
+    add_backend_args(endpoints)
+    endpoints.set_defaults(func=bench_endpoints, latency_ms=50)
+
+    replay = subparsers.add_parser("replay", help="Re-drive a recorded traffic log (TRAFFIC_LOG_PATH)")
+    replay.add_argument("log", help="JSONL traffic log written by the recording middleware")
+    replay.add_argument(
+        "--speed", type=float, default=1.0,
+        help="Arrival rate multiplier (2 = twice as fast, 0 = send everything at once)"
+    )
+    replay.add_argument("--limit", type=int, default=0, help="Replay only the first N requests")
+    add_backend_args(replay)
+    replay.set_defaults(func=bench_replay)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(args.func(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    if isinstance(results, dict) and results.get("regressions"):
+        sys.exit(1)
@@ -0,0 +1,198 @@
+"""
+Offline bulk processing of JSONL task files.
+
+Each input line is a task record in the /api/batch task format, plus an
+optional caller-chosen "id":
+
+    {"id": "doc-17", "type": "summarize", "params": {"text": "...", "length": "short"}}
+
+Records run in-process through the API's own endpoint handlers (same
+prompt builders, caching, routing, retries and usage accounting), with at
+most --concurrency in flight. The input is read line by line and results
+are appended to the output as they finish, so memory use does not grow
+with the file size. Each output line looks like this:
+
+    {"index": 16, "id": "doc-17", "type": "summarize", "success": true, "data": {...}}
+
+The output file doubles as the checkpoint. With --resume, records that
+are already in it are skipped, so a killed run picks up where it stopped.
+With --retry-failed as well, failed records run again and their new
+line is appended; the last line for an index is the one that counts.
+
+The backend and every other setting come from the same environment
+variables as the API (MODEL_BACKEND, GEMINI_API_KEY, ...).
+
+Usage:
+    MODEL_BACKEND=fake python bulk.py tasks.jsonl results.jsonl --concurrency 16
+    python bulk.py tasks.jsonl results.jsonl --resume --retry-failed
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Optional, Set
+
+from pydantic import ValidationError
+
+import main
+from metrics import current_route
+from usage import current_client
+
+
+def load_checkpoint(output_path: str, retry_failed: bool) -> Set[int]:
+    """
+    Indices of records already in the output file.
+
+    A partial last line left by a killed run is cut off so appended
+    results start on a clean line.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    good_bytes = 0
+    with open(output_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_bytes += len(line)
+            if record.get("success") or not retry_failed:
+                done.add(record["index"])
+    with open(output_path, "r+b") as f:
+        f.truncate(good_bytes)
+    return done
+
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+class Progress:
+    """Throughput/ETA reporting to stderr"""
+
+    def __init__(self, total: Optional[int], skipped: int, interval: float):
+        self.total = total
+        self.skipped = skipped
+        self.interval = interval
+        self.succeeded = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    @property
+    def processed(self) -> int:
+        return self.succeeded + self.failed
+
+    def update(self, success: bool):
+        if success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        now = time.perf_counter()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def report(self):
+        rate = self.rate()
+        line = f"{self.processed} processed (ok={self.succeeded} failed={self.failed}) | {rate:.1f} records/s"
+        if self.total:
+            done = self.skipped + self.processed
+            line = f"{done}/{self.total} ({done / self.total:.0%}) | {line}"
+            if rate > 0:
+                line += f" | ETA {max(0, self.total - done) / rate:.0f}s"
+        print(line, file=sys.stderr, flush=True)
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        return {
+            "processed": self.processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "elapsed_s": round(elapsed, 2),
+            "records_per_s": round(self.rate(), 2),
+        }
+
+
+async def run_record(index: int, line: str) -> dict:
+    record = {"index": index}
+    try:
+        raw = json.loads(line)
+        record["id"] = raw.get("id") if isinstance(raw, dict) else None
+        task = main.BatchTask(**raw)
+    except (ValueError, TypeError, ValidationError) as e:
+        return {**record, "type": None, "success": False, "error": f"Invalid task record: {e}"}
+    return {**record, **await main.run_batch_task(task)}
+
+
+async def process(args) -> dict:
+    done = load_checkpoint(args.output, args.retry_failed) if args.resume else set()
+    total = None if args.no_count else count_lines(args.input)
+    progress = Progress(total, skipped=len(done), interval=args.progress_interval)
+    # Bounded hand-off between the reader and the workers keeps memory flat
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+
+    current_client.set(args.client_id)
+    current_route.set("bulk")
+    main.usage_tracker.start()
+
+    with open(args.output, "a" if args.resume else "w", encoding="utf-8") as out:
+        async def read():
+            with open(args.input, encoding="utf-8") as f:
+                for index, line in enumerate(f):
+                    if index in done or not line.strip():
+                        continue
+                    await queue.put((index, line))
+            for _ in range(args.concurrency):
+                await queue.put(None)
+
+        async def work():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                result = await run_record(*item)
+                # One flushed line per record: the output is also the checkpoint
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+                progress.update(result["success"])
+
+        await asyncio.gather(read(), *(work() for _ in range(args.concurrency)))
+
+    await main.usage_tracker.stop()
+    progress.report()
+    return progress.summary()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of API tasks offline")
+    parser.add_argument("input", help="JSONL file of {id?, type, params} task records")
+    parser.add_argument("output", help="JSONL file results are appended to (also the checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Records processed at once")
+    parser.add_argument("--resume", action="store_true", help="Skip records already in the output file")
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="With --resume, run records that failed last time again"
+    )
+    parser.add_argument("--client-id", default="bulk", help="Client the token usage is billed to")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    parser.add_argument("--no-count", action="store_true", help="Don't pre-count input lines (no ETA)")
+    args = parser.parse_args()
+    if not args.resume and os.path.exists(args.output) and os.path.getsize(args.output) > 0:
+        parser.error(f"{args.output} already exists; pass --resume to continue it or choose another file")
+
+    print(json.dumps(asyncio.run(process(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
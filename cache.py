@@ -0,0 +1,202 @@
+"""
+Response cache for deterministic (low-temperature) prompts.
+
+Entries are keyed on the final prompt, model name and generation config,
+and evicted by size (LRU) and age (TTL). An optional SQLite-backed tier
+is shared by every worker process on the host, so `uvicorn --workers N`
+does not divide the hit rate by N.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import asdict, replace
+from typing import Optional
+
+from cachetools import TTLCache
+
+from backends import GenerationResult
+
+
+def make_cache_key(prompt: str, model_name: str, generation_config: dict) -> str:
+    payload = json.dumps(
+        {"prompt": prompt, "model": model_name, "config": generation_config},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SharedCacheTier:
+    """
+    Cross-process cache tier stored in a SQLite file.
+
+    Values are zlib-compressed JSON. Total stored bytes are bounded by
+    max_bytes; the least recently read entries are evicted first.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def _get(self, key: str) -> Optional[GenerationResult]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return GenerationResult(**json.loads(zlib.decompress(row[0])))
+
+    def _set(self, key: str, result: GenerationResult):
+        value = zlib.compress(json.dumps(asdict(result)).encode())
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now + self.ttl_seconds, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        self.conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    # SQLite calls run in a worker thread so they never stall the event loop
+    async def get(self, key: str) -> Optional[GenerationResult]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, result: GenerationResult):
+        await asyncio.to_thread(self._set, key, result)
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        with self.lock:
+            entries, total = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"path": self.path, "entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+
+class ResponseCache:
+    """
+    In-process LRU + TTL cache of GenerationResults with hit/miss counters,
+    optionally backed by a SharedCacheTier.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        max_temperature: float = 0.5,
+        enabled: bool = True,
+        shared: Optional[SharedCacheTier] = None,
+    ):
+        self.enabled = enabled
+        self.max_temperature = max_temperature
+        self.entries = TTLCache(maxsize=max_entries, ttl=ttl_seconds)
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def is_cacheable(self, generation_config: dict) -> bool:
+        """Only deterministic-enough requests are cached"""
+        return self.enabled and generation_config.get("temperature", 1.0) <= self.max_temperature
+
+    async def get(self, key: str) -> Optional[GenerationResult]:
+        result = self.entries.get(key)
+        if result is None and self.shared is not None:
+            result = await self.shared.get(key)
+            if result is not None:
+                self.shared_hits += 1
+                self.entries[key] = result
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return replace(result, cached=True)
+
+    async def set(self, key: str, result: GenerationResult):
+        self.entries[key] = result
+        if self.shared is not None:
+            await self.shared.set(key, result)
+
+    def clear(self):
+        self.entries.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "max_entries": self.entries.maxsize,
+            "ttl_seconds": self.entries.ttl,
+            "max_temperature": self.max_temperature,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    """Build the response cache from RESPONSE_CACHE_* / SHARED_CACHE_* environment variables"""
+    ttl_seconds = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    shared = None
+    shared_path = os.getenv("SHARED_CACHE_PATH")
+    if shared_path:
+        shared = SharedCacheTier(
+            shared_path,
+            max_bytes=int(os.getenv("SHARED_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            ttl_seconds=ttl_seconds,
+        )
+    return ResponseCache(
+        max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024")),
+        ttl_seconds=ttl_seconds,
+        max_temperature=float(os.getenv("RESPONSE_CACHE_MAX_TEMPERATURE", "0.5")),
+        enabled=os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true",
+        shared=shared,
+    )
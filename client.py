@@ -0,0 +1,401 @@
+"""
+Python client for the Smart Content Generator API.
+
+ContentClient keeps one requests.Session, so calls reuse pooled
+keep-alive connections instead of opening a new one each time. Every call
+has a timeout, which is also sent as X-Request-Timeout so the server
+stops retrying upstream once the client would have given up. Connection
+errors and retryable statuses (429, 502, 503, 504) are retried with
+jittered exponential backoff. A server-sent Retry-After is honoured when
+it is short; a long one (e.g. an exhausted daily quota) fails at once.
+
+AsyncContentClient has the same methods as coroutines. It runs the
+pooled session on its own thread pool, so it needs no extra dependency.
+
+    with ContentClient("http://localhost:8000") as client:
+        print(client.generate("Write a haiku about caching")["generated_text"])
+        results = client.map("/api/translate", [{"text": t, "target_language": "French"} for t in texts])
+
+    async with AsyncContentClient() as client:
+        results = await client.gather("/api/summarize", payloads, concurrency=16)
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+DEFAULT_BASE_URL = os.getenv("CONTENT_API_URL", "http://localhost:8000")
+RETRYABLE_STATUS = {429, 502, 503, 504}
+
+
+class APIError(Exception):
+    """Error response from the API, or a failed stream"""
+
+    def __init__(self, status_code: Optional[int], detail: Any, retry_after: Optional[float] = None):
+        super().__init__(f"{status_code}: {detail}" if status_code else str(detail))
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def parse_sse(lines: Iterable[str]) -> Iterator[Tuple[str, dict]]:
+    """(event, data) pairs from server-sent event lines"""
+    event = "message"
+    for line in lines:
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: "):
+            yield event, json.loads(line[len("data: "):])
+            event = "message"
+
+
+def error_from_response(response: requests.Response) -> APIError:
+    try:
+        detail = response.json().get("detail", response.text)
+    except ValueError:
+        detail = response.text
+    retry_after = response.headers.get("Retry-After")
+    return APIError(response.status_code, detail, float(retry_after) if retry_after else None)
+
+
+class ContentClient:
+    """Synchronous client over a pooled keep-alive session"""
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        timeout: float = 60.0,
+        connect_timeout: float = 5.0,
+        retries: int = 2,
+        backoff: float = 0.5,
+        max_retry_after: float = 10.0,
+        pool_size: int = 16,
+        client_id: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if client_id:
+            self.session.headers["X-Client-ID"] = client_id
+        if api_key:
+            self.session.headers["X-API-Key"] = api_key
+
+    # Connection handling
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _should_retry(self, error: BaseException) -> bool:
+        if isinstance(error, (requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+            return True
+        if isinstance(error, APIError) and error.status_code in RETRYABLE_STATUS:
+            return error.retry_after is None or error.retry_after <= self.max_retry_after
+        return False
+
+    def _wait(self, retry_state) -> float:
+        error = retry_state.outcome.exception()
+        if isinstance(error, APIError) and error.retry_after is not None:
+            return error.retry_after
+        return wait_random_exponential(multiplier=self.backoff, max=self.max_retry_after)(retry_state)
+
+    def _send(self, method: str, path: str, timeout: Optional[float], stream: bool = False, **kwargs):
+        timeout = timeout or self.timeout
+        headers = {"X-Request-Timeout": str(timeout)}
+        response = self.session.request(
+            method,
+            f"{self.base_url}{path}",
+            headers=headers,
+            timeout=(self.connect_timeout, timeout),
+            stream=stream,
+            **kwargs,
+        )
+        if response.status_code >= 400:
+            error = error_from_response(response)
+            response.close()
+            raise error
+        return response
+
+    def _with_retries(self, call):
+        retrying = Retrying(
+            retry=retry_if_exception(self._should_retry),
+            stop=stop_after_attempt(self.retries + 1),
+            wait=self._wait,
+            reraise=True,
+        )
+        return retrying(call)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        json_body: Optional[dict] = None,
+        params: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Send a request and return the decoded JSON body; raises APIError on an error status"""
+        response = self._with_retries(lambda: self._send(method, path, timeout, json=json_body, params=params))
+        return response.json()
+
+    def post(self, path: str, payload: dict, timeout: Optional[float] = None) -> dict:
+        """POST to an endpoint and return the `data` of its APIResponse"""
+        return self.request("POST", path, payload, timeout=timeout)["data"]
+
+    # Endpoints
+
+    def health(self, timeout: Optional[float] = None) -> dict:
+        return self.request("GET", "/health", timeout=timeout)
+
+    def generate(self, prompt: str, temperature: float = 0.7, max_tokens: Optional[int] = None, **options) -> dict:
+        payload = {"prompt": prompt, "temperature": temperature, **options}
+        if max_tokens:
+            payload["max_tokens"] = max_tokens
+        return self.post("/api/generate", payload)
+
+    def summarize(self, text: str, length: str = "medium", **options) -> dict:
+        return self.post("/api/summarize", {"text": text, "length": length, **options})
+
+    def translate(
+        self,
+        text: str,
+        target_language: Optional[str] = None,
+        target_languages: Optional[List[str]] = None,
+        **options,
+    ) -> dict:
+        payload = {"text": text, **options}
+        if target_languages:
+            payload["target_languages"] = target_languages
+        else:
+            payload["target_language"] = target_language
+        return self.post("/api/translate", payload)
+
+    def explain_code(self, code: str, language: str = "Python", **options) -> dict:
+        return self.post("/api/explain-code", {"code": code, "language": language, **options})
+
+    def qa(self, question: str, context: Optional[str] = None, **options) -> dict:
+        payload = {"question": question, **options}
+        if context:
+            payload["context"] = context
+        return self.post("/api/qa", payload)
+
+    def batch(self, tasks: List[dict], concurrency: Optional[int] = None) -> dict:
+        payload = {"tasks": tasks}
+        if concurrency:
+            payload["concurrency"] = concurrency
+        return self.post("/api/batch", payload)
+
+    def submit_job(self, job_type: str, params: dict, priority: str = "normal") -> dict:
+        return self.post("/api/jobs", {"type": job_type, "params": params, "priority": priority})
+
+    def get_job(self, job_id: str, wait: float = 0) -> dict:
+        # A long poll holds the connection for up to `wait` seconds
+        return self.request("GET", f"/api/jobs/{job_id}", params={"wait": wait}, timeout=self.timeout + wait)["data"]
+
+    def usage(self, day: Optional[str] = None) -> dict:
+        return self.request("GET", "/api/usage", params={"day": day} if day else None)
+
+    def stats(self) -> dict:
+        return self.request("GET", "/api/stats")
+
+    # Streaming
+
+    def stream_events(self, endpoint: str, payload: dict, timeout: Optional[float] = None) -> Iterator[Tuple[str, dict]]:
+        """
+        (event, data) pairs from the streaming variant of `endpoint`
+        ("chunk" events, then "done" or "error"). Only opening the stream
+        is retried; once chunks have arrived, a failure is raised.
+        """
+        response = self._with_retries(lambda: self._send("POST", f"{endpoint}/stream", timeout, stream=True, json=payload))
+        with response:
+            yield from parse_sse(response.iter_lines(decode_unicode=True))
+
+    def stream(self, endpoint: str, payload: dict, timeout: Optional[float] = None) -> Iterator[str]:
+        """
+        Text chunks from the streaming variant of `endpoint`. The final
+        `done` event's data is the generator's return value.
+        """
+        for event, data in self.stream_events(endpoint, payload, timeout):
+            if event == "chunk":
+                yield data["text"]
+            elif event == "done":
+                return data["data"]
+            elif event == "error":
+                raise APIError(data.get("status_code"), data["detail"], data.get("retry_after"))
+        raise APIError(None, "Stream ended unexpectedly")
+
+    # Fan-out
+
+    def map(
+        self,
+        endpoint: str,
+        payloads: Iterable[dict],
+        concurrency: int = 8,
+        return_exceptions: bool = True,
+    ) -> List[Any]:
+        """
+        POST every payload to `endpoint`, at most `concurrency` at a time,
+        and return the `data` of each response in input order. With
+        return_exceptions, failed items are returned as their APIError
+        instead of stopping the whole run.
+        """
+        payloads = list(payloads)
+
+        def one(payload):
+            try:
+                return self.post(endpoint, payload)
+            except (APIError, requests.RequestException) as e:
+                if not return_exceptions:
+                    raise
+                return e
+
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, self.pool_size, len(payloads) or 1))) as pool:
+            return list(pool.map(one, payloads))
+
+    def imap(self, endpoint: str, payloads: Iterable[dict], concurrency: int = 8) -> Iterator[Tuple[int, Any, float]]:
+        """
+        Like map(), but yields (index, data or APIError, seconds) as each
+        request finishes, for progress reporting. Closing the generator
+        early cancels the requests that haven't started.
+        """
+        payloads = list(payloads)
+
+        def one(payload):
+            start = time.perf_counter()
+            try:
+                result = self.post(endpoint, payload)
+            except (APIError, requests.RequestException) as e:
+                result = e
+            return result, time.perf_counter() - start
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(concurrency, self.pool_size, len(payloads) or 1)))
+        try:
+            futures = {pool.submit(one, payload): index for index, payload in enumerate(payloads)}
+            for future in as_completed(futures):
+                yield (futures[future], *future.result())
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncContentClient:
+    """
+    Asynchronous client with the same methods as ContentClient.
+
+    Calls run on a private thread pool sized to the connection pool, over
+    one shared keep-alive session.
+    """
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, **kwargs):
+        self.sync = ContentClient(base_url, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=self.sync.pool_size, thread_name_prefix="content-client")
+
+    async def close(self):
+        self.executor.shutdown(wait=False)
+        self.sync.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _call(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: fn(*args, **kwargs))
+
+    async def request(self, method: str, path: str, json_body: Optional[dict] = None, params=None, timeout=None):
+        return await self._call(self.sync.request, method, path, json_body, params, timeout)
+
+    async def post(self, path: str, payload: dict, timeout: Optional[float] = None) -> dict:
+        return await self._call(self.sync.post, path, payload, timeout)
+
+    async def health(self, timeout: Optional[float] = None) -> dict:
+        return await self._call(self.sync.health, timeout)
+
+    async def generate(self, prompt: str, **options) -> dict:
+        return await self._call(self.sync.generate, prompt, **options)
+
+    async def summarize(self, text: str, **options) -> dict:
+        return await self._call(self.sync.summarize, text, **options)
+
+    async def translate(self, text: str, **options) -> dict:
+        return await self._call(self.sync.translate, text, **options)
+
+    async def explain_code(self, code: str, **options) -> dict:
+        return await self._call(self.sync.explain_code, code, **options)
+
+    async def qa(self, question: str, **options) -> dict:
+        return await self._call(self.sync.qa, question, **options)
+
+    async def batch(self, tasks: List[dict], concurrency: Optional[int] = None) -> dict:
+        return await self._call(self.sync.batch, tasks, concurrency)
+
+    async def submit_job(self, job_type: str, params: dict, priority: str = "normal") -> dict:
+        return await self._call(self.sync.submit_job, job_type, params, priority)
+
+    async def get_job(self, job_id: str, wait: float = 0) -> dict:
+        return await self._call(self.sync.get_job, job_id, wait)
+
+    async def usage(self, day: Optional[str] = None) -> dict:
+        return await self._call(self.sync.usage, day)
+
+    async def stats(self) -> dict:
+        return await self._call(self.sync.stats)
+
+    async def stream_events(self, endpoint: str, payload: dict, timeout=None) -> AsyncIterator[Tuple[str, dict]]:
+        events = self.sync.stream_events(endpoint, payload, timeout)
+        done = object()
+        try:
+            while True:
+                item = await self._call(next, events, done)
+                if item is done:
+                    return
+                yield item
+        finally:
+            events.close()
+
+    async def stream(self, endpoint: str, payload: dict, timeout=None) -> AsyncIterator[str]:
+        """Text chunks from the streaming variant of `endpoint`"""
+        async for event, data in self.stream_events(endpoint, payload, timeout):
+            if event == "chunk":
+                yield data["text"]
+            elif event == "done":
+                return
+            elif event == "error":
+                raise APIError(data.get("status_code"), data["detail"], data.get("retry_after"))
+        raise APIError(None, "Stream ended unexpectedly")
+
+    async def gather(
+        self,
+        endpoint: str,
+        payloads: Iterable[dict],
+        concurrency: int = 8,
+        return_exceptions: bool = True,
+    ) -> List[Any]:
+        """Async counterpart of ContentClient.map: results in input order, at most `concurrency` in flight"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one(payload):
+            async with semaphore:
+                return await self.post(endpoint, payload)
+
+        return await asyncio.gather(*(one(payload) for payload in payloads), return_exceptions=return_exceptions)
@@ -1,28 +1,27 @@
 """
 Example usage of the Gemini Content API
 """
-import requests
-import json
+from client import ContentClient
 
 API_URL = "http://localhost:8000"
 
+client = ContentClient(API_URL)
+
 def example_1_generate_story():
     """Generate a creative story"""
     print("Example 1: Generate Story")
     print("-" * 50)
     
-    response = requests.post(
-        f"{API_URL}/api/generate",
-        json={
+    # Print the story as it is generated
+    for chunk in client.stream(
+        "/api/generate",
+        {
             "prompt": "Write a short sci-fi story about a programmer who discovers their code is alive",
             "temperature": 0.9,
             "max_tokens": 500
         }
-    )
-    
-    result = response.json()
-    if result['success']:
-        print(result['data']['generated_text'])
+    ):
+        print(chunk, end="", flush=True)
     print("\n")
 
 def example_2_summarize_article():
@@ -44,17 +43,8 @@ def example_2_summarize_article():
     for machine learning have made Python the go-to language for many domains.
     """
     
-    response = requests.post(
-        f"{API_URL}/api/summarize",
-        json={
-            "text": long_text,
-            "length": "short"
-        }
-    )
-    
-    result = response.json()
-    if result['success']:
-        print(f"Summary: {result['data']['summary']}")
+    data = client.summarize(long_text, length="short")
+    print(f"Summary: {data['summary']}")
     print("\n")
 
 def example_3_translate_multiple():
@@ -65,18 +55,12 @@ def example_3_translate_multiple():
     text = "Good morning! How are you today?"
     languages = ["Spanish", "French", "German", "Hindi"]
     
-    for lang in languages:
-        response = requests.post(
-            f"{API_URL}/api/translate",
-            json={
-                "text": text,
-                "target_language": lang
-            }
-        )
-        
-        result = response.json()
-        if result['success']:
-            print(f"{lang}: {result['data']['translated']}")
+    # One request and one model call for all languages
+    data = client.translate(text, target_languages=languages)
+    for lang, translated in data['translations'].items():
+        print(f"{lang}: {translated}")
+    if data['latency_saved_ms'] is not None:
+        print(f"(saved ~{data['latency_saved_ms']} ms vs. {len(languages)} sequential calls)")
     print("\n")
 
 def example_4_explain_complex_code():
@@ -95,17 +79,8 @@ def quicksort(arr):
     return quicksort(left) + middle + quicksort(right)
     """
     
-    response = requests.post(
-        f"{API_URL}/api/explain-code",
-        json={
-            "code": code,
-            "language": "Python"
-        }
-    )
-    
-    result = response.json()
-    if result['success']:
-        print(result['data']['explanation'])
+    data = client.explain_code(code, language="Python")
+    print(data['explanation'])
     print("\n")
 
 def example_5_qa_with_context():
@@ -124,16 +99,13 @@ def example_5_qa_with_context():
         }
     ]
     
-    for q in questions:
-        response = requests.post(
-            f"{API_URL}/api/qa",
-            json=q
-        )
-        
-        result = response.json()
-        if result['success']:
-            print(f"Q: {result['data']['question']}")
-            print(f"A: {result['data']['answer']}\n")
+    # Both questions are asked at once; answers come back in input order
+    for data in client.map("/api/qa", questions, concurrency=4):
+        if isinstance(data, Exception):
+            print(f"Failed: {data}\n")
+            continue
+        print(f"Q: {data['question']}")
+        print(f"A: {data['answer']}\n")
     print("\n")
 
 if __name__ == "__main__":
@@ -0,0 +1,428 @@
+"""
+Asynchronous job queue for long-running requests.
+
+Submitting a job stores it in a SQLite file and returns its ID at once.
+A fixed pool of workers takes jobs from an in-memory priority queue
+(high before normal before low, FIFO within a class) and writes the
+result back to the store. Clients poll, or long-poll, for the outcome.
+Finished jobs are deleted once their result TTL has passed.
+
+Several processes can share one job file. A worker claims a job with a
+conditional UPDATE, so each job runs once, and keeps a heartbeat on it
+while it runs. Running jobs whose heartbeat is older than the lease (the
+process died) are requeued at start and by the sweeper, so accepted work
+is not lost. Jobs running at a clean shutdown are handed back at once.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail a job with an HTTP-like status code"""
+
+    def __init__(self, message: str, status_code: int = 500):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class Job:
+    id: str
+    type: str
+    params: Dict[str, Any]
+    priority: str = "normal"
+    client: str = "anonymous"
+    status: str = QUEUED
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    expires_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+
+
+class JobStore:
+    """SQLite table of jobs; every method is blocking and meant for asyncio.to_thread"""
+
+    COLUMNS = [
+        "id", "type", "params", "priority", "client", "status", "created_at",
+        "started_at", "finished_at", "expires_at", "result", "error", "status_code",
+    ]
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # Opened on first use, so importing the app (e.g. from a CLI) doesn't create the file
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def connection(self) -> sqlite3.Connection:
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    priority TEXT NOT NULL,
+                    client TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    expires_at REAL,
+                    result TEXT,
+                    error TEXT,
+                    status_code INTEGER,
+                    heartbeat_at REAL
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "heartbeat_at" not in columns:
+                # Files created before job leases
+                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self.conn = conn
+        return self.conn
+
+    def _row_to_job(self, row) -> Job:
+        values = dict(zip(self.COLUMNS, row))
+        values["params"] = json.loads(values["params"])
+        values["result"] = json.loads(values["result"]) if values["result"] is not None else None
+        return Job(**values)
+
+    def save(self, job: Job):
+        values = asdict(job)
+        values["params"] = json.dumps(job.params)
+        values["result"] = json.dumps(job.result, default=str) if job.result is not None else None
+        with self.lock:
+            self.connection().execute(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                [values[column] for column in self.COLUMNS],
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.lock:
+            row = self.connection().execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def queued(self) -> List[Job]:
+        """Jobs waiting for a worker, oldest first"""
+        with self.lock:
+            rows = self.connection().execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def claim(self, job_id: str, now: float) -> bool:
+        """Mark a queued job running; False if another worker claimed it first"""
+        with self.lock:
+            return self.connection().execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, now, now, job_id, QUEUED),
+            ).rowcount == 1
+
+    def heartbeat(self, job_ids: List[str], now: float):
+        with self.lock:
+            self.connection().executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                [(now, job_id, RUNNING) for job_id in job_ids],
+            )
+
+    def release(self, job_ids: List[str]):
+        """Put running jobs back in the queue (their worker is shutting down)"""
+        with self.lock:
+            self.connection().executemany(
+                "UPDATE jobs SET status = ?, started_at = NULL, heartbeat_at = NULL WHERE id = ? AND status = ?",
+                [(QUEUED, job_id, RUNNING) for job_id in job_ids],
+            )
+
+    def requeue_stale(self, stale_before: float) -> List[Job]:
+        """Requeue running jobs with no heartbeat since `stale_before` (their process died)"""
+        stale = "status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?)"
+        with self.lock:
+            conn = self.connection()
+            rows = conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE {stale} ORDER BY created_at",
+                (RUNNING, stale_before),
+            ).fetchall()
+            jobs = []
+            for row in rows:
+                job = self._row_to_job(row)
+                # Re-check, in case the job's worker sent a heartbeat since the SELECT
+                if conn.execute(
+                    f"UPDATE jobs SET status = ?, started_at = NULL, heartbeat_at = NULL WHERE id = ? AND {stale}",
+                    (QUEUED, job.id, RUNNING, stale_before),
+                ).rowcount:
+                    job.status = QUEUED
+                    job.started_at = None
+                    jobs.append(job)
+        return jobs
+
+    def delete_expired(self, now: float) -> int:
+        with self.lock:
+            return self.connection().execute(
+                "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+
+
+class JobQueue:
+    """
+    Bounded priority queue with a fixed pool of workers.
+
+    `handler(job)` runs the job and returns its result data; raising
+    JobFailed (or any exception) fails the job.
+    """
+
+    # How often a long poll re-reads the store for jobs finished by another process
+    POLL_SECONDS = 1.0
+    # Back-off after a store error (e.g. "database is locked"), doubled up to STORE_RETRY_MAX_SECONDS
+    STORE_RETRY_SECONDS = 0.5
+    STORE_RETRY_MAX_SECONDS = 30.0
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: Callable[[Job], Awaitable[Dict[str, Any]]],
+        workers: int = 4,
+        max_queued: int = 1000,
+        result_ttl_seconds: float = 3600,
+        sweep_interval: float = 60.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl_seconds = result_ttl_seconds
+        self.sweep_interval = sweep_interval
+        self.lease_seconds = lease_seconds
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        # Tie-breaker so jobs of equal priority run in submission order
+        self.sequence = itertools.count()
+        self.waiters: Dict[str, asyncio.Event] = {}
+        self.tasks: List[asyncio.Task] = []
+        # IDs of jobs this process is running, kept alive by heartbeat()
+        self.active: Set[str] = set()
+        self.running = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+        self.recovered = 0
+        self.expired = 0
+
+    def _enqueue(self, job: Job):
+        self.queue.put_nowait((PRIORITIES[job.priority], next(self.sequence), job.id))
+
+    async def start(self):
+        if self.tasks:
+            return
+        self.queue = asyncio.PriorityQueue()
+        # Jobs left running by a process that died, then everything waiting
+        # (including jobs other live processes have queued; claims decide who runs them)
+        await asyncio.to_thread(self.store.requeue_stale, time.time() - self.lease_seconds)
+        for job in await asyncio.to_thread(self.store.queued):
+            self._enqueue(job)
+            self.recovered += 1
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.sweep()))
+        self.tasks.append(asyncio.create_task(self.heartbeat()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.active:
+            # Hand interrupted jobs back now rather than after their lease runs out
+            try:
+                await asyncio.to_thread(self.store.release, list(self.active))
+            except sqlite3.Error as e:
+                # They are requeued by the next sweep once their lease runs out
+                logger.warning("Could not release running jobs in %s: %s", self.store.path, e)
+            self.active.clear()
+
+    async def submit(
+        self, job_type: str, params: Dict[str, Any], priority: str = "normal", client: str = "anonymous"
+    ) -> Job:
+        if self.queue is None:
+            # Started lazily when the app runs without lifespan events (e.g. in-process benchmarks)
+            await self.start()
+        if self.queue.qsize() >= self.max_queued:
+            self.rejected += 1
+            raise JobQueueFull(f"Job queue is full ({self.max_queued} jobs waiting)")
+        job = Job(
+            id=uuid.uuid4().hex,
+            type=job_type,
+            params=params,
+            priority=priority,
+            client=client,
+            created_at=time.time(),
+        )
+        # Persist before acknowledging, so an accepted job survives a restart
+        await asyncio.to_thread(self.store.save, job)
+        self._enqueue(job)
+        self.submitted += 1
+        return job
+
+    async def get(self, job_id: str, wait: float = 0) -> Optional[Job]:
+        """Current state of a job; with `wait`, block up to that many seconds for it to finish"""
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job.status in FINISHED or wait <= 0:
+            return self._visible(job)
+        event = self.waiters.setdefault(job_id, asyncio.Event())
+        deadline = time.monotonic() + wait
+        while True:
+            # Wake early when this process finishes the job; re-read the store
+            # now and then in case another process sharing it did
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(self.POLL_SECONDS, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if job is None or job.status in FINISHED:
+                self.waiters.pop(job_id, None)
+                return self._visible(job)
+            if time.monotonic() >= deadline:
+                return self._visible(job)
+
+    def _visible(self, job: Optional[Job]) -> Optional[Job]:
+        # Expired results are gone even if the sweeper hasn't deleted them yet
+        if job is not None and job.expires_at is not None and job.expires_at <= time.time():
+            return None
+        return job
+
+    async def work(self):
+        while True:
+            priority, sequence, job_id = await self.queue.get()
+            try:
+                job = await asyncio.to_thread(self.store.get, job_id)
+                if job is None or job.status != QUEUED:
+                    continue
+                job.started_at = time.time()
+                # Another process sharing the file may have claimed it first
+                if not await asyncio.to_thread(self.store.claim, job_id, job.started_at):
+                    continue
+            except sqlite3.Error as e:
+                # A busy or locked store must not kill the worker: put the job back and try again later
+                logger.warning("Could not claim job %s in %s: %s", job_id, self.store.path, e)
+                self.queue.put_nowait((priority, sequence, job_id))
+                await asyncio.sleep(self.STORE_RETRY_SECONDS)
+                continue
+            job.status = RUNNING
+            self.active.add(job_id)
+            self.running += 1
+            try:
+                job.result = await self.handler(job)
+                job.status = SUCCEEDED
+                self.succeeded += 1
+            except asyncio.CancelledError:
+                # Shutting down: stop() hands it back to the queue
+                raise
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e) or type(e).__name__
+                job.status_code = getattr(e, "status_code", 500)
+                self.failed += 1
+            finally:
+                self.running -= 1
+            job.finished_at = time.time()
+            job.expires_at = job.finished_at + self.result_ttl_seconds
+            await self._save_finished(job)
+            self.active.discard(job_id)
+            event = self.waiters.pop(job_id, None)
+            if event is not None:
+                event.set()
+
+    async def _save_finished(self, job: Job):
+        # Keep trying: the result only exists here, and the job stays in
+        # `active` meanwhile, so its lease is renewed and nobody re-runs it
+        delay = self.STORE_RETRY_SECONDS
+        while True:
+            try:
+                await asyncio.to_thread(self.store.save, job)
+                return
+            except sqlite3.Error as e:
+                logger.warning("Could not save job %s in %s (retrying in %.1fs): %s", job.id, self.store.path, delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.STORE_RETRY_MAX_SECONDS)
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.expired += await asyncio.to_thread(self.store.delete_expired, time.time())
+                for job in await asyncio.to_thread(self.store.requeue_stale, time.time() - self.lease_seconds):
+                    self._enqueue(job)
+                    self.recovered += 1
+            except sqlite3.Error as e:
+                logger.warning("Could not sweep jobs in %s: %s", self.store.path, e)
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self.active:
+                continue
+            try:
+                await asyncio.to_thread(self.store.heartbeat, list(self.active), time.time())
+            except sqlite3.Error as e:
+                logger.warning("Could not renew job leases in %s: %s", self.store.path, e)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.store.path,
+            "workers": self.workers,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "max_queued": self.max_queued,
+            "running": self.running,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "recovered": self.recovered,
+            "expired": self.expired,
+            "result_ttl_seconds": self.result_ttl_seconds,
+            "lease_seconds": self.lease_seconds,
+        }
+
+
+def create_job_queue(handler: Callable[[Job], Awaitable[Dict[str, Any]]]) -> JobQueue:
+    """Build the job queue from JOBS_* environment variables"""
+    return JobQueue(
+        JobStore(os.getenv("JOBS_DB_PATH", "jobs.db")),
+        handler,
+        workers=int(os.getenv("JOBS_WORKERS", "4")),
+        max_queued=int(os.getenv("JOBS_MAX_QUEUED", "1000")),
+        result_ttl_seconds=float(os.getenv("JOBS_RESULT_TTL_SECONDS", "3600")),
+        lease_seconds=float(os.getenv("JOBS_LEASE_SECONDS", "60")),
+    )
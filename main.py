@@ -1,17 +1,168 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, List
-import google.generativeai as genai
-from functools import lru_cache
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, model_validator
+from typing import Any, AsyncIterator, Callable, Dict, Literal, Optional, List, Tuple
+import asyncio
+import json
 import os
+import time
 from dotenv import load_dotenv
 
+from backends import DEFAULT_MODEL, GenerationResult, create_backend
+from cache import create_response_cache, make_cache_key
+from semantic_cache import SemanticQuery, create_semantic_cache
+from metrics import HTTPMetrics, LatencyWindow, MetricsMiddleware, MetricsRegistry, current_route
+from ratelimit import RateLimitExceeded, create_admission_controller, retry_after_header
+from routing import Route, create_routing_table
+from resilience import CircuitOpen, DeadlineMiddleware, classify_error, create_model_chain, create_retry_policy
+from singleflight import SingleFlight
+from summarizer import MapReduceSummarizer, ReductionPlan, estimate_tokens
+from jobs import Job, JobFailed, JobQueueFull, create_job_queue
+from recording import RecordingMiddleware
+from retrieval import DocumentNotFound, Retrieval, content_hash, create_context_retriever
+from usage import ClientIdentityMiddleware, QuotaExceeded, create_usage_tracker, current_client
+
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Model backend (MODEL_BACKEND=gemini by default, "fake" for offline load tests)
+backend = create_backend()
+
+# Cache for deterministic (low-temperature) responses
+response_cache = create_response_cache()
+
+# Requests/minute and tokens/minute budget for upstream calls
+admission = create_admission_controller()
+
+# Near-duplicate prompt cache for generate and QA (SEMANTIC_CACHE_*, off by default)
+semantic_cache = create_semantic_cache()
+
+# Passage retrieval for QA contexts over the token budget (QA_RETRIEVAL_*)
+qa_retriever = create_context_retriever()
+# Largest QA context or document accepted for indexing
+QA_CONTEXT_MAX_CHARS = int(os.getenv("QA_CONTEXT_MAX_CHARS", "2000000"))
+
+# Token usage per client (X-Client-ID / X-API-Key) and optional daily quotas
+usage_tracker = create_usage_tracker()
+
+# Retries for transient upstream errors, within each request's deadline
+retry_policy = create_retry_policy()
+
+# Per-model circuit breakers and the failover chain (MODEL_CHAIN)
+model_chain = create_model_chain(DEFAULT_MODEL)
+
+# Per-endpoint model/config routing (ROUTING_CONFIG_PATH, hot-reloaded)
+routing_table = create_routing_table()
+
+# Identical concurrent requests share a single upstream call
+inflight_requests = SingleFlight()
+
+# Upstream latency of single-language translations, used to estimate what
+# a multi-language request would have cost as sequential calls
+translate_call_latency = LatencyWindow()
+
+# Prometheus metrics, served at /metrics; /api/stats reads the same registry
+registry = MetricsRegistry(prefix="gemini_api_")
+http_metrics = HTTPMetrics(registry)
+upstream_latency = registry.histogram(
+    "upstream_duration_seconds", "Upstream model latency per call, retries and failover included", ("route", "model")
+)
+time_to_first_token = registry.histogram(
+    "time_to_first_token_seconds", "Time from request start to the first streamed chunk", ("route",)
+)
+prompt_chars = registry.counter("prompt_chars_total", "Prompt characters sent upstream", ("route",))
+response_chars = registry.counter("response_chars_total", "Response characters received from upstream", ("route",))
+prompt_tokens = registry.counter(
+    "prompt_tokens_total", "Prompt tokens sent upstream (as reported by the model, else estimated)", ("route", "model")
+)
+output_tokens = registry.counter(
+    "output_tokens_total", "Output tokens received (as reported by the model, else estimated)", ("route", "model")
+)
+upstream_errors = registry.counter(
+    "upstream_errors_total", "Upstream failures after retries, by error class", ("error_class",)
+)
+registry.callback(
+    "cache_lookups_total",
+    "Response cache lookups by result",
+    lambda: {
+        ("hit",): response_cache.hits - response_cache.shared_hits,
+        ("shared_hit",): response_cache.shared_hits,
+        ("miss",): response_cache.misses,
+        ("bypass",): response_cache.bypassed,
+    },
+    ("result",),
+    kind="counter",
+)
+registry.callback(
+    "semantic_cache_lookups_total",
+    "Semantic cache lookups by result",
+    lambda: {("hit",): semantic_cache.hits, ("miss",): semantic_cache.misses},
+    ("result",),
+    kind="counter",
+)
+registry.callback(
+    "semantic_cache_threshold", "Similarity needed for a semantic cache hit", lambda: {(): semantic_cache.threshold}
+)
+registry.histogram(
+    "semantic_cache_lookup_seconds", "Semantic cache embedding + search time", buckets=semantic_cache.lookup_seconds.buckets
+).children[()] = semantic_cache.lookup_seconds
+registry.callback(
+    "coalesced_requests_total", "Requests served by another request's upstream call",
+    lambda: {(): inflight_requests.coalesced}, kind="counter"
+)
+registry.callback(
+    "upstream_retries_total", "Upstream retry attempts", lambda: {(): retry_policy.retries}, kind="counter"
+)
+registry.histogram(
+    "upstream_retries_per_call", "Retries per upstream call", buckets=retry_policy.retries_per_call.buckets
+).children[()] = retry_policy.retries_per_call
+registry.callback(
+    "model_failovers_total", "Calls that failed over to another model", lambda: {(): model_chain.failovers}, kind="counter"
+)
+registry.callback(
+    "admission_rejected_total", "Requests rejected by admission control", lambda: {(): admission.rejected}, kind="counter"
+)
+registry.callback(
+    "quota_rejected_total", "Requests rejected by daily token quotas", lambda: {(): usage_tracker.rejected}, kind="counter"
+)
+registry.callback(
+    "jobs",
+    "Background jobs by state (queued/running now, succeeded/failed since start)",
+    lambda: {
+        ("queued",): job_queue.queue.qsize() if job_queue.queue is not None else 0,
+        ("running",): job_queue.running,
+        ("succeeded",): job_queue.succeeded,
+        ("failed",): job_queue.failed,
+    },
+    ("state",),
+)
+registry.callback(
+    "qa_retrieval_tokens_saved_total", "Context tokens left out of QA prompts by passage retrieval",
+    lambda: {(): qa_retriever.tokens_saved}, kind="counter"
+)
+registry.callback(
+    "qa_retrieval_index_lookups_total",
+    "QA context index cache lookups by result",
+    lambda: {("hit",): qa_retriever.index_hits, ("miss",): qa_retriever.index_misses},
+    ("result",),
+    kind="counter",
+)
+registry.callback("admission_queue_depth", "Requests waiting for upstream budget", lambda: {(): admission.queue_depth})
+registry.histogram(
+    "admission_wait_seconds", "Time admitted requests waited for upstream budget", buckets=admission.wait_seconds.buckets
+).children[()] = admission.wait_seconds
+registry.callback(
+    "circuit_breaker_open",
+    "1 while the model's circuit breaker is open",
+    lambda: {(model,): int(breaker.state == breaker.OPEN) for model, breaker in model_chain.breakers.items()},
+    ("model",),
+)
+
+# Batch endpoint limits
+BATCH_MAX_TASKS = int(os.getenv("BATCH_MAX_TASKS", "500"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
 
 app = FastAPI(
     title="Smart Content Generator API",
@@ -28,54 +179,623 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request deadline from the X-Request-Timeout header
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(ClientIdentityMiddleware)
+app.add_middleware(MetricsMiddleware, http_metrics=http_metrics)
+
+# Opt-in traffic log for `benchmark.py replay`; outermost, so timings cover the whole stack
+TRAFFIC_LOG_PATH = os.getenv("TRAFFIC_LOG_PATH")
+if TRAFFIC_LOG_PATH:
+    app.add_middleware(
+        RecordingMiddleware,
+        path=TRAFFIC_LOG_PATH,
+        keep_chars=int(os.getenv("TRAFFIC_LOG_KEEP_CHARS", "64")),
+    )
+
 # Pydantic Models
-class TextRequest(BaseModel):
+class GenerationOptions(BaseModel):
+    stop_sequences: Optional[List[str]] = Field(None, max_length=5, description="Stop generating at any of these strings")
+    candidate_count: Optional[int] = Field(None, ge=1, le=8, description="Number of alternative responses to generate")
+
+class TextRequest(GenerationOptions):
     prompt: str = Field(..., min_length=1, max_length=5000, description="Input text prompt")
-    max_tokens: Optional[int] = Field(1000, ge=100, le=8000, description="Maximum tokens in response")
+    max_tokens: Optional[int] = Field(None, ge=100, le=8000, description="Maximum tokens in response (defaults to 1000)")
     temperature: Optional[float] = Field(0.7, ge=0.0, le=2.0, description="Creativity level (0-2)")
 
-class SummarizeRequest(BaseModel):
+class SummarizeRequest(GenerationOptions):
     text: str = Field(..., min_length=10, description="Text to summarize")
     length: Optional[str] = Field("medium", description="Summary length: short, medium, long")
+    max_tokens: Optional[int] = Field(None, ge=1, le=8000, description="Maximum tokens in response (defaults by length)")
 
-class TranslateRequest(BaseModel):
+class TranslateRequest(GenerationOptions):
     text: str = Field(..., min_length=1, description="Text to translate")
-    target_language: str = Field(..., description="Target language (e.g., Spanish, French, Hindi)")
+    target_language: Optional[str] = Field(None, description="Target language (e.g., Spanish, French, Hindi)")
+    target_languages: Optional[List[str]] = Field(
+        None, min_length=1, max_length=20, description="Several target languages, translated in one model call"
+    )
+    max_tokens: Optional[int] = Field(None, ge=1, le=8000, description="Maximum tokens in response (defaults by input size)")
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if not self.target_language and not self.target_languages:
+            raise ValueError("Either target_language or target_languages is required")
+        return self
 
-class CodeExplainRequest(BaseModel):
+class CodeExplainRequest(GenerationOptions):
     code: str = Field(..., min_length=1, description="Code snippet to explain")
     language: Optional[str] = Field("Python", description="Programming language")
+    max_tokens: Optional[int] = Field(None, ge=1, le=8000, description="Maximum tokens in response")
 
-class QARequest(BaseModel):
+class QARequest(GenerationOptions):
     question: str = Field(..., min_length=5, description="Question to answer")
-    context: Optional[str] = Field(None, description="Additional context")
+    context: Optional[str] = Field(None, max_length=QA_CONTEXT_MAX_CHARS, description="Additional context")
+    document_id: Optional[str] = Field(None, description="Answer from a document uploaded to /api/documents")
+    full_context: Optional[bool] = Field(False, description="Send the whole context instead of retrieved passages")
+    max_tokens: Optional[int] = Field(None, ge=1, le=8000, description="Maximum tokens in response")
+
+    @model_validator(mode="after")
+    def check_source(self):
+        if self.context and self.document_id:
+            raise ValueError("Pass either context or document_id, not both")
+        return self
+
+class DocumentRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=QA_CONTEXT_MAX_CHARS, description="Document to index for /api/qa")
+
+class BatchTask(BaseModel):
+    type: Literal["generate", "summarize", "translate", "explain-code", "qa"]
+    params: Dict[str, Any] = Field(..., description="Request body for the matching single endpoint")
+
+class JobRequest(BatchTask):
+    priority: Literal["high", "normal", "low"] = "normal"
+
+class BatchRequest(BaseModel):
+    tasks: List[BatchTask] = Field(..., min_length=1, max_length=BATCH_MAX_TASKS)
+    concurrency: Optional[int] = Field(
+        None, ge=1, le=BATCH_MAX_CONCURRENCY, description="Maximum tasks run at once"
+    )
 
 class APIResponse(BaseModel):
     success: bool
     data: Optional[dict] = None
     message: Optional[str] = None
 
-# Dependency to get Gemini model
-@lru_cache()
-def get_gemini_model(model_name: str = "gemini-pro-latest"):
-    return genai.GenerativeModel(model_name)
+# Default output token caps per endpoint, used when a request sets no max_tokens
+DEFAULT_MAX_TOKENS = {
+    "summarize-short": 200,
+    "summarize-medium": 400,
+    "summarize-long": 1000,
+    "explain-code": 1500,
+    "qa": 1000,
+}
+
+def default_max_tokens(endpoint: str, request: BaseModel) -> int:
+    if endpoint == "summarize":
+        return DEFAULT_MAX_TOKENS.get(f"summarize-{request.length}", DEFAULT_MAX_TOKENS["summarize-medium"])
+    if endpoint == "translate":
+        # Roughly 4 characters per token, with headroom for scripts that expand
+        return min(8000, max(256, len(request.text) // 2))
+    return DEFAULT_MAX_TOKENS.get(endpoint, 1000)
+
+def request_input_chars(request: BaseModel) -> int:
+    """Size of a request's text inputs, used to pick a routing band"""
+    return sum(len(value) for value in request.model_dump().values() if isinstance(value, str))
+
+def semantic_query(endpoint: str, request: BaseModel) -> Optional[SemanticQuery]:
+    """What the semantic cache matches on: the question (within the same context) or the prompt"""
+    if endpoint == "qa":
+        source = request.context or (f"document:{request.document_id}" if request.document_id else "")
+        return SemanticQuery(request.question, source)
+    if endpoint == "generate":
+        return SemanticQuery(request.prompt)
+    return None
+
+def generation_options(endpoint: str, request: BaseModel) -> dict:
+    """Generation settings for a request: routed model, then request values, then endpoint defaults"""
+    variant = request.length if endpoint == "summarize" else None
+    route = routing_table.resolve(endpoint, request_input_chars(request), variant)
+    return {
+        "route": route,
+        "semantic": semantic_query(endpoint, request),
+        "max_output_tokens": (
+            request.max_tokens
+            or route.generation_config.get("max_output_tokens")
+            or default_max_tokens(endpoint, request)
+        ),
+        "stop_sequences": request.stop_sequences,
+        "candidate_count": request.candidate_count,
+    }
+
+def make_generation_config(
+    temperature: float,
+    max_output_tokens: Optional[int] = None,
+    stop_sequences: Optional[List[str]] = None,
+    candidate_count: Optional[int] = None,
+    route: Optional[Route] = None
+) -> dict:
+    generation_config = {
+        "temperature": temperature,
+        "top_p": 0.95,
+        "top_k": 40,
+    }
+    # Sampling settings from the routing table win over the endpoint's
+    if route is not None:
+        for key in ("temperature", "top_p", "top_k"):
+            if key in route.generation_config:
+                generation_config[key] = route.generation_config[key]
+    # Unset options are left out so they keep the model defaults (and stable cache keys)
+    if max_output_tokens:
+        generation_config["max_output_tokens"] = max_output_tokens
+    if stop_sequences:
+        generation_config["stop_sequences"] = stop_sequences
+    if candidate_count and candidate_count > 1:
+        generation_config["candidate_count"] = candidate_count
+    return generation_config
+
+def check_quota():
+    """Fail fast with 429 + Retry-After if the calling client has used its daily quota"""
+    try:
+        usage_tracker.check(current_client.get())
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e))
+
+async def admit(prompt: str, generation_config: dict):
+    """
+    Wait for upstream rate-limit budget for one model call, or raise
+    RateLimitExceeded. Every retry and failover attempt pays again.
+    """
+    tokens = estimate_tokens(prompt) + (
+        generation_config.get("max_output_tokens", 0) * generation_config.get("candidate_count", 1)
+    )
+    await admission.acquire(tokens)
+
+def upstream_http_error(error: Exception) -> HTTPException:
+    """Turn an upstream failure (after retries) into an HTTP error"""
+    if isinstance(error, RateLimitExceeded):
+        # Our own admission control, not the upstream
+        return HTTPException(status_code=429, detail=str(error), headers=retry_after_header(error))
+    error_class = classify_error(error)
+    upstream_errors.inc(error_class.name)
+    passthrough = error_class.status_code in (429, 504) or error_class.name == "circuit_open"
+    status_code = error_class.status_code if passthrough else 500
+    return HTTPException(status_code=status_code, detail=f"Gemini API error: {str(error) or error_class.name}")
+
+def used_tokens(prompt: str, result: GenerationResult) -> Tuple[int, int]:
+    """Prompt and output tokens of a call, as reported by the model or estimated"""
+    used_prompt_tokens = result.prompt_tokens or estimate_tokens(prompt)
+    used_output_tokens = result.output_tokens or sum(estimate_tokens(text) for text in result.candidates or [result.text])
+    return used_prompt_tokens, used_output_tokens
+
+def record_upstream(prompt: str, result: GenerationResult, seconds: float, route: Optional[Route] = None):
+    """Upstream-only latency plus character/token counters for one model call"""
+    if route is not None:
+        routing_table.observe(route, seconds)
+    http_route = current_route.get()
+    upstream_latency.observe(http_route, result.model, value=seconds)
+    prompt_chars.inc(http_route, amount=len(prompt))
+    response_chars.inc(http_route, amount=len(result.text))
+    used_prompt_tokens, used_output_tokens = used_tokens(prompt, result)
+    prompt_tokens.inc(http_route, result.model, amount=used_prompt_tokens)
+    output_tokens.inc(http_route, result.model, amount=used_output_tokens)
+
+def record_usage(prompt: str, result: GenerationResult, coalesced: bool = False):
+    """Bill the calling client for a model answer (each caller sharing a coalesced call pays)"""
+    usage_tracker.record(current_client.get(), result.model, *used_tokens(prompt, result), coalesced=coalesced)
 
 # Helper function to generate content
-async def generate_content(prompt: str, temperature: float = 0.7) -> str:
+def semantic_scope(semantic: Optional[SemanticQuery], model_name: str, generation_config: dict) -> Optional[int]:
+    """Semantic cache scope for a call, or None if the semantic cache doesn't apply"""
+    if semantic is None or not semantic_cache.is_cacheable(generation_config):
+        return None
+    return semantic_cache.scope(model_name, generation_config, semantic.context)
+
+async def generate_content(
+    prompt: str,
+    temperature: float = 0.7,
+    route: Optional[Route] = None,
+    semantic: Optional[SemanticQuery] = None,
+    **options
+) -> GenerationResult:
+    generation_config = make_generation_config(temperature, route=route, **options)
+    primary = route.model if route is not None and route.model else model_chain.models[0]
+    cache_key = make_cache_key(prompt, primary, generation_config)
+    cacheable = response_cache.is_cacheable(generation_config)
+    if cacheable:
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    else:
+        response_cache.bypassed += 1
+    scope = semantic_scope(semantic, primary, generation_config)
+    if scope is not None:
+        similar = semantic_cache.lookup(semantic, scope)
+        if similar is not None:
+            return similar
+
+    async def call_model(model: str) -> GenerationResult:
+        await admit(prompt, generation_config)
+        return await backend.generate(prompt, model, generation_config)
+
+    async def call_upstream() -> GenerationResult:
+        deadline = retry_policy.deadline()
+        start = time.perf_counter()
+        try:
+            result = await model_chain.call(
+                lambda model: retry_policy.call(lambda: call_model(model), deadline),
+                primary=primary,
+                deadline=deadline
+            )
+        except Exception as e:
+            raise upstream_http_error(e)
+        record_upstream(prompt, result, time.perf_counter() - start, route)
+        if cacheable:
+            await response_cache.set(cache_key, result)
+        if scope is not None:
+            semantic_cache.add(semantic, scope, result)
+        return result
+
+    # Quota and billing are per caller; a coalesced call runs in the first caller's context
+    check_quota()
+    coalesced = cache_key in inflight_requests.calls
+    result = await inflight_requests.do(cache_key, call_upstream)
+    record_usage(prompt, result, coalesced=coalesced)
+    return result
+
+# Prompt builders
+def summary_length_instruction(request: SummarizeRequest) -> str:
+    length_map = {
+        "short": "in 2-3 sentences",
+        "medium": "in 1 paragraph",
+        "long": "in 2-3 paragraphs"
+    }
+    return length_map.get(request.length, "in 1 paragraph")
+
+def build_summarize_prompt(request: SummarizeRequest) -> str:
+    return f"Summarize the following text {summary_length_instruction(request)}:\n\n{request.text}"
+
+def build_translate_prompt(request: TranslateRequest) -> str:
+    return f"Translate the following text to {request.target_language}:\n\n{request.text}"
+
+def build_multi_translate_prompt(text: str, languages: List[str]) -> str:
+    return f"""Translate the following text into each of these languages: {", ".join(languages)}.
+Respond with only a JSON object that maps each language name, exactly as written above, to its translation. Do not add any other text.
+
+Text:
+{text}"""
+
+def parse_translations(text: str, languages: List[str]) -> Optional[Dict[str, str]]:
+    """Parse a multi-language JSON reply; None if any language is missing"""
+    cleaned = text.strip()
+    start, end = cleaned.find("{"), cleaned.rfind("}")
+    if start == -1 or end <= start:
+        return None
     try:
-        model = get_gemini_model()
-        generation_config = {
-            "temperature": temperature,
-            "top_p": 0.95,
-            "top_k": 40,
-        }
-        response = model.generate_content(
-            prompt,
-            generation_config=generation_config
+        parsed = json.loads(cleaned[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    
+    by_name = {str(key).strip().lower(): value for key, value in parsed.items()}
+    translations = {}
+    for language in languages:
+        value = by_name.get(language.lower())
+        if not isinstance(value, str) or not value.strip():
+            return None
+        translations[language] = value.strip()
+    return translations
+
+def build_explain_code_prompt(request: CodeExplainRequest) -> str:
+    return f"""Explain the following {request.language} code in simple terms, including:
+1. What it does
+2. How it works
+3. Key concepts used
+
+Code:
+```{request.language.lower()}
+{request.code}
+```"""
+
+def build_qa_prompt(request: QARequest) -> str:
+    if request.context:
+        return f"Context: {request.context}\n\nQuestion: {request.question}\n\nProvide a detailed answer:"
+    return f"Question: {request.question}\n\nProvide a detailed answer:"
+
+# Response data builders (shared by the JSON and streaming routes)
+def result_metadata(result: GenerationResult) -> dict:
+    """Fields every endpoint reports about how its result was produced"""
+    metadata = {"cached": result.cached, "model": result.model}
+    if result.prompt_tokens is not None or result.output_tokens is not None:
+        metadata["usage"] = {"prompt_tokens": result.prompt_tokens, "output_tokens": result.output_tokens}
+    if result.similarity is not None:
+        metadata["semantic_similarity"] = result.similarity
+    if result.candidates and len(result.candidates) > 1:
+        metadata["candidates"] = result.candidates
+    return metadata
+
+def generate_data(request: TextRequest, result: GenerationResult) -> dict:
+    return {"generated_text": result.text, "prompt": request.prompt, **result_metadata(result)}
+
+def summarize_data(
+    request: SummarizeRequest, result: GenerationResult, plan: Optional[ReductionPlan] = None
+) -> dict:
+    data = {
+        "summary": result.text,
+        "original_length": len(request.text),
+        "summary_length": len(result.text),
+        **result_metadata(result)
+    }
+    if plan is not None:
+        data["map_reduce"] = {"chunks": plan.chunks, "levels": plan.levels, "upstream_calls": plan.upstream_calls}
+    return data
+
+def translate_data(request: TranslateRequest, result: GenerationResult) -> dict:
+    return {
+        "original": request.text,
+        "translated": result.text,
+        "target_language": request.target_language,
+        **result_metadata(result)
+    }
+
+def explain_code_data(request: CodeExplainRequest, result: GenerationResult) -> dict:
+    return {
+        "code": request.code,
+        "language": request.language,
+        "explanation": result.text,
+        **result_metadata(result)
+    }
+
+def qa_data(request: QARequest, result: GenerationResult, retrieval: Optional[Retrieval] = None) -> dict:
+    data = {
+        "question": request.question,
+        "answer": result.text,
+        "context_provided": request.context is not None or request.document_id is not None,
+        **result_metadata(result)
+    }
+    if request.document_id:
+        data["document_id"] = request.document_id
+    if retrieval is not None:
+        data["retrieval"] = retrieval.summary()
+    return data
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_events(
+    prompt: str,
+    temperature: float,
+    build_data: Callable[[GenerationResult], dict],
+    message: str,
+    **options
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for one streamed completion.
+
+    Emits "chunk" events ({"text": ...}) as text arrives, then a "done"
+    event shaped like APIResponse, or an "error" event ({"detail": ...}).
+    Only a single candidate can be streamed, so candidate_count is ignored.
+    """
+    options.pop("candidate_count", None)
+    route = options.pop("route", None)
+    semantic = options.pop("semantic", None)
+    generation_config = make_generation_config(temperature, route=route, **options)
+    primary = route.model if route is not None and route.model else model_chain.models[0]
+    cache_key = make_cache_key(prompt, primary, generation_config)
+    cacheable = response_cache.is_cacheable(generation_config)
+    scope = semantic_scope(semantic, primary, generation_config)
+
+    start = time.perf_counter()
+    cached = await response_cache.get(cache_key) if cacheable else None
+    if cached is None and scope is not None:
+        cached = semantic_cache.lookup(semantic, scope)
+    if cached is not None:
+        yield sse_event("chunk", {"text": cached.text})
+        yield sse_event("done", {"success": True, "data": build_data(cached), "message": message})
+        return
+
+    try:
+        check_quota()
+    except HTTPException as e:
+        yield sse_event("error", {"detail": e.detail, "status_code": e.status_code, "retry_after": e.headers["Retry-After"]})
+        return
+
+    # Retry (and fail over) only failures that happen before anything has been sent
+    parts = []
+    usage = {}
+    served_by = None
+    last_error = None
+    deadline = retry_policy.deadline()
+    for model in model_chain.order(primary):
+        if last_error is not None and model_chain.past_deadline(deadline):
+            break
+        breaker = model_chain.breaker(model)
+        if not breaker.allow_request():
+            continue
+        if last_error is not None:
+            model_chain.failovers += 1
+        attempts = 0
+        model_start = time.monotonic()
+        try:
+            async for attempt in retry_policy.attempts(deadline, can_retry=lambda: not parts):
+                with attempt:
+                    attempts += 1
+                    await admit(prompt, generation_config)
+                    async for text in backend.stream(prompt, model, generation_config, usage):
+                        if not parts:
+                            time_to_first_token.observe(current_route.get(), value=time.perf_counter() - start)
+                        parts.append(text)
+                        yield sse_event("chunk", {"text": text})
+        except (asyncio.CancelledError, GeneratorExit):
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            model_chain.record_error(model, e, time.monotonic() - model_start)
+            last_error = e
+            if parts or not model_chain.should_fail_over(e):
+                break
+            continue
+        finally:
+            retry_policy.record(attempts)
+        breaker.record(failed=False, latency=time.monotonic() - model_start)
+        served_by = model
+        break
+
+    if served_by is None:
+        error = upstream_http_error(last_error or CircuitOpen("All models are unavailable (circuit breakers open)"))
+        event = {"detail": error.detail, "status_code": error.status_code}
+        if error.headers and "Retry-After" in error.headers:
+            event["retry_after"] = error.headers["Retry-After"]
+        yield sse_event("error", event)
+        return
+
+    result = GenerationResult(
+        text="".join(parts),
+        model=served_by,
+        prompt_tokens=usage.get("prompt_tokens"),
+        output_tokens=usage.get("output_tokens")
+    )
+    record_upstream(prompt, result, time.perf_counter() - start, route)
+    record_usage(prompt, result)
+    if cacheable:
+        await response_cache.set(cache_key, result)
+    if scope is not None:
+        semantic_cache.add(semantic, scope, result)
+    yield sse_event("done", {"success": True, "data": build_data(result), "message": message})
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def stream_content(
+    prompt: str,
+    temperature: float,
+    build_data: Callable[[GenerationResult], dict],
+    message: str,
+    **options
+) -> StreamingResponse:
+    """Stream a completion as server-sent events (see stream_events)"""
+    return event_stream_response(stream_events(prompt, temperature, build_data, message, **options))
+
+async def summarize_chunk(prompt: str, max_output_tokens: int) -> GenerationResult:
+    # Chunk and intermediate summaries can be routed separately ("summarize-chunk")
+    route = routing_table.resolve("summarize-chunk", len(prompt))
+    return await generate_content(
+        prompt,
+        temperature=0.3,
+        route=route,
+        max_output_tokens=route.generation_config.get("max_output_tokens") or max_output_tokens
+    )
+
+# Map-reduce summarizer for texts too large for a single prompt
+summarizer = MapReduceSummarizer(
+    summarize_chunk,
+    chunk_tokens=int(os.getenv("SUMMARIZE_CHUNK_TOKENS", "4000")),
+    map_tokens=int(os.getenv("SUMMARIZE_MAP_TOKENS", "300")),
+    fan_out=int(os.getenv("SUMMARIZE_FAN_OUT", "8")),
+)
+
+async def stream_map_reduce_summary(request: SummarizeRequest) -> AsyncIterator[str]:
+    """Progress events while chunks are summarized, then the streamed final summary"""
+    progress = asyncio.Queue()
+    planning = asyncio.ensure_future(summarizer.plan(
+        request.text,
+        summary_length_instruction(request),
+        lambda stage, completed, total: progress.put_nowait(
+            {"stage": stage, "completed": completed, "total": total}
         )
-        return response.text
+    ))
+    try:
+        while not planning.done() or not progress.empty():
+            getter = asyncio.ensure_future(progress.get())
+            await asyncio.wait({getter, planning}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                yield sse_event("progress", getter.result())
+            else:
+                getter.cancel()
+        plan = planning.result()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Gemini API error: {str(e)}")
+        yield sse_event("error", {"detail": str(getattr(e, "detail", e))})
+        return
+    finally:
+        planning.cancel()
+
+    async for event in stream_events(
+        plan.final_prompt, 0.3,
+        lambda result: summarize_data(request, result, plan),
+        "Text summarized successfully",
+        **generation_options("summarize", request)
+    ):
+        yield event
+
+async def translate_multiple(request: TranslateRequest) -> dict:
+    """
+    Translate into several languages with one structured model call,
+    falling back to concurrent per-language calls if the reply can't be parsed.
+    """
+    # Unique languages, order preserved
+    languages = list(dict.fromkeys(request.target_languages))
+    options = generation_options("translate", request)
+    options["max_output_tokens"] = min(8000, options["max_output_tokens"] * len(languages))
+    options["candidate_count"] = None
+    
+    start = time.perf_counter()
+    result = await generate_content(
+        build_multi_translate_prompt(request.text, languages), temperature=0.3, **options
+    )
+    translations = parse_translations(result.text, languages)
+    strategy = "single_call"
+    cached = result.cached
+    if translations is None:
+        strategy = "parallel_fallback"
+        single_options = generation_options("translate", request)
+        single_options["candidate_count"] = None
+        results = await asyncio.gather(*(
+            generate_content(
+                build_translate_prompt(TranslateRequest(text=request.text, target_language=language)),
+                temperature=0.3,
+                **single_options
+            )
+            for language in languages
+        ))
+        translations = {language: r.text for language, r in zip(languages, results)}
+        cached = all(r.cached for r in results)
+    elapsed = time.perf_counter() - start
+    
+    # Estimate N sequential single-language calls from recent single-language
+    # translations; with none seen yet there is nothing to compare against
+    estimated_sequential_ms = latency_saved_ms = None
+    if translate_call_latency.samples:
+        estimated_sequential = translate_call_latency.percentile(50) * len(languages)
+        estimated_sequential_ms = round(estimated_sequential * 1000, 1)
+        latency_saved_ms = round(max(0.0, estimated_sequential - elapsed) * 1000, 1)
+    
+    return {
+        "original": request.text,
+        "translations": translations,
+        "target_languages": languages,
+        "strategy": strategy,
+        "cached": cached,
+        "latency_ms": round(elapsed * 1000, 1),
+        "estimated_sequential_ms": estimated_sequential_ms,
+        "latency_saved_ms": latency_saved_ms,
+    }
+
+# Background tasks
+@app.on_event("startup")
+async def start_background_tasks():
+    usage_tracker.start()
+    await job_queue.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    # Unfinished jobs stay in the job store and are requeued on the next start
+    await job_queue.stop()
+    # Final flush so the last few seconds of usage are not lost
+    await usage_tracker.stop()
 
 # Routes
 @app.get("/", response_model=dict)
@@ -90,7 +810,11 @@ async def root():
             "summarize": "/api/summarize",
             "translate": "/api/translate",
             "explain-code": "/api/explain-code",
-            "question-answer": "/api/qa"
+            "question-answer": "/api/qa",
+            "streaming": "/api/{endpoint}/stream",
+            "batch": "/api/batch",
+            "jobs": "/api/jobs",
+            "documents": "/api/documents"
         }
     }
 
@@ -114,6 +838,9 @@ async def health_check():
     else:
         response_data["gemini_api"] = "not_configured"
     
+    # Circuit breaker state of each model in the failover chain
+    response_data["models"] = model_chain.stats()
+    
     return response_data
 
 @app.post("/api/generate", response_model=APIResponse)
@@ -131,12 +858,16 @@ async def generate_text(request: TextRequest):
     ```
     """
     try:
-        result = await generate_content(request.prompt, request.temperature)
+        result = await generate_content(
+            request.prompt, request.temperature, **generation_options("generate", request)
+        )
         return APIResponse(
             success=True,
-            data={"generated_text": result, "prompt": request.prompt},
+            data=generate_data(request, result),
             message="Text generated successfully"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -154,21 +885,21 @@ async def summarize_text(request: SummarizeRequest):
     ```
     """
     try:
-        length_map = {
-            "short": "in 2-3 sentences",
-            "medium": "in 1 paragraph",
-            "long": "in 2-3 paragraphs"
-        }
-        length_instruction = length_map.get(request.length, "in 1 paragraph")
-        
-        prompt = f"Summarize the following text {length_instruction}:\n\n{request.text}"
-        result = await generate_content(prompt, temperature=0.3)
+        plan = None
+        prompt = build_summarize_prompt(request)
+        if summarizer.needs_map_reduce(request.text):
+            # Too large for one prompt: summarize chunks, then combine
+            plan = await summarizer.plan(request.text, summary_length_instruction(request))
+            prompt = plan.final_prompt
+        result = await generate_content(prompt, temperature=0.3, **generation_options("summarize", request))
         
         return APIResponse(
             success=True,
-            data={"summary": result, "original_length": len(request.text), "summary_length": len(result)},
+            data=summarize_data(request, result, plan),
             message="Text summarized successfully"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -184,20 +915,32 @@ async def translate_text(request: TranslateRequest):
         "target_language": "Spanish"
     }
     ```
+    
+    Pass `"target_languages": ["Spanish", "French"]` instead to get all
+    translations from a single model call.
     """
     try:
-        prompt = f"Translate the following text to {request.target_language}:\n\n{request.text}"
-        result = await generate_content(prompt, temperature=0.3)
+        if request.target_languages:
+            return APIResponse(
+                success=True,
+                data=await translate_multiple(request),
+                message="Translation successful"
+            )
+        
+        start = time.perf_counter()
+        result = await generate_content(
+            build_translate_prompt(request), temperature=0.3, **generation_options("translate", request)
+        )
+        if not result.cached:
+            translate_call_latency.observe(time.perf_counter() - start)
         
         return APIResponse(
             success=True,
-            data={
-                "original": request.text,
-                "translated": result,
-                "target_language": request.target_language
-            },
+            data=translate_data(request, result),
             message="Translation successful"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -215,35 +958,65 @@ async def explain_code(request: CodeExplainRequest):
     ```
     """
     try:
-        prompt = f"""Explain the following {request.language} code in simple terms, including:
-1. What it does
-2. How it works
-3. Key concepts used
-
-Code:
-```{request.language.lower()}
-{request.code}
-```"""
-        
-        result = await generate_content(prompt, temperature=0.5)
+        result = await generate_content(
+            build_explain_code_prompt(request), temperature=0.5, **generation_options("explain-code", request)
+        )
         
         return APIResponse(
             success=True,
-            data={
-                "code": request.code,
-                "language": request.language,
-                "explanation": result
-            },
+            data=explain_code_data(request, result),
             message="Code explained successfully"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def retrieve_qa_context(request: QARequest) -> Tuple[QARequest, Optional[Retrieval]]:
+    """
+    The request with its context (or document) cut down to the passages
+    most relevant to the question, plus what was left out. Contexts within
+    the token budget are sent unchanged.
+    """
+    if request.document_id:
+        try:
+            index = qa_retriever.document(request.document_id)
+        except DocumentNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        retrieval = qa_retriever.retrieve(index, request.question, index_cached=True, full=request.full_context)
+    elif request.context and not request.full_context and qa_retriever.needs_retrieval(request.context):
+        index, key = qa_retriever.cached_index(request.context)
+        cached = index is not None
+        if index is None:
+            index = await asyncio.to_thread(qa_retriever.build, request.context)
+            qa_retriever.store_index(key, index)
+        retrieval = qa_retriever.retrieve(index, request.question, index_cached=cached)
+    else:
+        return request, None
+    return request.model_copy(update={"context": retrieval.context, "document_id": None}), retrieval
+
+# Answers are grounded in the question and context, so keep them steady: low
+# enough that repeated and rephrased questions can be served from the caches
+QA_TEMPERATURE = 0.3
+
+async def qa_generation(request: QARequest) -> Tuple[str, dict, Optional[Retrieval]]:
+    """Prompt, generation options and retrieval summary for a QA request"""
+    prepared, retrieval = await retrieve_qa_context(request)
+    options = generation_options("qa", prepared)
+    # Near-duplicate questions match within the whole context, whichever passages they retrieved
+    options["semantic"] = semantic_query("qa", request)
+    return build_qa_prompt(prepared), options, retrieval
+
 @app.post("/api/qa", response_model=APIResponse)
 async def question_answer(request: QARequest):
     """
     Answer questions with optional context
     
+    A context larger than the retrieval token budget is split into
+    passages and only the most relevant ones are sent; `data.retrieval`
+    reports the tokens saved. Use `document_id` to ask about a document
+    uploaded to `/api/documents`.
+    
     Example:
     ```json
     {
@@ -253,38 +1026,298 @@ async def question_answer(request: QARequest):
     ```
     """
     try:
-        if request.context:
-            prompt = f"Context: {request.context}\n\nQuestion: {request.question}\n\nProvide a detailed answer:"
-        else:
-            prompt = f"Question: {request.question}\n\nProvide a detailed answer:"
-        
-        result = await generate_content(prompt, temperature=0.7)
+        prompt, options, retrieval = await qa_generation(request)
+        result = await generate_content(prompt, temperature=QA_TEMPERATURE, **options)
         
         return APIResponse(
             success=True,
-            data={
-                "question": request.question,
-                "answer": result,
-                "context_provided": request.context is not None
-            },
+            data=qa_data(request, result, retrieval),
             message="Question answered successfully"
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Streaming routes (server-sent events)
+@app.post("/api/generate/stream")
+async def generate_text_stream(request: TextRequest):
+    """Stream generated text as server-sent events"""
+    return stream_content(
+        request.prompt, request.temperature,
+        lambda result: generate_data(request, result),
+        "Text generated successfully",
+        **generation_options("generate", request)
+    )
+
+@app.post("/api/summarize/stream")
+async def summarize_text_stream(request: SummarizeRequest):
+    """Stream a summary as server-sent events (with "progress" events for large texts)"""
+    if summarizer.needs_map_reduce(request.text):
+        return event_stream_response(stream_map_reduce_summary(request))
+    return stream_content(
+        build_summarize_prompt(request), 0.3,
+        lambda result: summarize_data(request, result),
+        "Text summarized successfully",
+        **generation_options("summarize", request)
+    )
+
+@app.post("/api/translate/stream")
+async def translate_text_stream(request: TranslateRequest):
+    """Stream a translation as server-sent events"""
+    if request.target_languages:
+        raise HTTPException(status_code=400, detail="Streaming supports a single target_language")
+    return stream_content(
+        build_translate_prompt(request), 0.3,
+        lambda result: translate_data(request, result),
+        "Translation successful",
+        **generation_options("translate", request)
+    )
+
+@app.post("/api/explain-code/stream")
+async def explain_code_stream(request: CodeExplainRequest):
+    """Stream a code explanation as server-sent events"""
+    return stream_content(
+        build_explain_code_prompt(request), 0.5,
+        lambda result: explain_code_data(request, result),
+        "Code explained successfully",
+        **generation_options("explain-code", request)
+    )
+
+@app.post("/api/qa/stream")
+async def question_answer_stream(request: QARequest):
+    """Stream an answer as server-sent events"""
+    prompt, options, retrieval = await qa_generation(request)
+    return stream_content(
+        prompt, QA_TEMPERATURE,
+        lambda result: qa_data(request, result, retrieval),
+        "Question answered successfully",
+        **options
+    )
+
+@app.post("/api/documents", response_model=APIResponse)
+async def upload_document(request: DocumentRequest):
+    """
+    Index a document for `/api/qa`, so later questions can pass its
+    `document_id` instead of sending the whole text each time
+
+    The ID is a hash of the content; uploading the same text again
+    returns the same ID without re-indexing. The least recently used
+    documents are evicted beyond QA_DOCUMENTS_MAX.
+    """
+    document_id = content_hash(request.text)
+    try:
+        index = qa_retriever.document(document_id)
+    except DocumentNotFound:
+        index = await asyncio.to_thread(qa_retriever.build, request.text)
+        qa_retriever.add_document(document_id, index)
+    return APIResponse(
+        success=True,
+        data={"document_id": document_id, "passages": len(index.passages), "tokens": index.total_tokens},
+        message="Document indexed"
+    )
+
+@app.post("/api/batch", response_model=APIResponse)
+async def run_batch(request: BatchRequest):
+    """
+    Run many generate/summarize/translate/explain-code/qa tasks concurrently
+    
+    Results come back in task order. A failing task is reported in its own
+    result and does not fail the batch.
+    
+    Example:
+    ```json
+    {
+        "tasks": [
+            {"type": "translate", "params": {"text": "Hello", "target_language": "French"}},
+            {"type": "qa", "params": {"question": "What is FastAPI?"}}
+        ],
+        "concurrency": 4
+    }
+    ```
+    """
+    semaphore = asyncio.Semaphore(request.concurrency or BATCH_CONCURRENCY)
+    
+    async def run_task(index: int, task: BatchTask) -> dict:
+        async with semaphore:
+            return {"index": index, **await run_batch_task(task)}
+    
+    results = await asyncio.gather(*(run_task(i, task) for i, task in enumerate(request.tasks)))
+    succeeded = sum(1 for result in results if result["success"])
+    
+    return APIResponse(
+        success=True,
+        data={"results": results, "succeeded": succeeded, "failed": len(results) - succeeded},
+        message=f"Batch completed: {succeeded}/{len(results)} tasks succeeded"
+    )
+
+async def run_batch_task(task: BatchTask) -> dict:
+    """Run one task through its single-item route; failures are reported in the result, not raised"""
+    request_model, handler = BATCH_HANDLERS[task.type]
+    try:
+        response = await handler(request_model(**task.params))
+        return {"type": task.type, "success": True, "data": response.data}
+    except ValidationError as e:
+        error = f"Invalid params: {e.errors(include_url=False)}"
+    except HTTPException as e:
+        error = e.detail
+    except Exception as e:
+        error = str(e)
+    return {"type": task.type, "success": False, "error": error}
+
+# Batch task type -> (request model, single-item route)
+BATCH_HANDLERS = {
+    "generate": (TextRequest, generate_text),
+    "summarize": (SummarizeRequest, summarize_text),
+    "translate": (TranslateRequest, translate_text),
+    "explain-code": (CodeExplainRequest, explain_code),
+    "qa": (QARequest, question_answer),
+}
+
+async def run_job(job: Job) -> dict:
+    """Run a queued job through its single-item route, billed to the client that submitted it"""
+    current_client.set(job.client)
+    current_route.set("/api/jobs")
+    request_model, handler = BATCH_HANDLERS[job.type]
+    try:
+        response = await handler(request_model(**job.params))
+    except HTTPException as e:
+        raise JobFailed(e.detail, e.status_code)
+    return response.data
+
+# Background queue for long-running requests (JOBS_*)
+job_queue = create_job_queue(run_job)
+
+JOB_MAX_WAIT_SECONDS = 60
+
+def job_data(job: Job) -> dict:
+    data = {
+        "job_id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "priority": job.priority,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "expires_at": job.expires_at,
+    }
+    if job.result is not None:
+        data["result"] = job.result
+    if job.error is not None:
+        data["error"] = job.error
+        data["status_code"] = job.status_code
+    return data
+
+@app.post("/api/jobs", response_model=APIResponse, status_code=202)
+async def submit_job(request: JobRequest):
+    """
+    Queue a generate/summarize/translate/explain-code/qa request and return its job ID at once
+
+    Poll `GET /api/jobs/{job_id}` (optionally with `?wait=30` to long-poll) for the result.
+
+    Example:
+    ```json
+    {"type": "summarize", "params": {"text": "...", "length": "long"}, "priority": "low"}
+    ```
+    """
+    request_model, _ = BATCH_HANDLERS[request.type]
+    try:
+        # Reject bad params now rather than failing the job later
+        params = request_model(**request.params).model_dump(exclude_unset=True)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    try:
+        job = await job_queue.submit(request.type, params, request.priority, current_client.get())
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return APIResponse(
+        success=True,
+        data={**job_data(job), "poll": f"/api/jobs/{job.id}"},
+        message="Job queued"
+    )
+
+@app.get("/api/jobs/{job_id}", response_model=APIResponse)
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=JOB_MAX_WAIT_SECONDS)):
+    """Job status and, once finished, its result; `wait` long-polls up to that many seconds"""
+    job = await job_queue.get(job_id, wait)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found (unknown ID or result expired)")
+    return APIResponse(
+        success=job.status != "failed",
+        data=job_data(job),
+        message=f"Job {job.status}"
+    )
+
+def latency_summary(histogram) -> dict:
+    return {
+        "count": histogram.count,
+        "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+        "p95_ms": round(histogram.quantile(0.95) * 1000, 1),
+    }
+
+def request_stats() -> dict:
+    """Per-route traffic from the metrics registry"""
+    routes = {}
+    for (route, method, status), count in http_metrics.requests.values.items():
+        entry = routes.setdefault(route, {"requests": 0, "status": {}})
+        entry["requests"] += int(count)
+        entry["status"][status] = entry["status"].get(status, 0) + int(count)
+    for route, entry in routes.items():
+        entry["in_flight"] = int(http_metrics.in_flight.get(route))
+        entry["latency"] = latency_summary(http_metrics.latency.labels(route))
+        entry["upstream_latency"] = {
+            model: latency_summary(histogram)
+            for (upstream_route, model), histogram in upstream_latency.children.items()
+            if upstream_route == route
+        }
+    return routes
+
+@app.get("/api/usage")
+async def get_usage(day: Optional[str] = None):
+    """Token usage per client and model for one UTC day (default: today)"""
+    return await usage_tracker.report(day)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/stats")
 async def get_stats():
     """Get API usage statistics"""
+    endpoints = sorted({route.path for route in app.routes if route.path.startswith("/api/")})
     return {
-        "endpoints": 5,
-        "models_used": ["gemini-pro"],
+        "endpoints": len(endpoints),
+        "models_used": sorted({model for _, model in upstream_latency.children}),
+        "requests": request_stats(),
+        "tokens": {
+            "prompt_chars": int(sum(prompt_chars.values.values())),
+            "response_chars": int(sum(response_chars.values.values())),
+            "prompt_tokens": int(sum(prompt_tokens.values.values())),
+            "output_tokens": int(sum(output_tokens.values.values())),
+        },
         "features": [
             "Text Generation",
             "Summarization",
             "Translation",
             "Code Explanation",
             "Question Answering"
-        ]
+        ],
+        "cache": response_cache.stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "qa_retrieval": qa_retriever.stats(),
+        "coalescing": inflight_requests.stats(),
+        "streaming": {
+            "time_to_first_token": {
+                route: latency_summary(histogram) for (route,), histogram in time_to_first_token.children.items()
+            }
+        },
+        "admission": admission.stats(),
+        "retries": retry_policy.stats(),
+        "routing": routing_table.stats(),
+        "usage": usage_tracker.stats(),
+        "jobs": job_queue.stats(),
+        "upstream_errors": {error_class: int(count) for (error_class,), count in upstream_errors.values.items()}
     }
 
 if __name__ == "__main__":
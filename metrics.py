@@ -0,0 +1,307 @@
+"""
+Lightweight in-process latency tracking and a Prometheus-compatible
+metrics registry.
+
+The registry renders the Prometheus text exposition format itself, so
+`/metrics` needs no client library. Values that other components already
+count (cache hits, retries, ...) are exported through callbacks read at
+scrape time rather than counted twice.
+"""
+import contextvars
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from starlette.routing import Match
+
+# Route template of the HTTP request being served, e.g. "/api/qa"
+current_route: contextvars.ContextVar[str] = contextvars.ContextVar("current_route", default="none")
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+
+
+class LatencyWindow:
+    """Rolling window of the most recent latency samples (in seconds)"""
+
+    def __init__(self, max_samples: int = 1024):
+        self.samples = deque(maxlen=max_samples)
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self) -> dict:
+        """Count plus p50/p95 in milliseconds"""
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(50) * 1000, 1),
+            "p95_ms": round(self.percentile(95) * 1000, 1),
+        }
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus-style cumulative buckets)"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(upper_bound, count)] including the +Inf bucket"""
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation within its bucket (like histogram_quantile)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        lower, below = 0.0, 0
+        for bound, total in self.cumulative():
+            if total >= rank:
+                if bound == float("inf"):
+                    return lower
+                in_bucket = total - below
+                return lower + (bound - lower) * ((rank - below) / in_bucket if in_bucket else 0)
+            lower, below = bound, total
+        return lower
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "buckets": {("+Inf" if bound == float("inf") else str(bound)): count for bound, count in self.cumulative()},
+        }
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+
+class Metric:
+    """A metric family: one value (or histogram) per combination of label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def label_dict(self, values: Tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, values))
+
+    def samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        return []
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return lines
+
+
+class CounterMetric(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple, float] = defaultdict(float)
+
+    def inc(self, *labels, amount: float = 1):
+        self.values[labels] += amount
+
+    def get(self, *labels) -> float:
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, self.label_dict(labels), value
+
+
+class GaugeMetric(CounterMetric):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.values[labels] -= amount
+
+    def set(self, *labels, value: float):
+        self.values[labels] = value
+
+
+class HistogramMetric(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        self.children: Dict[Tuple, Histogram] = {}
+
+    def labels(self, *labels) -> Histogram:
+        child = self.children.get(labels)
+        if child is None:
+            child = self.children[labels] = Histogram(self.buckets)
+        return child
+
+    def observe(self, *labels, value: float):
+        self.labels(*labels).observe(value)
+
+    def samples(self):
+        for labels, child in sorted(self.children.items()):
+            base = self.label_dict(labels)
+            for bound, count in child.cumulative():
+                yield f"{self.name}_bucket", {**base, "le": format_value(bound)}, count
+            yield f"{self.name}_sum", base, child.sum
+            yield f"{self.name}_count", base, child.count
+
+
+class CallbackMetric(Metric):
+    """Counter or gauge whose values are read from `fn` at scrape time"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Dict[Tuple, float]],
+        labelnames: Iterable[str] = (),
+        kind: str = "gauge",
+    ):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        for labels, value in sorted(self.fn().items()):
+            yield self.name, self.label_dict(labels), value
+
+
+class MetricsRegistry:
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        metric.name = self.prefix + metric.name
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> CounterMetric:
+        return self.register(CounterMetric(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> GaugeMetric:
+        return self.register(GaugeMetric(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS
+    ) -> HistogramMetric:
+        return self.register(HistogramMetric(name, help, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Dict[Tuple, float]],
+        labelnames: Iterable[str] = (),
+        kind: str = "gauge",
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, fn, labelnames, kind))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class HTTPMetrics:
+    """Per-route request counts, in-flight gauges and end-to-end latency"""
+
+    def __init__(self, registry: MetricsRegistry):
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")
+        )
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served", ("route",))
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "End-to-end request latency (until the last body byte)", ("route",)
+        )
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording HTTPMetrics.
+
+    Requests are labelled with the matched route's path template (not the
+    raw path) to keep label cardinality bounded, and the template is
+    exposed to handlers through `current_route`.
+    """
+
+    def __init__(self, app, http_metrics: HTTPMetrics):
+        self.app = app
+        self.http = http_metrics
+
+    @staticmethod
+    def route_template(scope) -> str:
+        app = scope.get("app")
+        for route in getattr(app, "routes", []):
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", "other")
+        return "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self.route_template(scope)
+        current_route.set(route)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.http.in_flight.inc(route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.http.in_flight.dec(route)
+            self.http.latency.observe(route, value=time.perf_counter() - start)
+            self.http.requests.inc(route, scope["method"], str(status))
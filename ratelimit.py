@@ -0,0 +1,155 @@
+"""
+Process-wide admission control in front of the model backend.
+
+Two token buckets (requests/minute and tokens/minute) mirror the upstream
+quota. A request reserves its share of both buckets on arrival (a bucket
+can go into debt) and then sleeps until the reservation is covered, so
+requests are served in arrival order without holding a lock. When the
+queue is full, or the projected wait would pass the deadline, they are
+rejected immediately with a suggested Retry-After.
+"""
+import asyncio
+import math
+import os
+import time
+
+from metrics import Histogram
+from resilience import request_deadline
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Continuously refilling bucket; `capacity` units per 60 seconds"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available"""
+        self.refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        """Reserve `amount` units; the balance may go negative"""
+        self.tokens -= amount
+
+
+class AdmissionController:
+    """
+    Admits upstream calls within a requests/minute and tokens/minute budget.
+
+    A limit of 0 disables that bucket. Waiters are served in arrival order:
+    each reservation adds to the wait of everyone arriving after it.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_queue: int = 100,
+        max_wait_seconds: float = 10.0,
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.queue_depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_seconds = Histogram([0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30])
+        self.queue_depths = Histogram([0, 1, 2, 5, 10, 25, 50, 100, 250])
+
+    @property
+    def enabled(self) -> bool:
+        return self.request_bucket is not None or self.token_bucket is not None
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.wait_time(1, now))
+        if self.token_bucket is not None:
+            # A single request larger than the whole budget would never fit
+            wait = max(wait, self.token_bucket.wait_time(min(tokens, self.token_bucket.capacity), now))
+        return wait
+
+    def _take(self, tokens: int, sign: int = 1):
+        if self.request_bucket is not None:
+            self.request_bucket.take(sign)
+        if self.token_bucket is not None:
+            self.token_bucket.take(sign * min(tokens, self.token_bucket.capacity))
+
+    def _reject(self, message: str, retry_after: float):
+        self.rejected += 1
+        raise RateLimitExceeded(message, retry_after=max(1.0, retry_after))
+
+    async def acquire(self, tokens: int = 0):
+        """Wait for budget for one request of roughly `tokens` tokens, or raise RateLimitExceeded"""
+        if not self.enabled:
+            return
+        arrived = time.monotonic()
+        deadline = arrived + self.max_wait_seconds
+        client_deadline = request_deadline.get()
+        if client_deadline is not None:
+            deadline = min(deadline, client_deadline)
+        self.queue_depths.observe(self.queue_depth)
+        if self.queue_depth >= self.max_queue:
+            per_request = 60 / self.request_bucket.capacity if self.request_bucket else 1.0
+            self._reject("Admission queue is full", (self.queue_depth + 1) * per_request)
+
+        wait = self._wait_time(tokens, arrived)
+        if arrived + wait > deadline:
+            self._reject("Rate limit exceeded", wait)
+        self._take(tokens)
+        if wait > 0:
+            self.queue_depth += 1
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                # Hand the reservation back to the requests queued behind this one
+                self._take(tokens, sign=-1)
+                raise
+            finally:
+                self.queue_depth -= 1
+        self.admitted += 1
+        self.wait_seconds.observe(time.monotonic() - arrived)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "requests_per_minute": self.request_bucket.capacity if self.request_bucket else None,
+            "tokens_per_minute": self.token_bucket.capacity if self.token_bucket else None,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds": self.wait_seconds.summary(),
+            "queue_depth_at_arrival": self.queue_depths.summary(),
+        }
+
+
+def retry_after_header(error: RateLimitExceeded) -> dict:
+    return {"Retry-After": str(math.ceil(error.retry_after))}
+
+
+def create_admission_controller() -> AdmissionController:
+    """Build the admission controller from ADMISSION_* environment variables"""
+    return AdmissionController(
+        requests_per_minute=float(os.getenv("ADMISSION_REQUESTS_PER_MINUTE", "0")),
+        tokens_per_minute=float(os.getenv("ADMISSION_TOKENS_PER_MINUTE", "0")),
+        max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "100")),
+        max_wait_seconds=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10")),
+    )
@@ -0,0 +1,163 @@
+"""
+Opt-in traffic recording for load replay.
+
+RecordingMiddleware appends one JSON line per API request with the
+arrival time, route, client, sanitized body, status, latency and response
+size. `python benchmark.py replay <log>` drives the same traffic against
+the fake backend.
+
+Sanitizing: values of fields that look like secrets are redacted. Strings
+in user-content fields (prompt, text, code, ...) are replaced by
+{"$text": length, "$hash": ...} whatever their length, as is any other
+string longer than `keep_chars`.
+Replay expands that marker back into filler text of the same length.
+Equal inputs give equal filler, so cache hits and request coalescing
+behave as they did in production, without the log holding user content.
+"""
+import hashlib
+import json
+import random
+import time
+from typing import Any, Optional, Tuple
+
+from usage import client_id_from_headers
+
+SECRET_KEYS = {"api_key", "apikey", "key", "token", "password", "secret", "authorization"}
+# Request fields holding user content; short values (e.g. a question) are no less private
+CONTENT_KEYS = {"prompt", "text", "question", "context", "code", "stop_sequences"}
+TEXT_MARKER = "$text"
+HASH_MARKER = "$hash"
+FILLER_WORDS = (
+    "the", "data", "model", "system", "user", "request", "value", "report", "team", "result",
+    "process", "time", "market", "code", "service", "network", "policy", "energy", "design", "review",
+)
+
+
+def sanitize(value: Any, keep_chars: int = 64, content: bool = False) -> Any:
+    if isinstance(value, dict):
+        return {
+            key: "[redacted]" if key.lower() in SECRET_KEYS
+            else sanitize(item, keep_chars, content or key.lower() in CONTENT_KEYS)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [sanitize(item, keep_chars, content) for item in value]
+    if isinstance(value, str) and (content or len(value) > keep_chars):
+        return {TEXT_MARKER: len(value), HASH_MARKER: hashlib.sha256(value.encode()).hexdigest()[:16]}
+    return value
+
+
+def filler_text(length: int, seed: str) -> str:
+    """Deterministic word salad of exactly `length` characters"""
+    rng = random.Random(seed)
+    words = []
+    size = 0
+    # Joined with spaces, the words come to size - 1 characters
+    while size <= length:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)[:length]
+
+
+def restore(value: Any) -> Any:
+    """Inverse of sanitize() for replay: hashed strings become filler text"""
+    if isinstance(value, dict):
+        if set(value) == {TEXT_MARKER, HASH_MARKER}:
+            return filler_text(value[TEXT_MARKER], value[HASH_MARKER])
+        return {key: restore(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [restore(item) for item in value]
+    return value
+
+
+class RecordingMiddleware:
+    """
+    Pure ASGI middleware appending one JSON line per recorded request.
+
+    Only `methods` on paths under `prefix` are recorded (by default the
+    POST endpoints, which are the ones replay can re-send).
+    """
+
+    def __init__(
+        self,
+        app,
+        path: str,
+        keep_chars: int = 64,
+        prefix: str = "/api/",
+        methods: Tuple[str, ...] = ("POST",),
+        max_body_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.app = app
+        self.keep_chars = keep_chars
+        self.prefix = prefix
+        self.methods = methods
+        self.max_body_bytes = max_body_bytes
+        # Line-buffered append: each record reaches the OS as one write
+        self.log = open(path, "a", buffering=1, encoding="utf-8")
+        self.recorded = 0
+
+    def parse_body(self, chunks: list, size: int) -> Optional[Any]:
+        if size > self.max_body_bytes:
+            return None
+        try:
+            return sanitize(json.loads(b"".join(chunks)), self.keep_chars)
+        except ValueError:
+            return None
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or not scope["path"].startswith(self.prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        arrived = time.time()
+        start = time.perf_counter()
+        body_chunks = []
+        body_size = 0
+        status = 500
+        first_byte = None
+        response_bytes = 0
+
+        async def recording_receive():
+            nonlocal body_size
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_size += len(chunk)
+                if body_size <= self.max_body_bytes:
+                    body_chunks.append(chunk)
+            return message
+
+        async def recording_send(message):
+            nonlocal status, first_byte, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                if first_byte is None:
+                    first_byte = time.perf_counter()
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, recording_receive, recording_send)
+        finally:
+            end = time.perf_counter()
+            record = {
+                "ts": round(arrived, 6),
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1"),
+                "client": client_id_from_headers(scope.get("headers", [])),
+                "body": self.parse_body(body_chunks, body_size),
+                "body_bytes": body_size,
+                "status": status,
+                "duration_ms": round((end - start) * 1000, 3),
+                "ttfb_ms": round((first_byte - start) * 1000, 3) if first_byte is not None else None,
+                "response_bytes": response_bytes,
+            }
+            self.log.write(json.dumps(record) + "\n")
+            self.recorded += 1
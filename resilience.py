@@ -0,0 +1,399 @@
+"""
+Retry policy, circuit breakers and model failover for upstream calls.
+
+Upstream errors are classified as retryable (quota, unavailable, timeouts,
+5xx) or not. Retryable ones are retried with jittered exponential backoff
+(tenacity), but never past the request's deadline. The deadline defaults
+to RETRY_DEADLINE_SECONDS and can be lowered per request with the
+X-Request-Timeout header.
+
+Each model has a circuit breaker over a rolling window of outcomes. When
+a model's breaker is open, requests fail over to the next model in the
+configured chain instead of waiting on a degraded model. Only upstream
+errors count as failures: deadlines and rejected requests say nothing
+about the model's health.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from backends import BackendError
+from metrics import Histogram
+
+T = TypeVar("T")
+
+DEADLINE_HEADER = b"x-request-timeout"
+
+# Absolute time.monotonic() deadline for the current request, if the client set one
+request_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    """No model in the chain is currently accepting requests"""
+
+
+@dataclass
+class ErrorClass:
+    name: str
+    status_code: int
+    retryable: bool
+
+
+def classify_error(error: BaseException) -> ErrorClass:
+    """Map a backend/SDK exception to an error class and HTTP status"""
+    if isinstance(error, DeadlineExceeded):
+        return ErrorClass("deadline_exceeded", 504, False)
+    if isinstance(error, CircuitOpen):
+        return ErrorClass("circuit_open", 503, False)
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return ErrorClass("deadline_exceeded", 504, True)
+    if isinstance(error, BackendError):
+        status = error.status_code
+    else:
+        # google.api_core exceptions carry the HTTP status in `code`
+        status = getattr(error, "code", None)
+        if not isinstance(status, int):
+            return ErrorClass("unknown", 500, False)
+    names = {
+        400: "invalid_argument",
+        403: "permission_denied",
+        404: "not_found",
+        408: "deadline_exceeded",
+        429: "resource_exhausted",
+        500: "internal",
+        502: "bad_gateway",
+        503: "unavailable",
+        504: "deadline_exceeded",
+    }
+    return ErrorClass(names.get(status, f"http_{status}"), status, status in RETRYABLE_STATUS)
+
+
+class RetryPolicy:
+    """Jittered exponential backoff within a total per-request deadline"""
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 8.0,
+        deadline_seconds: float = 60.0,
+    ):
+        self.max_attempts = max_attempts
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.deadline_seconds = deadline_seconds
+        self.calls = 0
+        self.retries = 0
+        self.retries_per_call = Histogram(list(range(max_attempts)))
+
+    def deadline(self) -> float:
+        """Absolute deadline: the policy default, or sooner if the client asked"""
+        deadline = time.monotonic() + self.deadline_seconds
+        client_deadline = request_deadline.get()
+        if client_deadline is not None:
+            deadline = min(deadline, client_deadline)
+        return deadline
+
+    def attempts(self, deadline: float, can_retry: Callable[[], bool] = lambda: True) -> AsyncRetrying:
+        def retryable(error: BaseException) -> bool:
+            return can_retry() and classify_error(error).retryable
+
+        def stop(retry_state) -> bool:
+            # Give up if the next backoff would end past the deadline
+            next_sleep = retry_state.upcoming_sleep or 0
+            return (
+                stop_after_attempt(self.max_attempts)(retry_state)
+                or time.monotonic() + next_sleep >= deadline
+            )
+
+        return AsyncRetrying(
+            retry=retry_if_exception(retryable),
+            wait=wait_random_exponential(multiplier=self.initial_backoff, max=self.max_backoff),
+            stop=stop,
+            reraise=True,
+        )
+
+    def record(self, attempts: int):
+        self.calls += 1
+        self.retries += attempts - 1
+        self.retries_per_call.observe(attempts - 1)
+
+    async def call(self, fn: Callable[[], Awaitable[T]], deadline: Optional[float] = None) -> T:
+        """Run fn with retries; each attempt is bounded by the remaining deadline"""
+        deadline = deadline or self.deadline()
+        attempts = 0
+        try:
+            async for attempt in self.attempts(deadline):
+                with attempt:
+                    attempts += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DeadlineExceeded("Request deadline exceeded")
+                    return await asyncio.wait_for(fn(), timeout=remaining)
+        finally:
+            self.record(attempts)
+
+    def stats(self) -> dict:
+        return {
+            "max_attempts": self.max_attempts,
+            "deadline_seconds": self.deadline_seconds,
+            "calls": self.calls,
+            "retries": self.retries,
+            "retries_per_call": self.retries_per_call.summary(),
+        }
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker.
+
+    Opens when, over the last window_seconds (and at least min_calls
+    calls), the failure rate or the rate of calls slower than
+    slow_call_seconds reaches the threshold. After open_seconds it lets
+    up to half_open_probes calls through; a success closes it again and
+    a failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        window_seconds: float = 60.0,
+        min_calls: int = 10,
+        failure_threshold: float = 0.5,
+        slow_call_seconds: float = 30.0,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 1,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.times_opened = 0
+        # (timestamp, failed, slow)
+        self.outcomes = deque()
+
+    def _trim(self, now: float):
+        while self.outcomes and self.outcomes[0][0] < now - self.window_seconds:
+            self.outcomes.popleft()
+
+    def allow_request(self) -> bool:
+        now = time.monotonic()
+        if self.state == self.OPEN and now - self.opened_at >= self.open_seconds:
+            self.state = self.HALF_OPEN
+            self.probes_in_flight = 0
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and self.probes_in_flight < self.half_open_probes:
+            self.probes_in_flight += 1
+            return True
+        return False
+
+    def release_probe(self):
+        """A half-open probe ended without an outcome (e.g. it was cancelled)"""
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.times_opened += 1
+
+    def record(self, failed: bool, latency: float):
+        now = time.monotonic()
+        slow = latency >= self.slow_call_seconds
+        if self.state == self.HALF_OPEN:
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if failed or slow:
+                self._open(now)
+            else:
+                self.state = self.CLOSED
+                self.outcomes.clear()
+            return
+
+        self.outcomes.append((now, failed, slow))
+        self._trim(now)
+        if self.state == self.CLOSED and len(self.outcomes) >= self.min_calls:
+            failures = sum(1 for _, f, _ in self.outcomes if f)
+            slow_calls = sum(1 for _, _, sl in self.outcomes if sl)
+            if max(failures, slow_calls) / len(self.outcomes) >= self.failure_threshold:
+                self._open(now)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self._trim(now)
+        calls = len(self.outcomes)
+        failures = sum(1 for _, f, _ in self.outcomes if f)
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "window_failure_rate": round(failures / calls, 4) if calls else 0.0,
+            "times_opened": self.times_opened,
+        }
+
+
+class ModelChain:
+    """
+    Ordered list of models with one circuit breaker each.
+
+    Requests go to the first model whose breaker allows it and fail over
+    down the chain on upstream (429/5xx/timeout) errors.
+    """
+
+    def __init__(self, models: List[str], breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker):
+        self.models = models
+        self.breakers: Dict[str, CircuitBreaker] = {model: breaker_factory() for model in models}
+        self.breaker_factory = breaker_factory
+        self.failovers = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = self.breaker_factory()
+        return self.breakers[model]
+
+    def order(self, primary: Optional[str] = None) -> List[str]:
+        if primary is None:
+            return list(self.models)
+        return [primary] + [model for model in self.models if model != primary]
+
+    def should_fail_over(self, error: BaseException) -> bool:
+        return classify_error(error).retryable or isinstance(error, DeadlineExceeded)
+
+    def is_model_failure(self, error: BaseException) -> bool:
+        """
+        Whether an error counts against the model's breaker. Upstream
+        429/5xx errors do; deadlines (usually the client's own
+        X-Request-Timeout) and request errors (4xx, blocked prompts) don't.
+        """
+        if isinstance(error, (DeadlineExceeded, asyncio.TimeoutError, TimeoutError)):
+            return False
+        return classify_error(error).retryable
+
+    def record_error(self, model: str, error: BaseException, latency: float):
+        breaker = self.breaker(model)
+        if self.is_model_failure(error):
+            breaker.record(failed=True, latency=latency)
+        elif latency >= breaker.slow_call_seconds:
+            # A model too slow to answer before the deadline is still a slow call
+            breaker.record(failed=False, latency=latency)
+        else:
+            breaker.release_probe()
+
+    def past_deadline(self, deadline: Optional[float] = None) -> bool:
+        if deadline is None:
+            deadline = request_deadline.get()
+        return deadline is not None and time.monotonic() >= deadline
+
+    async def call(
+        self,
+        fn: Callable[[str], Awaitable[T]],
+        primary: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """
+        Call fn(model_name) on the first available model, failing over on
+        upstream errors until `deadline` (default: the client's) has passed
+        """
+        last_error = None
+        for model in self.order(primary):
+            if last_error is not None and self.past_deadline(deadline):
+                break
+            breaker = self.breaker(model)
+            if not breaker.allow_request():
+                continue
+            if last_error is not None:
+                self.failovers += 1
+            start = time.monotonic()
+            try:
+                result = await fn(model)
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                self.record_error(model, e, time.monotonic() - start)
+                if not self.should_fail_over(e):
+                    raise
+                last_error = e
+                continue
+            breaker.record(failed=False, latency=time.monotonic() - start)
+            return result
+        if last_error is not None:
+            raise last_error
+        raise CircuitOpen("All models are unavailable (circuit breakers open)")
+
+    def stats(self) -> dict:
+        return {
+            "chain": self.models,
+            "failovers": self.failovers,
+            "breakers": {model: breaker.stats() for model, breaker in self.breakers.items()},
+        }
+
+
+class DeadlineMiddleware:
+    """ASGI middleware that reads X-Request-Timeout (seconds) into request_deadline"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope.get("headers", []):
+                if name == DEADLINE_HEADER:
+                    try:
+                        timeout = float(value)
+                    except ValueError:
+                        break
+                    if timeout > 0:
+                        request_deadline.set(time.monotonic() + timeout)
+                    break
+        await self.app(scope, receive, send)
+
+
+def create_retry_policy() -> RetryPolicy:
+    """Build the retry policy from RETRY_* environment variables"""
+    return RetryPolicy(
+        max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "4")),
+        initial_backoff=float(os.getenv("RETRY_INITIAL_BACKOFF_SECONDS", "0.5")),
+        max_backoff=float(os.getenv("RETRY_MAX_BACKOFF_SECONDS", "8")),
+        deadline_seconds=float(os.getenv("RETRY_DEADLINE_SECONDS", "60")),
+    )
+
+
+def create_model_chain(default_model: str) -> ModelChain:
+    """Build the failover chain from MODEL_CHAIN and BREAKER_* environment variables"""
+    models = [m.strip() for m in os.getenv("MODEL_CHAIN", default_model).split(",") if m.strip()]
+
+    def breaker_factory() -> CircuitBreaker:
+        return CircuitBreaker(
+            window_seconds=float(os.getenv("BREAKER_WINDOW_SECONDS", "60")),
+            min_calls=int(os.getenv("BREAKER_MIN_CALLS", "10")),
+            failure_threshold=float(os.getenv("BREAKER_FAILURE_THRESHOLD", "0.5")),
+            slow_call_seconds=float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "30")),
+            open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
+        )
+
+    return ModelChain(models or [default_model], breaker_factory)
@@ -0,0 +1,263 @@
+"""
+Passage retrieval for question answering over large contexts.
+
+A QA context (or an uploaded document) larger than the token budget is
+split into passages on paragraph and sentence boundaries and indexed
+with BM25. Only the best-scoring passages that fit in the budget go into
+the prompt, in document order. Indexing and scoring are vectorized in
+NumPy: terms are mapped to integer ids through a dict, and a query is one
+masked bincount over the (passage, term) pairs.
+
+Indexes are cached by a hash of the text, so repeated questions against
+the same manual skip the indexing step. Uploaded documents are kept
+until evicted by newer ones.
+"""
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+
+from metrics import Histogram
+from summarizer import chunk_text, estimate_tokens
+
+TOKEN = re.compile(r"\w+")
+
+# Longer "words" (base64 blobs, hashes) never match a question; dropping them
+# keeps one huge token from dominating the vocabulary
+MAX_TOKEN_CHARS = 40
+
+# Passages scoring below this fraction of the best one are left out even if
+# they would fit (e.g. ones matching only "the" or "how")
+MIN_RELATIVE_SCORE = 0.1
+
+BUILD_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+
+
+class DocumentNotFound(Exception):
+    pass
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN.findall(text.lower()) if len(token) <= MAX_TOKEN_CHARS]
+
+
+class PassageIndex:
+    """BM25 index over a fixed list of passages"""
+
+    def __init__(self, passages: List[str], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.passage_tokens = np.array([estimate_tokens(p) for p in passages], dtype=np.int64)
+        tokens = [tokenize(p) for p in passages]
+        lengths = np.array([len(t) for t in tokens], dtype=np.int64)
+        n = len(passages)
+
+        # Term ids in order of first occurrence
+        self.term_ids: Dict[str, int] = {}
+        flat = [self.term_ids.setdefault(token, len(self.term_ids)) for passage in tokens for token in passage]
+        if not flat:
+            self.pair_docs = self.pair_terms = np.array([], dtype=np.int64)
+            self.pair_weights = self.idf = np.array([], dtype=np.float64)
+            return
+        term_ids = np.array(flat, dtype=np.int64)
+        vocab_size = len(self.term_ids)
+        doc_ids = np.repeat(np.arange(n, dtype=np.int64), lengths)
+
+        # Term frequency per (passage, term) pair
+        pairs, tf = np.unique(doc_ids * vocab_size + term_ids, return_counts=True)
+        self.pair_docs = pairs // vocab_size
+        self.pair_terms = pairs % vocab_size
+
+        df = np.bincount(self.pair_terms, minlength=vocab_size)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avgdl = max(lengths.mean(), 1.0)
+        norm = k1 * (1 - b + b * lengths[self.pair_docs] / avgdl)
+        # Query-independent part of each pair's BM25 contribution
+        self.pair_weights = tf * (k1 + 1) / (tf + norm)
+
+    @property
+    def total_tokens(self) -> int:
+        return int(self.passage_tokens.sum())
+
+    def scores(self, query: str) -> np.ndarray:
+        n = len(self.passages)
+        # Ids of the query terms that occur in any passage
+        query_ids = np.array(
+            sorted({self.term_ids[term] for term in tokenize(query) if term in self.term_ids}), dtype=np.int64
+        )
+        if not len(query_ids):
+            return np.zeros(n)
+        mask = np.isin(self.pair_terms, query_ids)
+        return np.bincount(
+            self.pair_docs[mask],
+            weights=self.idf[self.pair_terms[mask]] * self.pair_weights[mask],
+            minlength=n,
+        )
+
+    def select(self, query: str, token_budget: int, top_k: int) -> List[int]:
+        """
+        Indices of the highest-scoring passages that fit in the budget (at
+        most top_k, and none far below the best), in document order. With
+        no matching terms, the leading passages are used instead.
+        """
+        scores = self.scores(query)
+        best = scores.max(initial=0)
+        if best > 0:
+            ranked = np.argsort(-scores, kind="stable")
+            ranked = ranked[scores[ranked] >= best * MIN_RELATIVE_SCORE]
+        else:
+            ranked = np.arange(len(self.passages))
+        selected = []
+        used = 0
+        for i in ranked:
+            tokens = int(self.passage_tokens[i])
+            if used + tokens > token_budget:
+                continue
+            selected.append(int(i))
+            used += tokens
+            if len(selected) >= top_k:
+                break
+        return sorted(selected)
+
+
+@dataclass
+class Retrieval:
+    """What retrieval sent in place of the full context"""
+
+    context: str
+    passages: int
+    passages_selected: int
+    context_tokens: int
+    sent_tokens: int
+    index_cached: bool
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.context_tokens - self.sent_tokens
+
+    def summary(self) -> dict:
+        return {
+            "passages": self.passages,
+            "passages_selected": self.passages_selected,
+            "context_tokens": self.context_tokens,
+            "sent_tokens": self.sent_tokens,
+            "tokens_saved": self.tokens_saved,
+            "index_cached": self.index_cached,
+        }
+
+
+class ContextRetriever:
+    """Builds, caches and queries passage indexes for QA contexts and uploaded documents"""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        token_budget: int = 2000,
+        top_k: int = 8,
+        passage_tokens: int = 200,
+        cache_entries: int = 64,
+        max_documents: int = 256,
+    ):
+        self.enabled = enabled
+        self.token_budget = token_budget
+        self.top_k = top_k
+        self.passage_tokens = passage_tokens
+        self.indexes: LRUCache = LRUCache(maxsize=cache_entries)
+        self.documents: "OrderedDict[str, PassageIndex]" = OrderedDict()
+        self.max_documents = max_documents
+        self.index_hits = 0
+        self.index_misses = 0
+        self.retrievals = 0
+        self.tokens_saved = 0
+        self.build_seconds = Histogram(BUILD_BUCKETS)
+
+    def build(self, text: str) -> PassageIndex:
+        """Blocking; call through asyncio.to_thread for large texts"""
+        start = time.perf_counter()
+        index = PassageIndex(chunk_text(text, self.passage_tokens))
+        self.build_seconds.observe(time.perf_counter() - start)
+        return index
+
+    def cached_index(self, text: str) -> Tuple[Optional[PassageIndex], str]:
+        key = content_hash(text)
+        index = self.indexes.get(key)
+        if index is not None:
+            self.index_hits += 1
+        return index, key
+
+    def store_index(self, key: str, index: PassageIndex):
+        self.index_misses += 1
+        self.indexes[key] = index
+
+    def needs_retrieval(self, text: str) -> bool:
+        return self.enabled and estimate_tokens(text) > self.token_budget
+
+    def add_document(self, document_id: str, index: PassageIndex):
+        self.documents[document_id] = index
+        self.documents.move_to_end(document_id)
+        while len(self.documents) > self.max_documents:
+            self.documents.popitem(last=False)
+
+    def document(self, document_id: str) -> PassageIndex:
+        index = self.documents.get(document_id)
+        if index is None:
+            raise DocumentNotFound(f"Document {document_id} not found (unknown ID or evicted)")
+        self.documents.move_to_end(document_id)
+        return index
+
+    def retrieve(self, index: PassageIndex, question: str, index_cached: bool, full: bool = False) -> Retrieval:
+        """Passages of `index` to send for `question` (all of them with `full`)"""
+        if full:
+            selected = list(range(len(index.passages)))
+        else:
+            selected = index.select(question, self.token_budget, self.top_k)
+        context = "\n\n".join(index.passages[i] for i in selected)
+        retrieval = Retrieval(
+            context=context,
+            passages=len(index.passages),
+            passages_selected=len(selected),
+            context_tokens=index.total_tokens,
+            sent_tokens=int(index.passage_tokens[selected].sum()) if selected else 0,
+            index_cached=index_cached,
+        )
+        self.retrievals += 1
+        self.tokens_saved += retrieval.tokens_saved
+        return retrieval
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "token_budget": self.token_budget,
+            "top_k": self.top_k,
+            "passage_tokens": self.passage_tokens,
+            "retrievals": self.retrievals,
+            "tokens_saved": self.tokens_saved,
+            "cached_indexes": len(self.indexes),
+            "index_hits": self.index_hits,
+            "index_misses": self.index_misses,
+            "documents": len(self.documents),
+            "max_documents": self.max_documents,
+            "build_p50_ms": round(self.build_seconds.quantile(0.5) * 1000, 1),
+            "build_p95_ms": round(self.build_seconds.quantile(0.95) * 1000, 1),
+        }
+
+
+def create_context_retriever() -> ContextRetriever:
+    """Build the QA retriever from QA_RETRIEVAL_* environment variables"""
+    return ContextRetriever(
+        enabled=os.getenv("QA_RETRIEVAL_ENABLED", "true").lower() == "true",
+        token_budget=int(os.getenv("QA_RETRIEVAL_TOKEN_BUDGET", "2000")),
+        top_k=int(os.getenv("QA_RETRIEVAL_TOP_K", "8")),
+        passage_tokens=int(os.getenv("QA_RETRIEVAL_PASSAGE_TOKENS", "200")),
+        cache_entries=int(os.getenv("QA_RETRIEVAL_CACHE_ENTRIES", "64")),
+        max_documents=int(os.getenv("QA_DOCUMENTS_MAX", "256")),
+    )
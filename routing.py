@@ -0,0 +1,182 @@
+"""
+Per-endpoint model routing.
+
+A routing file maps each endpoint (optionally per variant, e.g.
+"summarize-short") and input size band to a model name and generation
+config overrides. The file is re-read when it changes, so routes can be
+tuned without a restart. Upstream latency is tracked per route.
+
+Example routing.json:
+
+    {
+        "routes": {
+            "summarize-short": [{"model": "gemini-flash-latest", "generation_config": {"max_output_tokens": 150}}],
+            "translate": [{"model": "gemini-flash-latest"}],
+            "qa": [
+                {"max_input_chars": 2000, "model": "gemini-flash-latest"},
+                {"model": "gemini-pro-latest"}
+            ]
+        }
+    }
+
+Bands are checked in order; the first whose max_input_chars covers the
+input (or that has no max_input_chars) wins.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from metrics import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Route:
+    name: str
+    model: Optional[str] = None
+    generation_config: Dict = field(default_factory=dict)
+    max_input_chars: Optional[int] = None
+
+
+class RoutingTable:
+    """Hot-reloadable endpoint -> (model, generation config) table"""
+
+    def __init__(self, path: Optional[str] = None, reload_interval: float = 2.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.routes: Dict[str, List[Route]] = {}
+        self.loaded_mtime = None
+        self.last_check = 0.0
+        self.last_error = None
+        self.reloads = 0
+        self.lock = threading.Lock()
+        self.latency: Dict[str, LatencyWindow] = {}
+        if path:
+            self.reload_if_changed(force=True)
+
+    @staticmethod
+    def check_band(key: str, band: dict):
+        """Raise ValueError for a band whose values would fail at request time"""
+
+        def is_number(value) -> bool:
+            return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+        def is_int(value) -> bool:
+            return isinstance(value, int) and not isinstance(value, bool)
+
+        model = band.get("model")
+        if model is not None and (not isinstance(model, str) or not model.strip()):
+            raise ValueError(f"Route {key!r}: model must be a non-empty string")
+        max_input_chars = band.get("max_input_chars")
+        if max_input_chars is not None and (not is_int(max_input_chars) or max_input_chars < 1):
+            raise ValueError(f"Route {key!r}: max_input_chars must be a positive integer or null")
+        generation_config = band.get("generation_config") or {}
+        if not isinstance(generation_config, dict):
+            raise ValueError(f"Route {key!r}: generation_config must be a mapping")
+        for name, check, kind in (
+            ("temperature", is_number, "a number"),
+            ("top_p", is_number, "a number"),
+            ("top_k", is_int, "an integer"),
+            ("max_output_tokens", is_int, "an integer"),
+        ):
+            if name in generation_config and not check(generation_config[name]):
+                raise ValueError(f"Route {key!r}: generation_config.{name} must be {kind}")
+
+    def load(self, path: str) -> Dict[str, List[Route]]:
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                import yaml
+
+                try:
+                    config = yaml.safe_load(f) or {}
+                except yaml.YAMLError as e:
+                    raise ValueError(f"Invalid YAML: {e}") from e
+            else:
+                config = json.load(f)
+
+        if not isinstance(config, dict):
+            raise ValueError("Top level must be a mapping with a \"routes\" key")
+        config_routes = config.get("routes") or {}
+        if not isinstance(config_routes, dict):
+            raise ValueError("\"routes\" must map endpoint names to bands")
+        routes = {}
+        for key, bands in config_routes.items():
+            if isinstance(bands, dict):
+                bands = [bands]
+            if not isinstance(bands, list) or not all(isinstance(band, dict) for band in bands):
+                raise ValueError(f"Route {key!r} must be a band or a list of bands")
+            for band in bands:
+                self.check_band(key, band)
+            routes[key] = [
+                Route(
+                    name=f"{key}[<={band['max_input_chars']}]" if band.get("max_input_chars") else key,
+                    model=band.get("model"),
+                    generation_config=dict(band.get("generation_config") or {}),
+                    max_input_chars=band.get("max_input_chars"),
+                )
+                for band in bands
+            ]
+        return routes
+
+    def reload_if_changed(self, force: bool = False):
+        """Re-read the routing file if its mtime changed (checked at most every reload_interval)"""
+        now = time.monotonic()
+        if not self.path or (not force and now - self.last_check < self.reload_interval):
+            return
+        self.last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+            if not force and mtime == self.loaded_mtime:
+                return
+            # Don't re-read (and re-log) a broken file until it changes again
+            self.loaded_mtime = mtime
+            routes = self.load(self.path)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Keep serving the last good table
+            self.last_error = str(e)
+            logger.warning("Could not load routing file %s: %s", self.path, e)
+            return
+        with self.lock:
+            self.routes = routes
+            self.last_error = None
+            self.reloads += 1
+
+    def resolve(self, endpoint: str, input_chars: int, variant: Optional[str] = None) -> Route:
+        self.reload_if_changed()
+        keys = [f"{endpoint}-{variant}", endpoint] if variant else [endpoint]
+        for key in keys:
+            for route in self.routes.get(key, []):
+                if route.max_input_chars is None or input_chars <= route.max_input_chars:
+                    return route
+        return Route(name=keys[0])
+
+    def observe(self, route: Route, seconds: float):
+        window = self.latency.get(route.name)
+        if window is None:
+            window = self.latency[route.name] = LatencyWindow()
+        window.observe(seconds)
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "reloads": self.reloads,
+            "last_error": self.last_error,
+            "routes": {
+                key: [{"name": r.name, "model": r.model, "max_input_chars": r.max_input_chars} for r in routes]
+                for key, routes in self.routes.items()
+            },
+            "latency": {name: window.summary() for name, window in self.latency.items()},
+        }
+
+
+def create_routing_table() -> RoutingTable:
+    """Build the routing table from ROUTING_CONFIG_PATH"""
+    return RoutingTable(
+        path=os.getenv("ROUTING_CONFIG_PATH"),
+        reload_interval=float(os.getenv("ROUTING_RELOAD_SECONDS", "2")),
+    )
@@ -0,0 +1,298 @@
+"""
+Semantic (near-duplicate) response cache.
+
+Prompts are normalized (case, punctuation, contractions, "please") and
+embedded as signed hashed character-trigram + word vectors in NumPy, so
+"What's machine learning?" and "what is machine learning" land on the
+same vector with no model call. Acronyms written in capitals ("ML") are
+expanded to a phrase with those initials seen in an earlier prompt
+("machine learning"). Vectors live in a fixed-size matrix; a lookup is
+one matrix-vector product over the entries in the same scope (same model,
+generation config and, for QA, the same context). The best match is
+served if its cosine similarity reaches the threshold.
+
+N-gram similarity barely moves when "not" or a number is added or
+changed, so the scope also includes the prompt's negations and numbers:
+"should restart" never matches "should not restart", nor "3 bullet
+points" "5 bullet points".
+"""
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from backends import GenerationResult
+from metrics import Histogram
+
+CONTRACTIONS = [
+    (re.compile(r"\bwon't\b"), "will not"),
+    (re.compile(r"\bcan't\b"), "can not"),
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"'re\b"), " are"),
+    (re.compile(r"'ll\b"), " will"),
+    (re.compile(r"'ve\b"), " have"),
+    (re.compile(r"'m\b"), " am"),
+    (re.compile(r"'d\b"), " would"),
+    (re.compile(r"\b(what|who|where|when|why|how|it|that|there|here)'s\b"), r"\1 is"),
+]
+NON_WORD = re.compile(r"[^\w\s]+")
+WHITESPACE = re.compile(r"\s+")
+POLITENESS = re.compile(r"\b(please|kindly)\b")
+NEGATIONS = frozenset({"not", "no", "never", "without", "nor", "neither", "none", "nothing", "cannot"})
+NUMBER = re.compile(r"\d+")
+# "ML", "APIs": 2-5 capitals, optionally plural
+ACRONYM = re.compile(r"\b([A-Z]{2,5})s?\b")
+# Phrases whose initials an acronym can stand for ("machine learning")
+PHRASE_WORD = re.compile(r"[a-z]{3,}")
+
+# Knuth's multiplicative hash constant (golden ratio * 2**64)
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+LOOKUP_BUCKETS = [0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05]
+
+
+def normalize_prompt(text: str) -> str:
+    text = text.lower().replace("’", "'")
+    for pattern, replacement in CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = NON_WORD.sub(" ", text)
+    text = POLITENESS.sub(" ", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def guard_key(normalized: str) -> list:
+    """What must match exactly for two prompts to be near-duplicates: negations and numbers"""
+    words = normalized.split()
+    return [sum(word in NEGATIONS for word in words), [word for word in words if NUMBER.search(word)]]
+
+
+@dataclass
+class SemanticQuery:
+    """Text to match semantically; `context` must match exactly (e.g. the QA context)"""
+
+    text: str
+    context: str = ""
+
+
+class HashedNgramEmbedder:
+    """Signed feature hashing of character trigrams and words into `dim` dimensions"""
+
+    def __init__(self, dim: int = 512, word_weight: float = 2.0):
+        self.dim = dim
+        self.word_weight = word_weight
+
+    def embed(self, text: str) -> np.ndarray:
+        normalized = normalize_prompt(text)
+        vector = np.zeros(self.dim, dtype=np.float64)
+
+        # Character trigrams, hashed without a Python-level loop
+        data = np.frombuffer(f" {normalized} ".encode(), dtype=np.uint8).astype(np.uint64)
+        if len(data) >= 3:
+            grams = (data[:-2] << np.uint64(16)) | (data[1:-1] << np.uint64(8)) | data[2:]
+            hashed = (grams * HASH_MULTIPLIER) >> np.uint64(32)
+            signs = np.where(hashed & np.uint64(1), 1.0, -1.0)
+            vector += np.bincount((hashed >> np.uint64(1)) % np.uint64(self.dim), weights=signs, minlength=self.dim)
+
+        for word in normalized.split():
+            h = zlib.crc32(word.encode())
+            vector[(h >> 1) % self.dim] += self.word_weight if h & 1 else -self.word_weight
+
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float32)
+
+
+class VectorIndex:
+    """
+    Fixed-capacity vector store with TTL expiry and least-recently-used
+    eviction. Slots are rows of one preallocated matrix.
+    """
+
+    def __init__(self, dim: int, capacity: int, ttl_seconds: float):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.scopes = np.zeros(capacity, dtype=np.int64)
+        # expires_at == 0 marks an empty slot
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.values: List[Optional[GenerationResult]] = [None] * capacity
+        self.size = 0
+        self.evictions = 0
+
+    def search(self, vector: np.ndarray, scope: int, now: float) -> Tuple[Optional[int], float]:
+        """Best live slot in `scope` and its cosine similarity"""
+        n = self.size
+        if n == 0:
+            return None, 0.0
+        live = (self.scopes[:n] == scope) & (self.expires_at[:n] > now)
+        if not live.any():
+            return None, 0.0
+        scores = np.where(live, self.vectors[:n] @ vector, -np.inf)
+        slot = int(np.argmax(scores))
+        # float32 rounding can put identical vectors a hair above 1
+        return slot, min(1.0, float(scores[slot]))
+
+    def touch(self, slot: int, now: float):
+        self.last_used[slot] = now
+
+    def _free_slot(self, now: float) -> int:
+        if self.size < self.capacity:
+            self.size += 1
+            return self.size - 1
+        expired = np.flatnonzero(self.expires_at <= now)
+        if len(expired):
+            return int(expired[0])
+        self.evictions += 1
+        return int(np.argmin(self.last_used))
+
+    def put(self, vector: np.ndarray, scope: int, value: GenerationResult, now: float, slot: Optional[int] = None):
+        if slot is None:
+            slot = self._free_slot(now)
+        self.vectors[slot] = vector
+        self.scopes[slot] = scope
+        self.expires_at[slot] = now + self.ttl_seconds
+        self.last_used[slot] = now
+        self.values[slot] = value
+
+    def live_entries(self, now: float) -> int:
+        return int((self.expires_at[:self.size] > now).sum())
+
+    def clear(self):
+        self.expires_at[:] = 0
+        self.values = [None] * self.capacity
+        self.size = 0
+
+
+class SemanticCache:
+    """Near-duplicate lookup in front of the exact-match ResponseCache"""
+
+    # Re-adding a prompt this similar to an existing entry replaces it
+    DUPLICATE_SIMILARITY = 0.999
+    # Phrases remembered for acronym expansion
+    MAX_PHRASES = 4096
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        threshold: float = 0.9,
+        max_entries: int = 2048,
+        ttl_seconds: float = 3600,
+        dim: int = 512,
+        max_temperature: float = 0.3,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_temperature = max_temperature
+        self.embedder = HashedNgramEmbedder(dim)
+        self.index = VectorIndex(dim, max_entries, ttl_seconds)
+        # Initials -> the most recent 2-4 word phrase with them
+        self.phrases: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = Histogram(LOOKUP_BUCKETS)
+        self.hit_similarity = Histogram([0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0])
+
+    def is_cacheable(self, generation_config: dict) -> bool:
+        return (
+            self.enabled
+            and generation_config.get("temperature", 1.0) <= self.max_temperature
+            and generation_config.get("candidate_count", 1) == 1
+        )
+
+    @staticmethod
+    def scope(model_name: str, generation_config: dict, context: str = "") -> int:
+        """Entries only match within the same model, generation config and context"""
+        material = json.dumps([model_name, generation_config, context], sort_keys=True).encode()
+        return int.from_bytes(hashlib.blake2b(material, digest_size=8).digest(), "little", signed=True)
+
+    @staticmethod
+    def guarded_scope(scope: int, normalized: str) -> int:
+        """Narrow `scope` to prompts with the same negations and numbers"""
+        material = json.dumps([scope, guard_key(normalized)]).encode()
+        return int.from_bytes(hashlib.blake2b(material, digest_size=8).digest(), "little", signed=True)
+
+    def expand_acronyms(self, text: str) -> str:
+        def expand(match: re.Match) -> str:
+            return self.phrases.get(match.group(1).lower(), match.group(0))
+
+        return ACRONYM.sub(expand, text)
+
+    def learn_phrases(self, normalized: str):
+        words = normalized.split()
+        for size in (2, 3, 4):
+            for i in range(len(words) - size + 1):
+                run = words[i:i + size]
+                if all(PHRASE_WORD.fullmatch(word) for word in run):
+                    initials = "".join(word[0] for word in run)
+                    self.phrases[initials] = " ".join(run)
+                    self.phrases.move_to_end(initials)
+        while len(self.phrases) > self.MAX_PHRASES:
+            self.phrases.popitem(last=False)
+
+    def lookup(self, query: SemanticQuery, scope: int) -> Optional[GenerationResult]:
+        start = time.perf_counter()
+        now = time.time()
+        normalized = normalize_prompt(self.expand_acronyms(query.text))
+        scope = self.guarded_scope(scope, normalized)
+        slot, similarity = self.index.search(self.embedder.embed(normalized), scope, now)
+        hit = slot is not None and similarity >= self.threshold
+        if hit:
+            self.index.touch(slot, now)
+        self.lookup_seconds.observe(time.perf_counter() - start)
+        if not hit:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.hit_similarity.observe(similarity)
+        return replace(self.index.values[slot], cached=True, similarity=round(similarity, 4))
+
+    def add(self, query: SemanticQuery, scope: int, result: GenerationResult):
+        now = time.time()
+        normalized = normalize_prompt(self.expand_acronyms(query.text))
+        self.learn_phrases(normalized)
+        scope = self.guarded_scope(scope, normalized)
+        vector = self.embedder.embed(normalized)
+        slot, similarity = self.index.search(vector, scope, now)
+        if slot is None or similarity < self.DUPLICATE_SIMILARITY:
+            slot = None
+        self.index.put(vector, scope, result, now, slot)
+
+    def clear(self):
+        self.index.clear()
+        self.phrases.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "max_temperature": self.max_temperature,
+            "entries": self.index.live_entries(time.time()),
+            "max_entries": self.index.capacity,
+            "evictions": self.index.evictions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "lookup_p50_us": round(self.lookup_seconds.quantile(0.5) * 1e6, 1),
+            "lookup_p95_us": round(self.lookup_seconds.quantile(0.95) * 1e6, 1),
+            "hit_similarity": self.hit_similarity.summary(),
+        }
+
+
+def create_semantic_cache() -> SemanticCache:
+    """Build the semantic cache from SEMANTIC_CACHE_* environment variables"""
+    return SemanticCache(
+        enabled=os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true",
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048")),
+        ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))),
+        dim=int(os.getenv("SEMANTIC_CACHE_DIM", "512")),
+        max_temperature=float(os.getenv("SEMANTIC_CACHE_MAX_TEMPERATURE", "0.3")),
+    )
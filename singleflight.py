@@ -0,0 +1,48 @@
+"""
+Request coalescing: concurrent calls with the same key share one upstream call.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicates in-flight work by key.
+
+    The first caller for a key starts the work as a task; callers that
+    arrive while it is running await the same task. Results and errors are
+    delivered to every waiter. The task is shielded, so one waiter going
+    away (e.g. a client disconnect) does not cancel the call for the rest.
+    """
+
+    def __init__(self):
+        self.calls: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self.calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self.calls[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+        # Mark the exception as retrieved in case every waiter went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.calls),
+            "upstream_calls": self.leaders,
+            "coalesced_requests": self.coalesced,
+        }
@@ -1,10 +1,166 @@
-import streamlit as st
-import requests
+import io
 import json
+import time
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from client import APIError, ContentClient
 
 # Configuration
 # API_URL = "http://127.0.0.1:8000"
 API_URL = "https://smart-content-generator-lhue.onrender.com/"
+HEALTH_TTL_SECONDS = 15
+MAX_MEMOIZED_RESULTS = 50
+
+@st.cache_resource
+def get_client():
+    """One pooled keep-alive client for the whole Streamlit process, shared by every session and rerun"""
+    return ContentClient(API_URL, timeout=120)
+
+@st.cache_data(ttl=HEALTH_TTL_SECONDS, show_spinner=False)
+def check_health():
+    """
+    /health result, cached so that reruns (every widget interaction)
+    don't each make a round trip. Returns (status, health data or error).
+    """
+    try:
+        return "ok", get_client().health(timeout=2)
+    except APIError as e:
+        return "error", str(e)
+    except Exception as e:
+        return "down", str(e)
+
+def stream_post(endpoint, payload, placeholder):
+    """
+    POST to the streaming variant of an endpoint, rendering text into
+    `placeholder` as chunks arrive. Returns the final event, which has the
+    same shape as the regular JSON response.
+    """
+    text = ""
+    try:
+        for event, data in get_client().stream_events(endpoint, payload):
+            if event == "chunk":
+                text += data["text"]
+                placeholder.markdown(text + "▌")
+            elif event == "done":
+                placeholder.empty()
+                return data
+            elif event == "error":
+                placeholder.empty()
+                return {"success": False, "detail": data["detail"]}
+    except APIError as e:
+        placeholder.empty()
+        return {"success": False, "detail": e.detail}
+    
+    placeholder.empty()
+    return {"success": False, "detail": "Stream ended unexpectedly"}
+
+def memoized_post(endpoint, payload, placeholder):
+    """
+    stream_post, memoized per browser session on the endpoint and inputs,
+    so pressing a button again with unchanged inputs shows the previous
+    result at once. Returns (response, info), where info holds the latency
+    and where the result came from.
+    """
+    memo = st.session_state.setdefault("memoized_results", OrderedDict())
+    key = json.dumps([endpoint, payload], sort_keys=True)
+    if key in memo:
+        memo.move_to_end(key)
+        data, info = memo[key]
+        return data, {**info, "latency_ms": 0.0, "source": f"memoized (first run: {info['latency_ms']} ms, {info['source']})"}
+    
+    start = time.perf_counter()
+    data = stream_post(endpoint, payload, placeholder)
+    info = {"latency_ms": round((time.perf_counter() - start) * 1000, 1), "source": result_source(data)}
+    if data.get("success"):
+        memo[key] = (data, info)
+        while len(memo) > MAX_MEMOIZED_RESULTS:
+            memo.popitem(last=False)
+    return data, info
+
+def result_source(data):
+    """Where the server got the result from"""
+    result = data.get("data") or {}
+    if not result.get("cached"):
+        return "model"
+    if "semantic_similarity" in result:
+        return f"server semantic cache (similarity {result['semantic_similarity']})"
+    return "server cache"
+
+def show_result_info(info):
+    st.caption(f"⏱️ {info['latency_ms']} ms · 📦 {info['source']}")
+
+# Bulk tab: operation -> (endpoint, request field the text column fills, response field shown as the result)
+BULK_OPERATIONS = {
+    "📝 Summarize": ("/api/summarize", "text", "summary"),
+    "🌐 Translate": ("/api/translate", "text", "translated"),
+    "💻 Explain Code": ("/api/explain-code", "code", "explanation"),
+    "❓ Q&A": ("/api/qa", "question", "answer"),
+    "✨ Generate": ("/api/generate", "prompt", "generated_text"),
+}
+BULK_MAX_CONCURRENCY = 16
+BULK_REFRESH_SECONDS = 0.5
+
+def read_upload(uploaded):
+    """DataFrame from an uploaded CSV or JSONL file"""
+    if uploaded.name.lower().endswith((".jsonl", ".json")):
+        return pd.read_json(uploaded, lines=True, dtype=False)
+    return pd.read_csv(uploaded, dtype=str, keep_default_na=False)
+
+def bulk_payload(row, request_field, text_column, options, context_column=None):
+    """Request body for one row, or None if its input is empty"""
+    text = row[text_column]
+    if not isinstance(text, str) or not text.strip():
+        return None
+    payload = {request_field: text, **options}
+    if context_column and isinstance(row[context_column], str) and row[context_column].strip():
+        payload["context"] = row[context_column]
+    return payload
+
+def run_bulk(df, endpoint, result_field, payloads, concurrency, table, progress, status_line):
+    """
+    Send every row's payload with at most `concurrency` in flight, filling
+    the result columns of `df` and refreshing the table as rows finish.
+    """
+    total = len(payloads)
+    done = 0
+    start = time.perf_counter()
+    last_refresh = 0.0
+    
+    def refresh():
+        elapsed = time.perf_counter() - start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = f"{(total - done) / rate:.0f} s" if rate > 0 else "—"
+        progress.progress(done / total if total else 1.0)
+        status_line.markdown(f"**{done}/{total}** rows · {rate:.1f} rows/s · ETA {eta}")
+        table.dataframe(df, use_container_width=True)
+    
+    # Empty inputs fail without a request
+    for index, payload in enumerate(payloads):
+        if payload is None:
+            df.at[index, "status"] = "failed"
+            df.at[index, "error"] = "Empty input"
+            done += 1
+    
+    sent = [(index, payload) for index, payload in enumerate(payloads) if payload is not None]
+    for position, result, seconds in get_client().imap(endpoint, [payload for _, payload in sent], concurrency):
+        index = sent[position][0]
+        df.at[index, "latency_ms"] = round(seconds * 1000, 1)
+        if isinstance(result, Exception):
+            df.at[index, "status"] = "failed"
+            df.at[index, "error"] = str(getattr(result, "detail", result))
+        else:
+            df.at[index, "status"] = "ok"
+            df.at[index, "result"] = result.get(result_field)
+            df.at[index, "source"] = result_source({"data": result})
+        done += 1
+        if time.perf_counter() - last_refresh >= BULK_REFRESH_SECONDS:
+            last_refresh = time.perf_counter()
+            refresh()
+    refresh()
+    return time.perf_counter() - start
 
 # Page configuration
 st.set_page_config(
@@ -40,19 +196,20 @@ with st.sidebar:
     st.header("⚙️ Settings")
     
     # API Status Check
-    try:
-        response = requests.get(f"{API_URL}/health", timeout=2)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get("gemini_api") == "configured":
-                st.success("✅ API Connected")
-            else:
-                st.warning("⚠️ API running but Gemini key not configured")
+    health_status, health = check_health()
+    if health_status == "ok":
+        if health.get("gemini_api") == "configured":
+            st.success("✅ API Connected")
         else:
-            st.error("❌ API Error")
-    except:
+            st.warning("⚠️ API running but Gemini key not configured")
+    elif health_status == "error":
+        st.error("❌ API Error")
+    else:
         st.error("❌ API Not Running")
         st.info("Make sure to run: `uvicorn main:app --reload`")
+    if st.button("🔄 Recheck", key="recheck_health"):
+        check_health.clear()
+        st.rerun()
     
     st.markdown("---")
     st.markdown("### 📚 Features")
@@ -62,6 +219,7 @@ with st.sidebar:
     - 🌐 Translation
     - 💻 Code Explanation
     - ❓ Q&A System
+    - 📦 Bulk Processing
     """)
     
     st.markdown("---")
@@ -79,12 +237,13 @@ with st.sidebar:
     """)
 
 # Main content
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
+tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
     "✨ Generate Text", 
     "📝 Summarize", 
     "🌐 Translate", 
     "💻 Explain Code", 
-    "❓ Q&A"
+    "❓ Q&A",
+    "📦 Bulk"
 ])
 
 # Tab 1: Generate Text
@@ -126,18 +285,19 @@ with tab1:
         else:
             with st.spinner("✨ Generating content..."):
                 try:
-                    response = requests.post(
-                        f"{API_URL}/api/generate",
-                        json={
+                    data, info = memoized_post(
+                        "/api/generate",
+                        {
                             "prompt": prompt, 
                             "temperature": temperature,
                             "max_tokens": max_tokens
-                        }
+                        },
+                        st.empty()
                     )
-                    data = response.json()
                     
                     if data.get("success"):
                         st.success("✅ Generated successfully!")
+                        show_result_info(info)
                         st.markdown("### 📄 Result:")
                         st.markdown(f"```\n{data['data']['generated_text']}\n```")
                         
@@ -192,14 +352,15 @@ with tab2:
         else:
             with st.spinner("📝 Summarizing..."):
                 try:
-                    response = requests.post(
-                        f"{API_URL}/api/summarize",
-                        json={"text": text_to_summarize, "length": length}
+                    data, info = memoized_post(
+                        "/api/summarize",
+                        {"text": text_to_summarize, "length": length},
+                        st.empty()
                     )
-                    data = response.json()
                     
                     if data.get("success"):
                         st.success("✅ Summarized successfully!")
+                        show_result_info(info)
                         
                         col1, col2 = st.columns(2)
                         with col1:
@@ -260,14 +421,15 @@ with tab3:
         else:
             with st.spinner(f"🌐 Translating to {target_language}..."):
                 try:
-                    response = requests.post(
-                        f"{API_URL}/api/translate",
-                        json={"text": text_to_translate, "target_language": target_language}
+                    data, info = memoized_post(
+                        "/api/translate",
+                        {"text": text_to_translate, "target_language": target_language},
+                        st.empty()
                     )
-                    data = response.json()
                     
                     if data.get("success"):
                         st.success("✅ Translated successfully!")
+                        show_result_info(info)
                         
                         col1, col2 = st.columns(2)
                         
@@ -328,14 +490,15 @@ with tab4:
         else:
             with st.spinner("💻 Analyzing code..."):
                 try:
-                    response = requests.post(
-                        f"{API_URL}/api/explain-code",
-                        json={"code": code_snippet, "language": language}
+                    data, info = memoized_post(
+                        "/api/explain-code",
+                        {"code": code_snippet, "language": language},
+                        st.empty()
                     )
-                    data = response.json()
                     
                     if data.get("success"):
                         st.success("✅ Code explained successfully!")
+                        show_result_info(info)
                         
                         st.markdown("### 📖 Explanation:")
                         st.markdown(data['data']['explanation'])
@@ -387,14 +550,15 @@ with tab5:
                         if context:
                             payload["context"] = context
                         
-                        response = requests.post(
-                            f"{API_URL}/api/qa",
-                            json=payload
+                        data, info = memoized_post(
+                            "/api/qa",
+                            payload,
+                            st.empty()
                         )
-                        data = response.json()
                         
                         if data.get("success"):
                             st.success("✅ Answer generated!")
+                            show_result_info(info)
                             
                             # Display question
                             st.markdown("### ❓ Question:")
@@ -445,6 +609,118 @@ with tab5:
                 st.session_state.qa_question = sample
                 st.rerun()
 
+# Tab 6: Bulk
+with tab6:
+    st.header("📦 Bulk Processing")
+    st.markdown("Upload a CSV or JSONL file and process every row concurrently")
+    
+    uploaded = st.file_uploader("Upload file:", type=["csv", "jsonl", "json"], key="bulk_file")
+    
+    if uploaded is not None:
+        try:
+            bulk_df = read_upload(uploaded)
+        except Exception as e:
+            st.error(f"❌ Could not read {uploaded.name}: {str(e)}")
+            bulk_df = None
+        
+        if bulk_df is not None and bulk_df.empty:
+            st.warning("⚠️ The file has no rows.")
+        elif bulk_df is not None:
+            st.caption(f"{len(bulk_df)} rows · columns: {', '.join(map(str, bulk_df.columns))}")
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                operation = st.selectbox("Operation:", options=list(BULK_OPERATIONS), key="bulk_operation")
+                endpoint, request_field, result_field = BULK_OPERATIONS[operation]
+            
+            with col2:
+                text_column = st.selectbox("Input column:", options=list(bulk_df.columns), key="bulk_text_column")
+            
+            with col3:
+                concurrency = st.slider(
+                    "Concurrency",
+                    min_value=1,
+                    max_value=BULK_MAX_CONCURRENCY,
+                    value=8,
+                    help="Rows sent at once"
+                )
+            
+            options = {}
+            context_column = None
+            if endpoint == "/api/summarize":
+                options["length"] = st.selectbox("Summary Length:", options=["short", "medium", "long"], index=1, key="bulk_length")
+            elif endpoint == "/api/translate":
+                options["target_language"] = st.selectbox(
+                    "Target Language:",
+                    options=["Spanish", "French", "German", "Hindi", "Chinese",
+                            "Japanese", "Arabic", "Russian", "Italian", "Portuguese"],
+                    key="bulk_target_language"
+                )
+            elif endpoint == "/api/explain-code":
+                options["language"] = st.text_input("Programming Language:", value="Python", key="bulk_code_language")
+            elif endpoint == "/api/qa":
+                context_choice = st.selectbox(
+                    "Context column (optional):", options=["(none)"] + list(bulk_df.columns), key="bulk_context_column"
+                )
+                context_column = None if context_choice == "(none)" else context_choice
+            
+            if st.button("📦 Process All Rows", type="primary", use_container_width=True):
+                payloads = [
+                    bulk_payload(row, request_field, text_column, options, context_column)
+                    for _, row in bulk_df.iterrows()
+                ]
+                results_df = bulk_df.reset_index(drop=True).copy()
+                for column in ("status", "result", "latency_ms", "source", "error"):
+                    results_df[column] = None
+                results_df["status"] = "pending"
+                
+                progress = st.progress(0.0)
+                status_line = st.empty()
+                table = st.empty()
+                try:
+                    elapsed = run_bulk(
+                        results_df, endpoint, result_field, payloads, concurrency, table, progress, status_line
+                    )
+                    failed = int((results_df["status"] == "failed").sum())
+                    if failed:
+                        st.warning(f"⚠️ {len(results_df) - failed} rows succeeded, {failed} failed ({elapsed:.1f} s)")
+                    else:
+                        st.success(f"✅ All {len(results_df)} rows processed in {elapsed:.1f} s")
+                    # Kept across reruns, so the download buttons below still work
+                    st.session_state.bulk_results = results_df
+                except Exception as e:
+                    st.error(f"❌ Connection Error: {str(e)}")
+    
+    if st.session_state.get("bulk_results") is not None:
+        results_df = st.session_state.bulk_results
+        st.markdown("### 📥 Download Results")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.download_button(
+                label="📥 Download CSV",
+                data=results_df.to_csv(index=False).encode("utf-8"),
+                file_name="bulk_results.csv",
+                mime="text/csv",
+                use_container_width=True
+            )
+        
+        with col2:
+            try:
+                buffer = io.BytesIO()
+                results_df.astype({"result": "string", "error": "string", "source": "string"}).to_parquet(buffer, index=False)
+                st.download_button(
+                    label="📥 Download Parquet",
+                    data=buffer.getvalue(),
+                    file_name="bulk_results.parquet",
+                    mime="application/octet-stream",
+                    use_container_width=True
+                )
+            except Exception as e:
+                st.caption(f"Parquet export unavailable: {str(e)}")
+
 # Footer
 st.markdown("---")
 st.markdown("""
@@ -0,0 +1,140 @@
+"""
+Map-reduce summarization for documents larger than one prompt.
+
+The text is split on paragraph and sentence boundaries into chunks that
+fit a token budget. Chunks are summarized concurrently (map), then the
+partial summaries are combined level by level (reduce) until they fit in
+a single final prompt.
+"""
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+
+from backends import GenerationResult
+
+# Rough heuristic used throughout: about 4 characters per token
+CHARS_PER_TOKEN = 4
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+# (stage, completed, total) -> None
+ProgressCallback = Callable[[str, int, int], None]
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_pieces(text: str, max_chars: int) -> List[str]:
+    """Break text into pieces no longer than max_chars, preferring paragraph, then sentence boundaries"""
+    pieces = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_END.split(paragraph):
+            # Hard-split anything with no usable boundary
+            for start in range(0, len(sentence), max_chars):
+                pieces.append(sentence[start:start + max_chars])
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """Greedily pack paragraph/sentence pieces into chunks of at most max_tokens"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    current_len = 0
+    for piece in split_pieces(text, max_chars):
+        if current and current_len + len(piece) + 2 > max_chars:
+            chunks.append("\n\n".join(current))
+            current = []
+            current_len = 0
+        current.append(piece)
+        current_len += len(piece) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+@dataclass
+class ReductionPlan:
+    final_prompt: str
+    chunks: int
+    levels: int
+    upstream_calls: int
+
+
+class MapReduceSummarizer:
+    """
+    Hierarchical summarizer built on a `generate(prompt, max_output_tokens)`
+    coroutine, so every chunk call goes through the caller's normal
+    generation path (caching, coalescing, etc.).
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str, int], Awaitable[GenerationResult]],
+        chunk_tokens: int = 4000,
+        map_tokens: int = 300,
+        fan_out: int = 8,
+    ):
+        self.generate = generate
+        self.chunk_tokens = chunk_tokens
+        self.map_tokens = map_tokens
+        self.fan_out = fan_out
+
+    def needs_map_reduce(self, text: str) -> bool:
+        return estimate_tokens(text) > self.chunk_tokens
+
+    async def summarize_chunks(
+        self, chunks: List[str], stage: str, on_progress: Optional[ProgressCallback]
+    ) -> List[str]:
+        semaphore = asyncio.Semaphore(self.fan_out)
+        completed = 0
+
+        async def summarize_one(chunk: str) -> str:
+            nonlocal completed
+            async with semaphore:
+                result = await self.generate(
+                    "Summarize the following section of a longer document. "
+                    "Keep every key fact, name and number:\n\n" + chunk,
+                    self.map_tokens,
+                )
+            completed += 1
+            if on_progress:
+                on_progress(stage, completed, len(chunks))
+            return result.text
+
+        return list(await asyncio.gather(*(summarize_one(chunk) for chunk in chunks)))
+
+    async def plan(
+        self, text: str, length_instruction: str, on_progress: Optional[ProgressCallback] = None
+    ) -> ReductionPlan:
+        """Run the map and intermediate reduce levels, returning the final summarization prompt"""
+        chunks = chunk_text(text, self.chunk_tokens)
+        summaries = await self.summarize_chunks(chunks, "map", on_progress)
+        calls = len(chunks)
+        levels = 1
+
+        # Keep combining until the partial summaries fit in one prompt
+        while len(summaries) > 1 and estimate_tokens("\n\n".join(summaries)) > self.chunk_tokens:
+            groups = chunk_text("\n\n".join(summaries), self.chunk_tokens)
+            if len(groups) >= len(summaries):
+                # Summaries are individually too long to pack; stop rather than loop forever
+                break
+            levels += 1
+            summaries = await self.summarize_chunks(groups, f"reduce-{levels}", on_progress)
+            calls += len(groups)
+
+        sections = "\n\n".join(f"Section {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+        final_prompt = (
+            "The following are summaries of consecutive sections of one document. "
+            f"Combine them into a single summary of the whole document {length_instruction}:\n\n{sections}"
+        )
+        return ReductionPlan(final_prompt=final_prompt, chunks=len(chunks), levels=levels, upstream_calls=calls + 1)
@@ -1,13 +1,15 @@
-import requests
-import json
+from client import ContentClient
 
 BASE_URL = "http://localhost:8000"
 
+# One pooled keep-alive session for the whole run; raises APIError on an error status
+client = ContentClient(BASE_URL, timeout=60)
+
 def test_health():
     """Test health endpoint"""
-    response = requests.get(f"{BASE_URL}/health")
-    print(f"Health Check: {response.json()}")
-    assert response.status_code == 200
+    health = client.health(timeout=5)
+    print(f"Health Check: {health}")
+    assert health["status"] == "healthy"
 
 def test_generate_text():
     """Test text generation"""
@@ -16,12 +18,11 @@ def test_generate_text():
         "temperature": 0.8,
         "max_tokens": 200
     }
-    response = requests.post(f"{BASE_URL}/api/generate", json=payload)
-    result = response.json()
+    data = client.post("/api/generate", payload)
     print("\n=== Text Generation ===")
     print(f"Prompt: {payload['prompt']}")
-    print(f"Response: {result['data']['generated_text']}")
-    assert response.status_code == 200
+    print(f"Response: {data['generated_text']}")
+    assert data["generated_text"]
 
 def test_summarize():
     """Test summarization"""
@@ -36,11 +37,10 @@ def test_summarize():
         """,
         "length": "short"
     }
-    response = requests.post(f"{BASE_URL}/api/summarize", json=payload)
-    result = response.json()
+    data = client.post("/api/summarize", payload)
     print("\n=== Summarization ===")
-    print(f"Summary: {result['data']['summary']}")
-    assert response.status_code == 200
+    print(f"Summary: {data['summary']}")
+    assert data["summary"]
 
 def test_translate():
     """Test translation"""
@@ -48,12 +48,11 @@ def test_translate():
         "text": "Hello, how are you today?",
         "target_language": "Hindi"
     }
-    response = requests.post(f"{BASE_URL}/api/translate", json=payload)
-    result = response.json()
+    data = client.post("/api/translate", payload)
     print("\n=== Translation ===")
-    print(f"Original: {result['data']['original']}")
-    print(f"Translated: {result['data']['translated']}")
-    assert response.status_code == 200
+    print(f"Original: {data['original']}")
+    print(f"Translated: {data['translated']}")
+    assert data["translated"]
 
 def test_explain_code():
     """Test code explanation"""
@@ -61,11 +60,10 @@ def test_explain_code():
         "code": "def fibonacci(n):\n    if n <= 1:\n        return n\n    return fibonacci(n-1) + fibonacci(n-2)",
         "language": "Python"
     }
-    response = requests.post(f"{BASE_URL}/api/explain-code", json=payload)
-    result = response.json()
+    data = client.post("/api/explain-code", payload)
     print("\n=== Code Explanation ===")
-    print(f"Explanation: {result['data']['explanation']}")
-    assert response.status_code == 200
+    print(f"Explanation: {data['explanation']}")
+    assert data["explanation"]
 
 def test_qa():
     """Test question answering"""
@@ -73,12 +71,28 @@ def test_qa():
         "question": "What is FastAPI and why is it popular?",
         "context": "In the context of modern web development"
     }
-    response = requests.post(f"{BASE_URL}/api/qa", json=payload)
-    result = response.json()
+    data = client.post("/api/qa", payload)
     print("\n=== Question & Answer ===")
-    print(f"Question: {result['data']['question']}")
-    print(f"Answer: {result['data']['answer']}")
-    assert response.status_code == 200
+    print(f"Question: {data['question']}")
+    print(f"Answer: {data['answer']}")
+    assert data["answer"]
+
+def test_generate_stream():
+    """Test streaming text generation"""
+    payload = {"prompt": "Write a haiku about streaming"}
+    events = [event for event, _ in client.stream_events("/api/generate", payload)]
+    print("\n=== Streaming Generation ===")
+    print(f"Events: {events}")
+    assert events[-1] == "done"
+
+def test_map():
+    """Test concurrent fan-out over the pooled session"""
+    payloads = [{"text": text, "target_language": "French"} for text in ["Good morning", "Thank you", "See you soon"]]
+    results = client.map("/api/translate", payloads, concurrency=3)
+    print("\n=== Concurrent Translation ===")
+    for payload, data in zip(payloads, results):
+        print(f"{payload['text']} -> {data['translated']}")
+    assert all(isinstance(data, dict) for data in results)
 
 if __name__ == "__main__":
     print("Starting API Tests...\n")
@@ -91,6 +105,8 @@ if __name__ == "__main__":
         test_translate()
         test_explain_code()
         test_qa()
+        test_generate_stream()
+        test_map()
         
         print("\n" + "=" * 60)
         print("✅ All tests passed!")
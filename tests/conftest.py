@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The app reads its configuration at import time: run it against the fake
+# backend with an in-memory job store and a two-model failover chain
+os.environ.setdefault("MODEL_BACKEND", "fake")
+os.environ.setdefault("JOBS_DB_PATH", ":memory:")
+os.environ.setdefault("MODEL_CHAIN", "gemini-pro-latest,gemini-flash-latest")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
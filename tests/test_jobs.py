@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+import time
+from collections import Counter
+
+from jobs import QUEUED, RUNNING, SUCCEEDED, Job, JobQueue, JobStore
+
+
+def make_job(status: str = QUEUED, **fields) -> Job:
+    return Job(id=fields.pop("id", "job"), type="generate", params={}, status=status, created_at=time.time(), **fields)
+
+
+def test_claim_is_atomic(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = JobStore(path), JobStore(path)
+    first.save(make_job())
+    assert first.claim("job", time.time())
+    assert not second.claim("job", time.time())
+
+
+def test_shared_store_runs_each_job_once(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    runs = Counter()
+
+    async def handler(job: Job):
+        runs[job.id] += 1
+        await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    async def run():
+        first = JobQueue(JobStore(path), handler, workers=2)
+        submitted = [await first.submit("generate", {}) for _ in range(20)]
+        # A second process starting up finds the same queued jobs
+        second = JobQueue(JobStore(path), handler, workers=2)
+        await second.start()
+        for job in submitted:
+            assert (await first.get(job.id, wait=5)).status == SUCCEEDED
+        await first.stop()
+        await second.stop()
+        return submitted
+
+    submitted = asyncio.run(run())
+    assert runs == {job.id: 1 for job in submitted}
+
+
+def test_start_requeues_only_stale_running_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = JobStore(path)
+    store.save(make_job(id="stale"))
+    store.save(make_job(id="live"))
+    store.claim("stale", time.time() - 120)
+    store.claim("live", time.time())
+
+    async def handler(job: Job):
+        return {}
+
+    async def run():
+        queue = JobQueue(JobStore(path), handler, lease_seconds=60)
+        await queue.start()
+        stale = await queue.get("stale", wait=5)
+        await queue.stop()
+        return stale
+
+    assert asyncio.run(run()).status == SUCCEEDED
+    assert store.get("live").status == RUNNING
+
+
+class LockedOnceStore(JobStore):
+    """A store whose first claim and first save fail as if another process held the lock"""
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.failing = {"claim", "save_finished"}
+
+    def fail_once(self, name: str):
+        if name in self.failing:
+            self.failing.discard(name)
+            raise sqlite3.OperationalError("database is locked")
+
+    def claim(self, job_id: str, now: float) -> bool:
+        self.fail_once("claim")
+        return super().claim(job_id, now)
+
+    def save(self, job: Job):
+        if job.finished_at is not None:
+            self.fail_once("save_finished")
+        super().save(job)
+
+
+def test_worker_survives_locked_store(tmp_path):
+    store = LockedOnceStore(str(tmp_path / "jobs.db"))
+
+    async def handler(job: Job):
+        return {"ok": True}
+
+    async def run():
+        queue = JobQueue(store, handler, workers=1)
+        queue.STORE_RETRY_SECONDS = 0.01
+        first = await queue.submit("generate", {})
+        second = await queue.submit("generate", {})
+        finished = [await queue.get(job.id, wait=5) for job in (first, second)]
+        await queue.stop()
+        return finished
+
+    assert [job.status for job in asyncio.run(run())] == [SUCCEEDED, SUCCEEDED]
+    assert not store.failing
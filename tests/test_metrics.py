@@ -0,0 +1,16 @@
+import asyncio
+
+import main
+from benchmark import asgi_request
+
+
+def test_retries_per_call_histogram_is_exported():
+    async def run():
+        await asgi_request(main.app, "POST", "/api/generate", {"prompt": "Histogram export"})
+        return await asgi_request(main.app, "GET", "/metrics")
+
+    status, text = asyncio.run(run())
+    assert status == 200
+    buckets = [line for line in text.splitlines() if line.startswith("gemini_api_upstream_retries_per_call_bucket")]
+    assert buckets and buckets[-1].startswith('gemini_api_upstream_retries_per_call_bucket{le="+Inf"}')
+    assert "gemini_api_upstream_retries_per_call_count" in text
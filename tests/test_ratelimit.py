@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import pytest
+
+from ratelimit import AdmissionController, RateLimitExceeded
+from resilience import request_deadline
+
+
+def test_waiters_are_admitted_in_order_without_serializing():
+    # 600 requests/minute: the bucket holds 600, then refills one every 0.1s
+    controller = AdmissionController(requests_per_minute=600, max_wait_seconds=5)
+    controller.request_bucket.tokens = 0
+    admitted = []
+
+    async def one(i):
+        await controller.acquire()
+        admitted.append(i)
+
+    async def run():
+        await asyncio.gather(*(one(i) for i in range(3)))
+
+    start = time.monotonic()
+    asyncio.run(run())
+    assert admitted == [0, 1, 2]
+    assert time.monotonic() - start < 0.45
+
+
+def test_rejects_on_arrival_when_projected_wait_exceeds_max_wait():
+    controller = AdmissionController(tokens_per_minute=60, max_wait_seconds=1)
+
+    async def run():
+        await controller.acquire(60)
+        start = time.monotonic()
+        with pytest.raises(RateLimitExceeded) as error:
+            await controller.acquire(30)
+        return time.monotonic() - start, error.value
+
+    elapsed, error = asyncio.run(run())
+    assert elapsed < 0.05
+    assert error.retry_after >= 29
+
+
+def test_rejects_on_arrival_past_the_client_deadline():
+    controller = AdmissionController(requests_per_minute=60, max_wait_seconds=10)
+    controller.request_bucket.tokens = 0
+
+    async def run():
+        request_deadline.set(time.monotonic() + 0.2)
+        start = time.monotonic()
+        with pytest.raises(RateLimitExceeded):
+            await controller.acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.05
+    assert controller.rejected == 1
+
+
+def test_every_upstream_attempt_takes_budget(monkeypatch):
+    import main
+    from backends import FakeBackend
+    from benchmark import asgi_request
+    from resilience import RetryPolicy
+
+    backend = FakeBackend(latency_ms=0, error_rate=1.0)
+    monkeypatch.setattr(main, "backend", backend)
+    monkeypatch.setattr(main, "retry_policy", RetryPolicy(max_attempts=3, initial_backoff=0.001, max_backoff=0.001))
+    monkeypatch.setattr(main, "admission", AdmissionController(requests_per_minute=6000))
+
+    status, _ = asyncio.run(asgi_request(main.app, "POST", "/api/generate", {"prompt": "Retried upstream call"}))
+    assert status >= 500
+    # Three attempts on each of the two models in the chain, each admitted separately
+    assert backend.calls == 6
+    assert main.admission.admitted == 6
+
+
+def test_retries_stop_when_budget_runs_out(monkeypatch):
+    import main
+    from backends import FakeBackend
+    from benchmark import asgi_request
+    from resilience import RetryPolicy
+
+    backend = FakeBackend(latency_ms=0, error_rate=1.0)
+    controller = AdmissionController(requests_per_minute=60, max_wait_seconds=0.5)
+    controller.request_bucket.tokens = 2
+    monkeypatch.setattr(main, "backend", backend)
+    monkeypatch.setattr(main, "retry_policy", RetryPolicy(max_attempts=3, initial_backoff=0.001, max_backoff=0.001))
+    monkeypatch.setattr(main, "admission", controller)
+
+    status, _ = asyncio.run(asgi_request(main.app, "POST", "/api/generate", {"prompt": "Budget-limited retries"}))
+    assert status == 429
+    assert backend.calls == 2
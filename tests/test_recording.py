@@ -0,0 +1,48 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import benchmark
+import main
+from recording import HASH_MARKER, TEXT_MARKER, restore, sanitize
+
+
+def test_short_user_content_is_not_recorded():
+    body = {
+        "question": "Is my tumor benign?",
+        "language": "Python",
+        "stop_sequences": ["END"],
+        "tasks": [{"type": "generate", "params": {"prompt": "hi", "temperature": 0.2}}],
+    }
+    sanitized = sanitize(body)
+    assert "benign" not in json.dumps(sanitized)
+    assert set(sanitized["question"]) == {TEXT_MARKER, HASH_MARKER}
+    assert set(sanitized["stop_sequences"][0]) == {TEXT_MARKER, HASH_MARKER}
+    assert set(sanitized["tasks"][0]["params"]["prompt"]) == {TEXT_MARKER, HASH_MARKER}
+    assert sanitized["language"] == "Python"
+    assert sanitized["tasks"][0]["type"] == "generate"
+    restored = restore(sanitized)
+    assert len(restored["question"]) == len(body["question"])
+    assert restored["tasks"][0]["params"]["temperature"] == 0.2
+
+
+def test_replay_counts_stream_error_events(tmp_path, monkeypatch):
+    log = tmp_path / "traffic.jsonl"
+    record = {"ts": 0, "method": "POST", "client": "replay", "query": "", "duration_ms": 10}
+    log.write_text("\n".join(json.dumps({**record, "path": path, "body": {"prompt": "x"}}) for path in (
+        "/api/generate/stream", "/api/generate",
+    )))
+    failed_stream = main.sse_event("error", {"detail": "Upstream failed", "status_code": 503})
+
+    async def fake_request(app, method, path, body=None, headers=None):
+        return (200, failed_stream) if path.endswith("/stream") else (200, {"success": True})
+
+    monkeypatch.setattr(main, "backend", main.backend)
+    monkeypatch.setattr(benchmark, "asgi_request", fake_request)
+    args = SimpleNamespace(
+        log=str(log), limit=0, speed=0, latency_ms=1, latency_distribution="fixed",
+        token_rate=0, error_rate=0, seed=0,
+    )
+    result = asyncio.run(benchmark.bench_replay(args))
+    assert result["paths"]["/api/generate/stream"]["statuses"] == {"503": 1}
+    assert result["paths"]["/api/generate"]["errors"] == 0
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+from backends import BackendError
+from benchmark import asgi_request
+from resilience import CircuitBreaker, ModelChain
+
+
+def make_chain() -> ModelChain:
+    return ModelChain(["primary", "fallback"], lambda: CircuitBreaker(min_calls=4, open_seconds=60))
+
+
+def fail_with(error: Exception):
+    async def fn(model: str):
+        raise error
+    return fn
+
+
+def call_many(chain: ModelChain, error: Exception, times: int = 8):
+    async def run():
+        for _ in range(times):
+            # Once both breakers are open, the chain fails fast with CircuitOpen
+            with pytest.raises(Exception):
+                await chain.call(fail_with(error))
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("error", [asyncio.TimeoutError(), BackendError("bad request", status_code=400)])
+def test_deadlines_and_client_errors_leave_breakers_closed(error):
+    chain = make_chain()
+    call_many(chain, error)
+    assert all(breaker.state == CircuitBreaker.CLOSED for breaker in chain.breakers.values())
+
+
+def test_upstream_errors_open_breakers():
+    chain = make_chain()
+    call_many(chain, BackendError("unavailable", status_code=503))
+    assert all(breaker.state == CircuitBreaker.OPEN for breaker in chain.breakers.values())
+
+
+def test_no_failover_past_deadline():
+    chain = make_chain()
+    calls = []
+
+    async def fn(model: str):
+        calls.append(model)
+        raise BackendError("unavailable", status_code=503)
+
+    async def run():
+        with pytest.raises(BackendError):
+            await chain.call(fn, deadline=time.monotonic())
+
+    asyncio.run(run())
+    assert calls == ["primary"]
+
+
+def request(body: dict, headers: dict = None):
+    # One task per request, as under a server, so the deadline doesn't leak between requests
+    async def run():
+        return await asyncio.create_task(asgi_request(main.app, "POST", "/api/generate", body, headers))
+    return asyncio.run(run())
+
+
+def test_short_request_timeouts_do_not_open_breakers():
+    for i in range(12):
+        status, _ = request(
+            {"prompt": f"Short deadline request {i}", "temperature": 0.0},
+            headers={"X-Request-Timeout": "0.05"},
+        )
+        assert status == 504
+    status, _ = request({"prompt": "No deadline", "temperature": 0.0})
+    assert status == 200
+    assert all(breaker.state == CircuitBreaker.CLOSED for breaker in main.model_chain.breakers.values())
@@ -0,0 +1,28 @@
+import tracemalloc
+
+from benchmark import make_document
+from retrieval import ContextRetriever, PassageIndex, tokenize
+
+
+def test_selects_passages_matching_the_question():
+    retriever = ContextRetriever(token_budget=200, passage_tokens=50)
+    index = retriever.build(make_document(20_000))
+    retrieval = retriever.retrieve(index, "What changed in sentence 321?", index_cached=False)
+    assert "Sentence 321 reports" in retrieval.context
+    assert retrieval.sent_tokens <= 200
+
+
+def test_long_tokens_are_not_indexed():
+    blob = "x" * 800
+    assert tokenize(f"short words {blob}") == ["short", "words"]
+
+
+def test_index_memory_does_not_scale_with_longest_token():
+    # With a fixed-width string array, one long token sized every entry
+    passages = [f"passage {i} " + " ".join(f"word{j}" for j in range(100)) for i in range(500)]
+    passages[0] += " " + "y" * 39 + " " + "z" * 790
+    tracemalloc.start()
+    PassageIndex(passages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert peak < 20 * 1024 * 1024
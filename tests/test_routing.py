@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from routing import RoutingTable
+
+GOOD = """
+routes:
+  translate:
+    model: gemini-flash-latest
+"""
+
+BROKEN = {
+    "syntax": "routes: [unclosed\n",
+    "top-level list": "- translate\n- qa\n",
+    "routes list": "routes:\n  - translate\n",
+    "band string": "routes:\n  translate: gemini-flash-latest\n",
+    "max_input_chars string": "routes:\n  translate:\n    max_input_chars: '2000'\n",
+    "model number": "routes:\n  translate:\n    model: 42\n",
+    "temperature string": "routes:\n  translate:\n    generation_config:\n      temperature: high\n",
+    "max_output_tokens float": "routes:\n  translate:\n    generation_config:\n      max_output_tokens: 1.5\n",
+}
+
+
+def write(path, text: str, mtime: float):
+    path.write_text(text)
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.mark.parametrize("text", BROKEN.values(), ids=BROKEN.keys())
+def test_broken_file_keeps_last_good_table(tmp_path, text):
+    path = tmp_path / "routing.yaml"
+    write(path, GOOD, 1000)
+    table = RoutingTable(str(path), reload_interval=0)
+    assert table.resolve("translate", 10).model == "gemini-flash-latest"
+
+    write(path, text, 2000)
+    assert table.resolve("translate", 10).model == "gemini-flash-latest"
+    assert table.last_error
+    assert table.reloads == 1
+
+    write(path, GOOD, 3000)
+    table.reload_if_changed()
+    assert table.last_error is None
+    assert table.reloads == 2
+
+
+@pytest.mark.parametrize("text", BROKEN.values(), ids=BROKEN.keys())
+def test_broken_file_at_startup(tmp_path, text):
+    path = tmp_path / "routing.yaml"
+    path.write_text(text)
+    table = RoutingTable(str(path))
+    assert table.routes == {}
+    assert table.last_error
+    assert table.resolve("translate", 10).model is None
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+import main
+from backends import GenerationResult
+from benchmark import asgi_request
+from semantic_cache import SemanticCache, SemanticQuery
+
+# (cached prompt, rephrasing that should get its answer)
+HITS = {
+    "rephrased": ("What are the main causes of inflation?", "What are the main causes of inflation today?"),
+    "contraction": ("What's the reset procedure for the device?", "What is the reset procedure for this device?"),
+    "acronym": ("What is machine learning?", "What is ML?"),
+    "politeness": ("What is machine learning?", "please, what is machine learning"),
+}
+
+# (cached prompt, new prompt that must not get its answer)
+MISSES = {
+    "negated": ("What is machine learning?", "What isn't machine learning?"),
+    "negated long": (
+        "Explain whether this function is safe to call from multiple threads at the same time",
+        "Explain whether this function is not safe to call from multiple threads at the same time",
+    ),
+    "number changed": (
+        "Summarize the quarterly report in 3 bullet points",
+        "Summarize the quarterly report in 5 bullet points",
+    ),
+    "one word changed": ("Write a poem about cats", "Write a poem about dogs"),
+    "roles swapped": ("can you help me", "can i help you"),
+}
+
+
+def make_cache():
+    cache = SemanticCache(enabled=True)
+    return cache, cache.scope("gemini-pro-latest", {"temperature": 0.0})
+
+
+def lookup_after(cached: str, prompt: str):
+    cache, scope = make_cache()
+    cache.add(SemanticQuery(cached), scope, GenerationResult(text="answer", model="gemini-pro-latest"))
+    return cache.lookup(SemanticQuery(prompt), scope)
+
+
+@pytest.mark.parametrize("name", HITS)
+def test_rephrasing_hits(name):
+    hit = lookup_after(*HITS[name])
+    assert hit is not None and hit.cached
+
+
+def test_paraphrase_hits_below_exact_similarity():
+    hit = lookup_after(*HITS["rephrased"])
+    assert hit is not None and hit.similarity < 1.0
+
+
+@pytest.mark.parametrize("name", MISSES)
+def test_changed_meaning_misses(name):
+    assert lookup_after(*MISSES[name]) is None
+
+
+def test_high_temperature_bypasses():
+    cache, _ = make_cache()
+    assert not cache.is_cacheable({"temperature": 0.7})
+    assert cache.is_cacheable({"temperature": 0.2})
+
+
+def test_qa_reaches_the_semantic_cache():
+    context = "The warranty covers manufacturing defects for two years from the date of purchase."
+
+    async def ask(question: str):
+        # One task per request, as under a server
+        return await asyncio.create_task(
+            asgi_request(main.app, "POST", "/api/qa", {"question": question, "context": context})
+        )
+
+    main.semantic_cache.enabled = True
+    try:
+        asyncio.run(ask("How long does the warranty last?"))
+        status, body = asyncio.run(ask("So how long does the warranty last?"))
+    finally:
+        main.semantic_cache.enabled = False
+        main.semantic_cache.clear()
+    assert status == 200
+    assert body["data"]["cached"] and body["data"]["semantic_similarity"] < 1.0
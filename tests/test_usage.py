@@ -0,0 +1,55 @@
+import asyncio
+
+import main
+from benchmark import asgi_request
+from usage import client_id_from_headers
+
+# Identical requests at a temperature the response cache skips, so they coalesce
+BODY = {"prompt": "Coalesced usage accounting", "temperature": 1.0}
+
+
+def generate_concurrently(*clients: str):
+    async def run():
+        return await asyncio.gather(*(
+            asgi_request(main.app, "POST", "/api/generate", BODY, headers={"X-Client-ID": client})
+            for client in clients
+        ))
+    return asyncio.run(run())
+
+
+def test_coalesced_requests_bill_every_client():
+    leaders = main.inflight_requests.leaders
+    responses = generate_concurrently("usage-a", "usage-b")
+    assert [status for status, _ in responses] == [200, 200]
+    assert main.inflight_requests.leaders == leaders + 1
+    assert main.usage_tracker.used_today("usage-a") > 0
+    assert main.usage_tracker.used_today("usage-b") > 0
+
+
+def test_coalesced_share_is_reported_separately():
+    generate_concurrently("usage-leader", "usage-follower")
+    clients = asyncio.run(main.usage_tracker.report())["clients"]
+    leader, follower = clients["usage-leader"], clients["usage-follower"]
+    assert leader["coalesced_tokens"] == 0
+    assert follower["coalesced_tokens"] == follower["total_tokens"] == leader["total_tokens"]
+
+
+def test_coalesced_request_over_quota_is_rejected():
+    main.usage_tracker.client_quotas["usage-over"] = 1
+    main.usage_tracker.record("usage-over", "gemini-pro-latest", 1, 1)
+    try:
+        responses = generate_concurrently("usage-ok", "usage-over")
+    finally:
+        del main.usage_tracker.client_quotas["usage-over"]
+    assert [status for status, _ in responses] == [200, 429]
+
+
+def test_api_key_wins_over_client_id_in_either_order():
+    key = (b"x-api-key", b"secret-key")
+    client = (b"x-client-id", b"team-b")
+    expected = client_id_from_headers([key])
+    assert expected.startswith("key-")
+    assert client_id_from_headers([client, key]) == expected
+    assert client_id_from_headers([key, client]) == expected
+    assert client_id_from_headers([client]) == "team-b"
+    assert client_id_from_headers([]) == "anonymous"
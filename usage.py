@@ -0,0 +1,294 @@
+"""
+Per-client token accounting and daily quotas.
+
+Every upstream call's prompt/output token counts are added to an
+in-memory accumulator keyed by (day, client, model); the request path
+never touches disk. A background task flushes the accumulated deltas to
+a SQLite file every few seconds and re-reads today's totals, so usage
+from other worker processes counts towards the same quotas.
+
+Callers with an X-API-Key are identified by a hash of the key (raw keys
+are never stored), whatever X-Client-ID they send, so a key holder can't
+bill another client or step around its own quota. The X-Client-ID header
+only names unauthenticated callers. Daily quotas are checked
+before a request is sent upstream, so a client over its quota costs one
+dict lookup.
+"""
+import asyncio
+import contextvars
+import datetime
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLIENT_ID_HEADER = b"x-client-id"
+API_KEY_HEADER = b"x-api-key"
+
+# Client the current request is billed to
+current_client: contextvars.ContextVar[str] = contextvars.ContextVar("current_client", default="anonymous")
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def utc_day() -> str:
+    return utc_now().date().isoformat()
+
+
+def seconds_until_utc_midnight() -> float:
+    now = utc_now()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time(), now.tzinfo)
+    return (midnight - now).total_seconds()
+
+
+def client_id_from_headers(headers) -> str:
+    client_id = None
+    for name, value in headers:
+        if name == API_KEY_HEADER and value:
+            return "key-" + hashlib.sha256(value).hexdigest()[:16]
+        if name == CLIENT_ID_HEADER and value and client_id is None:
+            client_id = value.decode("latin-1")[:128]
+    return client_id or "anonymous"
+
+
+def parse_client_quotas(spec: str) -> Dict[str, int]:
+    """"team-a=100000,team-b=500000" -> {"team-a": 100000, "team-b": 500000}"""
+    quotas = {}
+    for item in spec.split(","):
+        if "=" in item:
+            client, quota = item.split("=", 1)
+            quotas[client.strip()] = int(quota)
+    return quotas
+
+
+class UsageTracker:
+    """
+    Token usage per (day, client, model) with optional daily token quotas.
+
+    Without a path, usage is kept in an in-memory SQLite database (lost on
+    restart, and not shared between workers).
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        flush_interval: float = 10.0,
+        daily_quota: int = 0,
+        client_quotas: Optional[Dict[str, int]] = None,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.daily_quota = daily_quota
+        self.client_quotas = client_quotas or {}
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.conn = sqlite3.connect(path or ":memory:", timeout=5, check_same_thread=False, isolation_level=None)
+        if path:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS usage (
+                day TEXT NOT NULL,
+                client TEXT NOT NULL,
+                model TEXT NOT NULL,
+                requests INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL,
+                coalesced_tokens INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, client, model)
+            )"""
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(usage)")}
+        if "coalesced_tokens" not in columns:
+            # Files created before coalesced calls were counted separately
+            self.conn.execute("ALTER TABLE usage ADD COLUMN coalesced_tokens INTEGER NOT NULL DEFAULT 0")
+        # (day, client, model) -> [requests, prompt_tokens, output_tokens, coalesced_tokens] not yet flushed
+        self.pending = defaultdict(lambda: [0, 0, 0, 0])
+        self.day = utc_day()
+        # Today's tokens per client: flushed (all workers) and pending (this process)
+        self.flushed_today: Dict[str, int] = self._read_totals(self.day)
+        self.pending_today: Dict[str, int] = defaultdict(int)
+        self.flushes = 0
+        self.rejected = 0
+        self.task: Optional[asyncio.Task] = None
+
+    def quota_for(self, client: str) -> int:
+        return self.client_quotas.get(client, self.daily_quota)
+
+    def _roll_day(self):
+        day = utc_day()
+        if day != self.day:
+            with self.lock:
+                self.day = day
+                self.flushed_today = {}
+                self.pending_today = defaultdict(int)
+
+    def used_today(self, client: str) -> int:
+        self._roll_day()
+        return self.flushed_today.get(client, 0) + self.pending_today.get(client, 0)
+
+    def check(self, client: str):
+        """Raise QuotaExceeded if the client has used up today's token quota"""
+        quota = self.quota_for(client)
+        if quota and self.used_today(client) >= quota:
+            self.rejected += 1
+            raise QuotaExceeded(
+                f"Daily token quota of {quota} exceeded for client {client}",
+                retry_after=seconds_until_utc_midnight(),
+            )
+
+    def record(self, client: str, model: str, prompt_tokens: int, output_tokens: int, coalesced: bool = False):
+        """
+        Bill a client for one answer. A coalesced answer shared another
+        request's upstream call: it is billed in full, and its tokens are
+        also counted as coalesced_tokens, which upstream didn't bill again.
+        """
+        self._roll_day()
+        with self.lock:
+            entry = self.pending[(self.day, client, model)]
+            entry[0] += 1
+            entry[1] += prompt_tokens
+            entry[2] += output_tokens
+            if coalesced:
+                entry[3] += prompt_tokens + output_tokens
+            self.pending_today[client] += prompt_tokens + output_tokens
+
+    def _read_totals(self, day: str) -> Dict[str, int]:
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT client, SUM(prompt_tokens + output_tokens) FROM usage WHERE day = ? GROUP BY client", (day,)
+            ).fetchall()
+        return {client: int(total) for client, total in rows}
+
+    def flush(self):
+        """Write accumulated deltas to SQLite, then re-read today's totals"""
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(lambda: [0, 0, 0, 0])
+        if pending:
+            rows = [(day, client, model, *counts) for (day, client, model), counts in pending.items()]
+            with self.db_lock:
+                self.conn.execute("BEGIN")
+                try:
+                    self.conn.executemany(
+                        """INSERT INTO usage (day, client, model, requests, prompt_tokens, output_tokens, coalesced_tokens)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (day, client, model) DO UPDATE SET
+                            requests = requests + excluded.requests,
+                            prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                            output_tokens = output_tokens + excluded.output_tokens,
+                            coalesced_tokens = coalesced_tokens + excluded.coalesced_tokens""",
+                        rows,
+                    )
+                    self.conn.execute("COMMIT")
+                except sqlite3.Error:
+                    self.conn.execute("ROLLBACK")
+                    # Put the deltas back so they go out with the next flush
+                    with self.lock:
+                        for key, counts in pending.items():
+                            entry = self.pending[key]
+                            for i, value in enumerate(counts):
+                                entry[i] += value
+                    raise
+        totals = self._read_totals(self.day)
+        with self.lock:
+            self.flushed_today = totals
+            # Usage recorded while flushing is still pending
+            self.pending_today = defaultdict(int)
+            for (day, client, _), counts in self.pending.items():
+                if day == self.day:
+                    self.pending_today[client] += counts[1] + counts[2]
+        self.flushes += 1
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await asyncio.to_thread(self.flush)
+            except sqlite3.Error as e:
+                logger.warning("Could not flush token usage to %s: %s", self.path, e)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await asyncio.to_thread(self.flush)
+
+    async def report(self, day: Optional[str] = None) -> dict:
+        """Per-client, per-model usage for one day (flushes first so it is up to date)"""
+        day = day or utc_day()
+        await asyncio.to_thread(self.flush)
+
+        def read():
+            with self.db_lock:
+                return self.conn.execute(
+                    "SELECT client, model, requests, prompt_tokens, output_tokens, coalesced_tokens"
+                    " FROM usage WHERE day = ?",
+                    (day,),
+                ).fetchall()
+
+        clients = {}
+        for client, model, requests, prompt_tokens, output_tokens, coalesced_tokens in await asyncio.to_thread(read):
+            entry = clients.setdefault(
+                client,
+                {"total_tokens": 0, "coalesced_tokens": 0, "daily_quota": self.quota_for(client) or None, "models": {}},
+            )
+            entry["models"][model] = {
+                "requests": requests,
+                "prompt_tokens": prompt_tokens,
+                "output_tokens": output_tokens,
+                "coalesced_tokens": coalesced_tokens,
+            }
+            entry["total_tokens"] += prompt_tokens + output_tokens
+            entry["coalesced_tokens"] += coalesced_tokens
+        return {"day": day, "clients": clients}
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "flush_interval": self.flush_interval,
+            "daily_quota": self.daily_quota or None,
+            "client_quotas": len(self.client_quotas),
+            "clients_today": len(set(self.flushed_today) | set(self.pending_today)),
+            "pending_keys": len(self.pending),
+            "flushes": self.flushes,
+            "rejected": self.rejected,
+        }
+
+
+class ClientIdentityMiddleware:
+    """ASGI middleware that reads X-Client-ID / X-API-Key into current_client"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            current_client.set(client_id_from_headers(scope.get("headers", [])))
+        await self.app(scope, receive, send)
+
+
+def create_usage_tracker() -> UsageTracker:
+    """Build the usage tracker from USAGE_* environment variables"""
+    return UsageTracker(
+        path=os.getenv("USAGE_DB_PATH"),
+        flush_interval=float(os.getenv("USAGE_FLUSH_SECONDS", "10")),
+        daily_quota=int(os.getenv("USAGE_DAILY_TOKEN_QUOTA", "0")),
+        client_quotas=parse_client_quotas(os.getenv("USAGE_CLIENT_QUOTAS", "")),
+    )